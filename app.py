@@ -1,124 +1,655 @@
 import os
-from flask import Flask, request, jsonify, render_template
+import asyncio
+import atexit
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+import click
+from flask import (
+    Blueprint, Flask, Response, current_app, request, jsonify, render_template, stream_template,
+    stream_with_context, url_for
+)
 from urllib.parse import urlparse
-import concurrent.futures
-from bs4 import BeautifulSoup
-import requests
-from utils.html_parser import HTMLParser
-from utils.accessibility_checker import AccessibilityChecker
-from utils.color_validator import ColorValidator
-from utils.custom_rules import CustomRule
-from models import db, AnalysisHistory
-
-# Initialize Flask app
-app = Flask(__name__)
-app.secret_key = os.environ.get("FLASK_SECRET_KEY", "default-secret-key-change-in-production")
-
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Configure PostgreSQL connection using individual variables if available
-if not app.config['SQLALCHEMY_DATABASE_URI']:
-    db_params = {
-        'host': os.getenv('PGHOST'),
-        'port': os.getenv('PGPORT'),
-        'database': os.getenv('PGDATABASE'),
-        'user': os.getenv('PGUSER'),
-        'password': os.getenv('PGPASSWORD')
-    }
-    if all(db_params.values()):
-        app.config['SQLALCHEMY_DATABASE_URI'] = f"postgresql://{db_params['user']}:{db_params['password']}@{db_params['host']}:{db_params['port']}/{db_params['database']}"
+from utils.result_cache import ResultCache, Validators, content_hash, result_key
+from utils.stylesheets import StylesheetDownloads
+from utils.jobs import JobWorker, create_job_queue
+from utils.metrics import (
+    ANALYSES, HISTORY_ROWS, HISTORY_WRITE_SECONDS, REGISTRY, record_analysis_timings
+)
+from utils.profiling import SlowestProfiles
+from utils.write_behind import WriteBehindBuffer
+from utils.custom_rules import CompiledRule, CustomRule, CustomRuleManager
+from models import (
+    db, AnalysisHistory, backfill_history, delete_rule, find_reusable_result, query_history, query_latest,
+    rule_changes, rule_store_version, save_rule, store_history, upgrade_schema
+)
+
+# The fetch backend (aiohttp) and the parser and checks (bs4, lxml)
+# are imported where they are first used, so starting a worker stays fast
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('main', __name__)
+
+def database_uri():
+    """DATABASE_URL, or a PostgreSQL URL built from the PG* variables when they are all set."""
+    uri = os.getenv('DATABASE_URL')
+    if not uri:
+        db_params = {
+            'host': os.getenv('PGHOST'),
+            'port': os.getenv('PGPORT'),
+            'database': os.getenv('PGDATABASE'),
+            'user': os.getenv('PGUSER'),
+            'password': os.getenv('PGPASSWORD')
+        }
+        if all(db_params.values()):
+            uri = f"postgresql://{db_params['user']}:{db_params['password']}@{db_params['host']}:{db_params['port']}/{db_params['database']}"
+    return uri
+
+def create_app(config=None):
+    """Build the Flask app.
+
+    Nothing here connects to the database: create or upgrade the schema with
+    `flask --app main init-db` when deploying.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("FLASK_SECRET_KEY", "default-secret-key-change-in-production")
+
+    # Database configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Size the connection pool for the analysis threads writing history; SQLite
+    # uses SQLAlchemy's own file-based pooling
+    if app.config['SQLALCHEMY_DATABASE_URI'] and not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+            'pool_pre_ping': True,
+            'pool_recycle': 1800,
+        }
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    app.register_blueprint(bp)
+    app.cli.add_command(init_db_command)
+
+    # History rows are written in bulk in the background instead of one
+    # transaction per URL; see HISTORY_FLUSH_ROWS and HISTORY_FLUSH_SECONDS
+    history_writer = WriteBehindBuffer(
+        lambda rows: write_history(app, rows),
+        max_rows=int(os.getenv('HISTORY_FLUSH_ROWS', 500)),
+        max_delay=float(os.getenv('HISTORY_FLUSH_SECONDS', 2.0)),
+    )
+    atexit.register(history_writer.close)
+    app.extensions['history_writer'] = history_writer
+    return app
+
+@click.command('init-db')
+@click.option('--batch-size', default=1000, show_default=True, help='History rows backfilled per transaction.')
+def init_db_command(batch_size):
+    """Create the tables, add columns and indexes missing from older databases, and backfill older history rows."""
+    upgrade_schema()
+    click.echo('Database schema is up to date.')
+    handled = backfill_history(batch_size, progress=lambda rows: click.echo(f'Backfilled {rows} history rows...'))
+    if handled:
+        click.echo(f'Backfilled host, categories and latest analyses for {handled} history rows.')
+
+# Custom rules are stored in the database and mirrored here; each analysis gets
+# its own checker bound to an immutable snapshot of them
+rule_manager = CustomRuleManager()
+
+# Every worker polls the rule store version at most this often and then loads
+# only the rules that changed
+RULES_RELOAD_SECONDS = float(os.getenv('RULES_RELOAD_SECONDS', 1.0))
+_rules_checked_at = float('-inf')
+_rules_sync_lock = threading.Lock()
+
+# Parsing and checking run on a process pool (see ANALYSIS_EXECUTOR and
+# ANALYSIS_WORKERS), started on first use rather than at import
+_analysis_executor = None
+_analysis_executor_lock = threading.Lock()
+
+# Results of unchanged pages are reused instead of being parsed and checked again
+result_cache = ResultCache.from_env()
+
+# Linked stylesheets of checked pages, downloaded once per site while fresh
+stylesheet_downloads = StylesheetDownloads.from_env()
+
+# Per-check timings cost a little on every element, so by default they are only
+# collected for reports that ask for a timing breakdown; A11Y_CHECK_TIMINGS=1
+# collects them for every analysis so /metrics has them too
+CHECK_TIMINGS = os.getenv('A11Y_CHECK_TIMINGS', '').lower() in ('1', 'true')
+
+# cProfile dumps of the slowest analyses, when A11Y_PROFILE_DIR is set
+profiler = SlowestProfiles.from_env()
+
+# Larger batches are queued as background jobs (see JOB_QUEUE) instead of
+# holding the request open; results are streamed, so memory does not grow with it
+MAX_SYNC_URLS = int(os.getenv('SYNC_MAX_URLS', 10))
+
+# Response formats of /analyze; the HTML report is the default
+STREAM_MIMETYPES = {
+    'html': 'text/html',
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream',
+}
+MAX_JOB_URLS = int(os.getenv('JOB_MAX_URLS', 50000))
+_job_worker = None
+_job_worker_lock = threading.Lock()
+
+# Crawls are stored in CRAWL_STORE and each runs on its own background thread
+_crawl_frontier = None
+_crawl_frontier_lock = threading.Lock()
+_crawl_config = None
+
+_fetch_config = None
+
+def get_fetch_config():
+    """Timeouts, pool limits and size cap for downloading pages, read from the environment once."""
+    global _fetch_config
+    if _fetch_config is None:
+        from utils.fetcher import FetchConfig
+        _fetch_config = FetchConfig.from_env()
+    return _fetch_config
+
+def get_crawl_config():
+    """Default and maximum crawl budgets and per-host limits, read from the environment once."""
+    global _crawl_config
+    if _crawl_config is None:
+        from utils.crawler import CrawlConfig
+        _crawl_config = CrawlConfig.from_env()
+    return _crawl_config
+
+def get_crawl_frontier():
+    global _crawl_frontier
+    with _crawl_frontier_lock:
+        if _crawl_frontier is None:
+            from utils.crawler import create_crawl_frontier
+            _crawl_frontier = create_crawl_frontier()
+        return _crawl_frontier
+
+def write_history(app, rows):
+    """Insert buffered AnalysisHistory rows in one transaction."""
+    try:
+        with HISTORY_WRITE_SECONDS.time(), app.app_context():
+            store_history(rows)
+    except Exception:
+        HISTORY_ROWS.inc(len(rows), outcome='failed')
+        raise
+    HISTORY_ROWS.inc(len(rows), outcome='written')
+
+def get_history_writer():
+    return current_app.extensions['history_writer']
 
-# Initialize database
-db.init_app(app)
+def get_analysis_executor():
+    global _analysis_executor
+    with _analysis_executor_lock:
+        if _analysis_executor is None:
+            from utils.executor import create_executor
+            _analysis_executor = create_executor(rule_set=rule_manager.snapshot())
+            atexit.register(_analysis_executor.shutdown)
+        return _analysis_executor
 
-# Create tables
-with app.app_context():
-    db.create_all()
+def get_job_worker():
+    global _job_worker
+    with _job_worker_lock:
+        if _job_worker is None:
+            # The worker thread has no app context of its own, so its callbacks push one
+            app = current_app._get_current_object()
+            _job_worker = JobWorker(
+                create_job_queue(),
+                analyze=lambda urls: analyze_urls_in_app(app, urls),
+                record=lambda url, outcome: record_outcome_in_app(app, url, outcome),
+                batch_size=int(os.getenv('JOB_BATCH_SIZE', 50)),
+                max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', 3)),
+                retryable=is_retryable,
+            )
+            _job_worker.start()
+            atexit.register(_job_worker.stop)
+        return _job_worker
+
+async def analyze_urls_in_app(app, urls):
+    with app.app_context():
+        sync_rules()
+        return await analyze_urls(urls, rule_manager.snapshot())
+
+def record_outcome_in_app(app, url, outcome):
+    with app.app_context():
+        return record_outcome(url, outcome)
+
+def sync_rules(force=False):
+    """Apply rule changes made by any worker, checking the store version at most every RULES_RELOAD_SECONDS."""
+    global _rules_checked_at
+    with _rules_sync_lock:
+        now = time.monotonic()
+        if not force and now - _rules_checked_at < RULES_RELOAD_SECONDS:
+            return
+        _rules_checked_at = now
+        try:
+            if rule_store_version() == rule_manager.version:
+                return
+            rule_manager.apply_changes(*rule_changes(rule_manager.version))
+        except Exception:
+            # Keep checking with the rules already loaded; the next poll tries again
+            logger.exception('Reloading custom rules failed')
+            db.session.rollback()
 
-# Store a11y checker instance globally for custom rules
-global_checker = AccessibilityChecker("<html></html>")
+@bp.before_request
+def refresh_rules():
+    sync_rules()
 
-@app.route('/')
+def is_retryable(error):
+    from utils.fetcher import FetchError, PageTooLarge
+    # Network failures and server errors are often transient; client errors
+    # and oversized pages will not go away on their own
+    if not isinstance(error, FetchError) or isinstance(error, PageTooLarge):
+        return False
+    status = getattr(error.__cause__, 'status', None)
+    return status is None or status >= 500 or status == 429
+
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/custom-rules-page')
+@bp.route('/custom-rules-page')
 def custom_rules_page():
     return render_template('custom_rules.html')
 
-@app.route('/history')
+def history_filters(args):
+    """Filters for query_history from request arguments; raises ValueError for malformed ones."""
+    filters = {
+        'url': args.get('url') or None,
+        'host': args.get('host') or None,
+        'category': args.get('category') or None,
+    }
+    for name in ('since', 'until'):
+        filters[name] = datetime.fromisoformat(args[name]) if args.get(name) else None
+    success = args.get('success', '').lower()
+    if success not in ('', 'true', 'false'):
+        raise ValueError('success must be true or false')
+    filters['success'] = None if not success else success == 'true'
+    return filters
+
+@bp.route('/history')
 def view_history():
-    with app.app_context():
-        page = request.args.get('page', 1, type=int)
-        per_page = 10
-        
-        # Get paginated history
-        history = AnalysisHistory.query.order_by(
-            AnalysisHistory.created_at.desc()
-        ).paginate(page=page, per_page=per_page)
-        
-        return render_template('history.html', history=history)
+    try:
+        filters = history_filters(request.args)
+        history, next_cursor = query_history(cursor=request.args.get('cursor'), limit=10, **filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-def analyze_single_url(url):
+    active_filters = {name: request.args[name] for name in ('url', 'host', 'since', 'until', 'success', 'category') if request.args.get(name)}
+    return render_template('history.html', history=history, next_cursor=next_cursor, filters=active_filters)
+
+@bp.route('/history/entries')
+def history_entries():
+    """History as JSON, newest first, filtered and paginated with an opaque cursor."""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    include_issues = request.args.get('issues', '').lower() in ('1', 'true')
     try:
-        # Parse HTML content
-        parser = HTMLParser(url)
-        html_content = parser.get_content()
-        
-        # Initialize checkers
-        color_validator = ColorValidator(html_content)
-        
-        # Use global checker for accessibility checks
-        global_checker.soup = BeautifulSoup(html_content, 'html.parser')
-        a11y_issues = global_checker.analyze()
-        color_issues = color_validator.validate()
-        
-        # Store results in database within app context
-        with app.app_context():
-            analysis = AnalysisHistory(
-                url=url,
-                accessibility_issues=a11y_issues,
-                color_issues=color_issues,
-                success=True
+        filters = history_filters(request.args)
+        items, next_cursor = query_history(cursor=request.args.get('cursor'), limit=limit, **filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'items': [item.to_dict(include_issues=include_issues) for item in items],
+        'next_cursor': next_cursor,
+    })
+
+@bp.route('/history/<int:analysis_id>/changes')
+def history_changes(analysis_id):
+    """Issues that are new, resolved or unchanged since the previous analysis of the same URL."""
+    analysis = db.session.get(AnalysisHistory, analysis_id)
+    if analysis is None:
+        return jsonify({'error': 'Analysis not found'}), 404
+    changes = analysis.changes_dict()
+    if changes is None:
+        return jsonify({'error': 'No previous successful analysis to compare with'}), 404
+    return jsonify(dict(changes, id=analysis.id, url=analysis.url))
+
+@bp.route('/history/latest')
+def history_latest():
+    """The latest analysis of every URL, optionally for one host."""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    include_issues = request.args.get('issues', '').lower() in ('1', 'true')
+    try:
+        items, next_cursor = query_latest(
+            host=request.args.get('host') or None,
+            cursor=request.args.get('cursor'),
+            limit=limit,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'items': [item.to_dict(include_issues=include_issues) for item in items],
+        'next_cursor': next_cursor,
+    })
+
+def record_success(url, a11y_issues, color_issues, page_hash=None, rules_fingerprint=None):
+    from utils.executor import analyzer_version
+    # Queue the row for the next bulk write
+    get_history_writer().add({
+        'url': url,
+        'accessibility_issues': a11y_issues,
+        'color_issues': color_issues,
+        'success': True,
+        'error_message': None,
+        'created_at': datetime.utcnow(),
+        'content_hash': page_hash,
+        'rules_fingerprint': rules_fingerprint,
+        'analyzer': analyzer_version()
+    })
+    
+    return {
+        'accessibility': a11y_issues,
+        'colors': color_issues,
+        'url': url,
+        'success': True
+    }
+
+def record_failure(url, error):
+    # Queue the error for the next bulk write
+    get_history_writer().add({
+        'url': url,
+        'accessibility_issues': None,
+        'color_issues': None,
+        'success': False,
+        'error_message': str(error),
+        'created_at': datetime.utcnow()
+    })
+    
+    return {
+        'url': url,
+        'error': str(error),
+        'success': False
+    }
+
+def record_outcome(url, outcome):
+    """Record a page's (accessibility, colors, page hash, rules fingerprint) outcome, or the exception raised for it."""
+    if isinstance(outcome, Exception):
+        return record_failure(url, outcome)
+    return record_success(url, *outcome)
+
+def reusable_result(url, page_hash, rules_fingerprint):
+    from utils.executor import analyzer_version
+    # Runs in a worker thread, so it gets a fresh app context and database session
+    with current_app._get_current_object().app_context():
+        return find_reusable_result(url, page_hash, rules_fingerprint, analyzer_version())
+
+def note_analysis(timings, source, **seconds):
+    """Count an analysis by where its result came from, and note it in the report's timings."""
+    ANALYSES.inc(source=source)
+    if timings is not None:
+        timings['source'] = source
+        timings.update(seconds)
+
+async def download_stylesheets(fetcher, links, timings=None):
+    """(key, text) of a page's linked stylesheets by href, so the color checks see its computed styles."""
+    started = time.perf_counter()
+    stylesheets = await stylesheet_downloads.download(fetcher, links)
+    if timings is not None:
+        timings['stylesheets'] = time.perf_counter() - started
+    return stylesheets
+
+async def check_page(executor, url, page, rule_set, stylesheets, timings=None):
+    """Run every check on a fetched page on the analysis executor, recording what it cost."""
+    profile = profiler is not None and profiler.should_profile()
+    a11y_issues, color_issues, stats = await asyncio.wrap_future(executor.submit(
+        page.content, page.charset, rule_set,
+        check_timings=CHECK_TIMINGS or timings is not None,
+        profile=profile,
+        stylesheets=stylesheets,
+    ))
+    record_analysis_timings(stats['timings'], stats['checks'])
+    if stats['profile'] is not None:
+        await asyncio.to_thread(profiler.offer, sum(stats['timings'].values()), url, stats['profile'])
+    if timings is not None:
+        timings.update(stats['timings'])
+        timings['checks'] = stats['checks']
+    return a11y_issues, color_issues
+
+async def fetch_page_issues(fetcher, executor, url, rule_set, timings=None):
+    """Fetch a page and return (accessibility issues, color issues, content hash).
+
+    The content hash covers the page and its linked stylesheets (see result_key).
+    Results are reused when neither changed, from the in-memory cache
+    or else from the page's latest analysis in the history. The content hash is
+    None for pages checked in streaming mode, whose partial results are not
+    stored for reuse by full analyses. timings, if given,
+    receives the seconds spent on each step, per check included, and the
+    'source' of the result.
+    """
+    from utils.fetcher import PageTooLarge
+    started = time.perf_counter()
+    try:
+        page = None
+        validators = result_cache.validators(url)
+        if validators:
+            page = await fetcher.fetch(url, etag=validators.etag, last_modified=validators.last_modified)
+            if page.not_modified:
+                key = validators.content_hash
+                if not validators.streamed:
+                    # The page is unchanged, but its stylesheets may not be
+                    key = result_key(key, await download_stylesheets(fetcher, validators.stylesheet_links, timings))
+                cached = result_cache.get(key, rule_set.version, validators.streamed)
+                if cached is not None:
+                    note_analysis(timings, 'cache', fetch=time.perf_counter() - started)
+                    return (*cached, None if validators.streamed else key)
+                # The cached result was evicted, so the body is needed after all
+                page = None
+        if page is None:
+            page = await fetcher.fetch(url)
+    except PageTooLarge:
+        # Too big to hold in memory, so analyze it while it downloads instead
+        return await stream_page_issues(fetcher, url, rule_set, timings)
+    return await fetched_page_issues(fetcher, executor, url, page, rule_set, timings, fetch=time.perf_counter() - started)
+
+async def fetched_page_issues(fetcher, executor, url, page, rule_set, timings=None, **seconds):
+    """(accessibility issues, color issues, content hash) of a downloaded page, reusing earlier results of the same content.
+
+    Its linked stylesheets are downloaded first, as their hashes are part of the content hash.
+    """
+    links = stylesheet_downloads.links(page.url, page.content)
+    stylesheets = await download_stylesheets(fetcher, links, timings)
+    html_hash = content_hash(page.content)
+    page_hash = result_key(html_hash, stylesheets)
+    if page.etag or page.last_modified:
+        result_cache.remember_validators(url, Validators(page.etag, page.last_modified, html_hash, stylesheet_links=links))
+
+    source = 'cache'
+    result = result_cache.get(page_hash, rule_set.version)
+    if result is None:
+        # A previous run, possibly before a restart, may have checked this exact content
+        source = 'history'
+        result = await asyncio.to_thread(reusable_result, url, page_hash, rule_set.fingerprint)
+    if result is None:
+        # Checking is CPU-bound, so it runs on the analysis executor
+        source = 'checked'
+        result = await check_page(executor, url, page, rule_set, stylesheets, timings)
+    note_analysis(timings, source, **seconds)
+    result_cache.put(page_hash, rule_set.version, result)
+    return (*result, page_hash)
+
+async def stream_page_issues(fetcher, url, rule_set, timings=None):
+    """Run the streaming checks on a page as its body arrives, with memory independent of page size."""
+    from utils.streaming import StreamingAnalyzer
+    started = time.perf_counter()
+    analyzer = StreamingAnalyzer()
+    digest = hashlib.sha256()
+    async with fetcher.stream(url) as page:
+        async for chunk in page.chunks:
+            digest.update(chunk)
+            await asyncio.to_thread(analyzer.feed_bytes, chunk, page.charset)
+    result = await asyncio.to_thread(analyzer.results)
+
+    page_hash = digest.hexdigest()
+    if page.etag or page.last_modified:
+        result_cache.remember_validators(url, Validators(page.etag, page.last_modified, page_hash, streamed=True))
+    # Fetching and checking overlap, so only their total is known
+    note_analysis(timings, 'streamed', streaming=time.perf_counter() - started)
+    result_cache.put(page_hash, rule_set.version, result, streamed=True)
+    # Without a content hash the history never offers this partial result for reuse
+    return (*result, None)
+
+async def stream_batch(urls, rule_set, with_timings=False):
+    """Fetch all URLs concurrently and yield each page's result as soon as it is checked.
+
+    with_timings adds each page's timing breakdown to its result as 'timings'.
+    """
+    from utils.fetcher import AsyncFetcher
+    from utils.templates import TemplateReport
+    executor = get_analysis_executor()
+    # Issues of a site's header, nav or footer are listed once, with the first page that has them
+    report = TemplateReport()
+    async with AsyncFetcher(get_fetch_config()) as fetcher:
+        async def fetch_and_analyze(url):
+            timings = {} if with_timings else None
+            try:
+                a11y_issues, color_issues, page_hash = await fetch_page_issues(
+                    fetcher, executor, url, rule_set, timings
+                )
+            except Exception as e:
+                return await asyncio.to_thread(record_failure, url, e)
+            result = await asyncio.to_thread(
+                record_success, url, a11y_issues, color_issues, page_hash, rule_set.fingerprint
             )
-            db.session.add(analysis)
-            db.session.commit()
-        
-        return {
-            'accessibility': a11y_issues,
-            'colors': color_issues,
-            'url': url,
-            'success': True
-        }
+            if with_timings:
+                result['timings'] = timings
+            return result
+
+        tasks = [asyncio.ensure_future(fetch_and_analyze(url)) for url in urls]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield report.attribute(await future)
+        finally:
+            # The client went away; stop the remaining pages before the fetcher closes
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+def iterate_async(results):
+    """Drive an async generator from synchronous code, such as a streamed response body."""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(results.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(results.aclose())
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+
+def batch_results(urls, rule_set, with_timings):
+    """Each URL's result in completion order, writing the batch's history once all are done."""
+    yield from iterate_async(stream_batch(urls, rule_set, with_timings))
+    # Write this batch's history now so it shows up right away
+    get_history_writer().flush()
+
+def ndjson_lines(results):
+    try:
+        for result in results:
+            yield json.dumps(result) + '\n'
     except Exception as e:
-        # Store error in database within app context
+        logger.exception('Streaming batch results failed')
+        yield json.dumps({'error': str(e)}) + '\n'
+
+def sse_events(results):
+    count = 0
+    try:
+        for result in results:
+            count += 1
+            yield f'event: result\ndata: {json.dumps(result)}\n\n'
+    except Exception as e:
+        logger.exception('Streaming batch results failed')
+        yield f'event: error\ndata: {json.dumps({"error": str(e)})}\n\n'
+        return
+    yield f'event: done\ndata: {json.dumps({"count": count})}\n\n'
+
+def report_results(results):
+    """results for the streamed HTML report, ended by a {'batch_error': message} entry if they fail."""
+    try:
+        yield from results
+    except Exception as e:
+        logger.exception('Streaming batch results failed')
+        yield {'batch_error': str(e)}
+
+def response_format():
+    """The format asked for with the 'format' field, else the best match for the Accept header."""
+    requested = request.form.get('format', '').lower()
+    if requested in STREAM_MIMETYPES:
+        return requested
+    best = request.accept_mimetypes.best_match(list(STREAM_MIMETYPES.values()), default='text/html')
+    return next(name for name, mimetype in STREAM_MIMETYPES.items() if mimetype == best)
+
+async def analyze_urls(urls, rule_set):
+    """Fetch and check URLs concurrently, returning each page's outcome for record_outcome in input order."""
+    from utils.fetcher import AsyncFetcher
+    executor = get_analysis_executor()
+
+    async def analyze_url(fetcher, url):
+        return (*await fetch_page_issues(fetcher, executor, url, rule_set), rule_set.fingerprint)
+
+    async with AsyncFetcher(get_fetch_config()) as fetcher:
+        return await asyncio.gather(*(analyze_url(fetcher, url) for url in urls), return_exceptions=True)
+
+async def run_crawl(crawl_id, rule_set):
+    """Crawl until the frontier is exhausted or the crawl is paused, analyzing and recording every new page."""
+    from utils.crawler import Crawler
+    from utils.fetcher import AsyncFetcher
+    executor = get_analysis_executor()
+    async with AsyncFetcher(get_fetch_config()) as fetcher:
+        async def analyze_page(url, page):
+            try:
+                if page is None:
+                    issues = await stream_page_issues(fetcher, url, rule_set)
+                else:
+                    issues = await fetched_page_issues(fetcher, executor, url, page, rule_set)
+            except Exception as e:
+                return await asyncio.to_thread(record_failure, url, e)
+            return await asyncio.to_thread(record_success, url, *issues, rule_set.fingerprint)
+
+        crawler = Crawler(get_crawl_frontier(), fetcher, analyze_page, get_crawl_config())
+        return await crawler.run(crawl_id)
+
+def start_crawl(crawl_id):
+    """Run a crawl already marked as running on a background thread of this process."""
+    # The thread has no app context of its own, so it pushes one
+    app = current_app._get_current_object()
+
+    def run():
         with app.app_context():
-            analysis = AnalysisHistory(
-                url=url,
-                success=False,
-                error_message=str(e)
-            )
-            db.session.add(analysis)
-            db.session.commit()
-        
-        return {
-            'url': url,
-            'error': str(e),
-            'success': False
-        }
+            try:
+                sync_rules(force=True)
+                asyncio.run(run_crawl(crawl_id, rule_manager.snapshot()))
+            except Exception:
+                logger.exception('Crawl %s failed', crawl_id)
 
-@app.route('/analyze', methods=['POST'])
+    threading.Thread(target=run, name=f'crawl-{crawl_id[:8]}', daemon=True).start()
+
+@bp.route('/analyze', methods=['POST'])
 def analyze():
     urls = request.form.get('urls', '').strip().split('\n')
     urls = [url.strip() for url in urls if url.strip()]
+    # async=1 queues the batch as a background job and returns its id right away
+    run_as_job = request.form.get('async', '').lower() in ('1', 'true', 'on')
+    # timings=1 adds a per-page breakdown of where the time went to the report
+    with_timings = request.form.get('timings', '').lower() in ('1', 'true', 'on')
     
     if not urls:
         return jsonify({'error': 'At least one URL is required'}), 400
         
-    if len(urls) > 10:
-        return jsonify({'error': 'Maximum 10 URLs allowed for batch processing'}), 400
+    if run_as_job and len(urls) > MAX_JOB_URLS:
+        return jsonify({'error': f'Maximum {MAX_JOB_URLS} URLs allowed per job'}), 400
+
+    if not run_as_job and len(urls) > MAX_SYNC_URLS:
+        return jsonify({'error': f'Maximum {MAX_SYNC_URLS} URLs allowed for batch processing; submit larger batches with async=1'}), 400
     
     # Validate URLs
     for url in urls:
@@ -129,24 +660,134 @@ def analyze():
         except Exception:
             return jsonify({'error': f'Invalid URL format: {url}'}), 400
     
+    if run_as_job:
+        queue = get_job_worker().queue
+        job_id = queue.enqueue(urls)
+        return jsonify(queue.status(job_id)), 202, {'Location': url_for('main.job_status', job_id=job_id)}
+
+    # Process URLs concurrently, all against the same rule set snapshot, and send
+    # each result as soon as it is ready
+    results = batch_results(urls, rule_manager.snapshot(), with_timings)
+    output = response_format()
+    # Proxies such as nginx would otherwise hold the chunks back
+    headers = {'X-Accel-Buffering': 'no'}
+    if output == 'ndjson':
+        return Response(stream_with_context(ndjson_lines(results)), mimetype=STREAM_MIMETYPES[output], headers=headers)
+    if output == 'sse':
+        headers['Cache-Control'] = 'no-cache'
+        return Response(stream_with_context(sse_events(results)), mimetype=STREAM_MIMETYPES[output], headers=headers)
+    return Response(stream_template('report.html', batch_results=report_results(results)), headers=headers)
+
+@bp.route('/metrics')
+def metrics():
+    """Fetch, parse, check and history timings and counters in the Prometheus text format."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    status = get_job_worker().queue.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(status)
+
+@bp.route('/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    queue = get_job_worker().queue
+    status = queue.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
+    return jsonify({
+        'job': status,
+        'page': page,
+        'per_page': per_page,
+        'results': queue.results(job_id, offset=(page - 1) * per_page, limit=per_page),
+    })
+
+@bp.route('/crawls', methods=['POST'])
+def create_crawl():
+    from utils.crawler import is_sitemap_url, normalize_url
+    data = request.get_json(silent=True) or request.form
+    seed = normalize_url(str(data.get('url', '')))
+    if seed is None:
+        return jsonify({'error': 'A valid http(s) seed URL is required'}), 400
+
+    config = get_crawl_config()
     try:
-        # Process URLs concurrently
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            future_to_url = {executor.submit(analyze_single_url, url): url for url in urls}
-            results = []
-            
-            for future in concurrent.futures.as_completed(future_to_url):
-                result = future.result()
-                results.append(result)
-        
-        return render_template('report.html', batch_results=results)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        max_depth = int(data.get('max_depth', config.max_depth))
+        max_pages = int(data.get('max_pages', config.max_pages))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_depth and max_pages must be integers'}), 400
+    if not 0 <= max_depth <= config.max_depth:
+        return jsonify({'error': f'max_depth must be between 0 and {config.max_depth}'}), 400
+    if not 1 <= max_pages <= config.max_pages:
+        return jsonify({'error': f'max_pages must be between 1 and {config.max_pages}'}), 400
+    # sitemap=1 treats the seed as a sitemap whatever its name
+    sitemap = str(data.get('sitemap', '')).lower() in ('1', 'true', 'on') or is_sitemap_url(seed)
+
+    frontier = get_crawl_frontier()
+    crawl_id = frontier.create(seed, max_depth, max_pages, sitemap)
+    frontier.start(crawl_id)
+    start_crawl(crawl_id)
+    return jsonify(frontier.status(crawl_id)), 202, {'Location': url_for('main.crawl_status', crawl_id=crawl_id)}
+
+@bp.route('/crawls/<crawl_id>', methods=['GET'])
+def crawl_status(crawl_id):
+    status = get_crawl_frontier().status(crawl_id)
+    if status is None:
+        return jsonify({'error': 'Crawl not found'}), 404
+    return jsonify(status)
+
+@bp.route('/crawls/<crawl_id>/pages', methods=['GET'])
+def crawl_pages(crawl_id):
+    frontier = get_crawl_frontier()
+    status = frontier.status(crawl_id)
+    if status is None:
+        return jsonify({'error': 'Crawl not found'}), 404
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
+    return jsonify({
+        'crawl': status,
+        'page': page,
+        'per_page': per_page,
+        'pages': frontier.pages(crawl_id, offset=(page - 1) * per_page, limit=per_page),
+    })
+
+@bp.route('/crawls/<crawl_id>/templates', methods=['GET'])
+def crawl_templates(crawl_id):
+    frontier = get_crawl_frontier()
+    status = frontier.status(crawl_id)
+    if status is None:
+        return jsonify({'error': 'Crawl not found'}), 404
+    return jsonify({'crawl': status, 'templates': frontier.templates(crawl_id)})
+
+@bp.route('/crawls/<crawl_id>/pause', methods=['POST'])
+def pause_crawl(crawl_id):
+    frontier = get_crawl_frontier()
+    if frontier.status(crawl_id) is None:
+        return jsonify({'error': 'Crawl not found'}), 404
+    if not frontier.pause(crawl_id):
+        return jsonify({'error': 'Crawl is not running'}), 409
+    # The pages in flight still finish; the crawl shows as paused right away
+    return jsonify(frontier.status(crawl_id))
+
+@bp.route('/crawls/<crawl_id>/resume', methods=['POST'])
+def resume_crawl(crawl_id):
+    frontier = get_crawl_frontier()
+    if frontier.status(crawl_id) is None:
+        return jsonify({'error': 'Crawl not found'}), 404
+    if not frontier.start(crawl_id):
+        return jsonify({'error': 'Crawl is not paused, or is still finishing the pages in flight'}), 409
+    start_crawl(crawl_id)
+    return jsonify(frontier.status(crawl_id)), 202
 
-@app.route('/custom-rules', methods=['GET'])
+@bp.route('/custom-rules', methods=['GET'])
 def list_custom_rules():
     rules = []
-    for rule in global_checker.custom_rule_manager.rules:
+    for rule in rule_manager.rules:
         rules.append({
             'name': rule.name,
             'description': rule.description,
@@ -158,7 +799,7 @@ def list_custom_rules():
         })
     return jsonify(rules)
 
-@app.route('/custom-rules', methods=['POST'])
+@bp.route('/custom-rules', methods=['POST'])
 def create_custom_rule():
     try:
         data = request.json
@@ -180,18 +821,21 @@ def create_custom_rule():
             severity=data.get('severity', 'warning')
         )
         
-        # Add rule to checker
-        global_checker.add_custom_rule(rule)
+        # Compiling rejects an invalid selector, condition or regex before it is stored
+        CompiledRule(rule)
+        save_rule(rule)
+        sync_rules(force=True)
         
         return jsonify({'message': 'Custom rule created successfully'}), 201
         
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
-@app.route('/custom-rules/<rule_name>', methods=['DELETE'])
+@bp.route('/custom-rules/<rule_name>', methods=['DELETE'])
 def delete_custom_rule(rule_name):
     try:
-        global_checker.remove_custom_rule(rule_name)
+        delete_rule(rule_name)
+        sync_rules(force=True)
         return jsonify({'message': 'Custom rule deleted successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 400
\ No newline at end of file
@@ -0,0 +1,4 @@
+from utils.bulk_audit import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Throughput of the process-pool analysis executor from 1 to N workers.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_executor [--max-workers N] [--pages N] [FILE ...]
+
+Without file arguments the pages in benchmarks/fixtures are used.
+"""
+import argparse
+import glob
+import os
+import time
+import concurrent.futures
+from utils.executor import ProcessAnalysisExecutor
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+def run_batch(executor, pages):
+    start = time.perf_counter()
+    futures = [executor.submit(page) for page in pages]
+    for future in concurrent.futures.as_completed(futures):
+        future.result()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='*', help='HTML files to analyze')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--pages', type=int, default=200, help='Pages analyzed per run')
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html')))
+    contents = []
+    for path in files:
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+    pages = [contents[i % len(contents)] for i in range(args.pages)]
+
+    baseline = None
+    print(f'{"workers":>7} {"pages/s":>10} {"speedup":>8}')
+    for workers in range(1, args.max_workers + 1):
+        executor = ProcessAnalysisExecutor(workers)
+        try:
+            # Warm every worker before timing
+            run_batch(executor, pages[:workers * 2])
+            elapsed = run_batch(executor, pages)
+        finally:
+            executor.shutdown()
+        throughput = len(pages) / elapsed
+        baseline = baseline or throughput
+        print(f'{workers:>7} {throughput:>10.1f} {throughput / baseline:>7.2f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Parse time per MB for each available HTML parser backend.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_parsers [--min-time SECONDS] [FILE ...]
+
+Without arguments the pages in benchmarks/fixtures are used.
+"""
+import argparse
+import glob
+import os
+import time
+from utils.document import ParsedDocument, available_parsers
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+def bench_backend(pages, backend, min_time):
+    total_bytes = 0
+    elapsed = 0.0
+    while elapsed < min_time:
+        for html in pages:
+            start = time.perf_counter()
+            ParsedDocument(html, parser=backend)
+            elapsed += time.perf_counter() - start
+            total_bytes += len(html.encode('utf-8'))
+    return elapsed / (total_bytes / 1_000_000)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='*', help='HTML files to parse')
+    parser.add_argument('--min-time', type=float, default=2.0,
+                        help='Minimum seconds spent parsing per backend')
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html')))
+    pages = []
+    for path in files:
+        with open(path, encoding='utf-8') as f:
+            pages.append(f.read())
+    size_kb = sum(len(page.encode('utf-8')) for page in pages) / 1000
+    print(f'{len(pages)} pages, {size_kb:.1f} KB total')
+
+    for backend in available_parsers():
+        seconds_per_mb = bench_backend(pages, backend, args.min_time)
+        print(f'{backend:12} {seconds_per_mb * 1000:10.1f} ms/MB')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Cold import time and worker boot latency of the web app.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup [--runs N] [--importtime]
+
+Every run is a fresh interpreter, as a newly started server worker would be.
+It measures importing app, calling create_app(), and serving a first
+request through the test client. The wall time includes interpreter start-up.
+With --importtime, the modules that take longest to import are listed too.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_BOOT = '''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+response = flask_app.test_client().get('/')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+}))
+'''
+
+def boot_once(env):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', _BOOT], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['wall_ms'] = (time.perf_counter() - start) * 1000
+    return result
+
+def slowest_imports(env, count=15):
+    """(cumulative microseconds, module) of the slowest imports when importing app."""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        imports.append((int(cumulative), module.rstrip()))
+    return sorted(imports, reverse=True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--importtime', action='store_true', help='List the slowest imports')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # Startup must not need a reachable database; point at a throwaway one
+    env.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+    runs = [boot_once(env) for _ in range(args.runs)]
+    print(f'{"step":18} {"median ms":>10} {"min ms":>10}')
+    for step in ('import_ms', 'create_app_ms', 'first_request_ms', 'wall_ms'):
+        values = [run[step] for run in runs]
+        print(f'{step[:-3]:18} {statistics.median(values):10.1f} {min(values):10.1f}')
+
+    if args.importtime:
+        print('\nSlowest imports (cumulative ms):')
+        for cumulative, module in slowest_imports(env):
+            print(f'{cumulative / 1000:10.1f}  {module}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Parse time, per-check timings, peak memory and throughput over the synthetic corpus.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_suite [--sizes 10K,100K,1M] [--profiles mixed] [--output results.json]
+                                     [--baseline previous.json] [--threshold 0.15]
+
+Every page is analyzed with the custom-rule stress set unless --no-custom-rules
+is given. With --baseline, timings and memory are compared against an earlier
+--output file; metrics that grew by more than --threshold are reported as
+regressions and the exit status is 1.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from utils.accessibility_checker import AccessibilityChecker
+from utils.color_validator import ColorValidator
+from utils.custom_rules import RuleSet
+from utils.document import ParsedDocument, default_parser
+from benchmarks.corpus import DEFAULT_SEED, PROFILES, SIZES, corpus, stress_rules
+
+# Pages up to this size are timed --repeat times and the fastest run is kept
+REPEAT_LIMIT = 1_000_000
+# Differences below this many seconds are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.002
+
+def analyze(content, rule_set, timings=None):
+    document = ParsedDocument(content)
+    a11y_issues = AccessibilityChecker(document, rule_set).analyze(timings)
+    color_issues = ColorValidator(document).validate(timings)
+    return a11y_issues, color_issues
+
+def bench_page(content, rule_set, repeat, measure_memory):
+    runs = repeat if len(content) <= REPEAT_LIMIT else 1
+    parse_seconds = analyze_seconds = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        document = ParsedDocument(content)
+        parsed = time.perf_counter()
+        a11y_issues = AccessibilityChecker(document, rule_set).analyze()
+        color_issues = ColorValidator(document).validate()
+        done = time.perf_counter()
+        parse_seconds = min(parse_seconds, parsed - start)
+        analyze_seconds = min(analyze_seconds, done - parsed)
+        del document
+
+    # Timing every handler slows the walk down, so per-check numbers come from a separate run
+    checks = {}
+    analyze(content, rule_set, checks)
+
+    result = {
+        'bytes': len(content),
+        'parse_seconds': parse_seconds,
+        'analyze_seconds': analyze_seconds,
+        'total_seconds': parse_seconds + analyze_seconds,
+        'throughput_mb_s': len(content) / 1_000_000 / (parse_seconds + analyze_seconds),
+        'checks': dict(sorted(checks.items(), key=lambda item: -item[1])),
+        'accessibility_issues': len(a11y_issues),
+        'color_issues': len(color_issues),
+    }
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            analyze(content, rule_set)
+            result['peak_memory_mb'] = tracemalloc.get_traced_memory()[1] / 1_000_000
+        finally:
+            tracemalloc.stop()
+    return result
+
+def compare(results, baseline, threshold):
+    """Describe every metric that is more than threshold worse than in baseline."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        metrics = [(metric, previous.get(metric), current.get(metric))
+                   for metric in ('parse_seconds', 'analyze_seconds', 'total_seconds', 'peak_memory_mb')]
+        metrics += [('checks.' + check, previous.get('checks', {}).get(check), seconds)
+                    for check, seconds in current['checks'].items()]
+        for metric, before, after in metrics:
+            if before is None or after is None or after <= before * (1 + threshold):
+                continue
+            if metric.endswith('seconds') or metric.startswith('checks.'):
+                if after - before < MIN_REGRESSION_SECONDS:
+                    continue
+            regressions.append(f'{name} {metric}: {before:.4f} -> {after:.4f} (+{(after / before - 1) * 100:.0f}%)')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(SIZES), help='Comma-separated page sizes, e.g. 10K,1M')
+    parser.add_argument('--profiles', default=','.join(PROFILES), help='Comma-separated corpus profiles')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs for pages up to 1 MB')
+    parser.add_argument('--no-custom-rules', action='store_true', help='Skip the custom-rule stress set')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the peak memory run')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Results JSON from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='Relative slowdown reported as a regression (default 0.15)')
+    args = parser.parse_args()
+
+    rule_set = RuleSet() if args.no_custom_rules else RuleSet(1, tuple(stress_rules()))
+    results = {}
+    print(f'{"page":16} {"KB":>10} {"parse ms":>10} {"checks ms":>10} {"MB/s":>8} {"peak MB":>8}  slowest check')
+    for name, content in corpus(args.profiles.split(','), args.sizes.split(','), args.seed):
+        result = bench_page(content, rule_set, args.repeat, not args.no_memory)
+        results[name] = result
+        slowest = next(iter(result['checks']), '')
+        peak = f'{result["peak_memory_mb"]:8.1f}' if 'peak_memory_mb' in result else f'{"-":>8}'
+        print(f'{name:16} {result["bytes"] / 1000:10.1f} {result["parse_seconds"] * 1000:10.1f} '
+              f'{result["analyze_seconds"] * 1000:10.1f} {result["throughput_mb_s"]:8.2f} {peak}  {slowest}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'created_at': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'parser': default_parser(),
+                'seed': args.seed,
+                'custom_rules': len(rule_set.rules),
+                'results': results,
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions against {args.baseline}')
+
+if __name__ == '__main__':
+    main()
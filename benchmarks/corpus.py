@@ -0,0 +1,163 @@
+"""Synthetic page corpus for benchmarking the checks.
+
+Pages are generated deterministically from a seed, so two runs of the suite
+measure identical input. Each profile stresses a different part of the
+analyzers:
+
+    forms   - many inputs, some labelled and some not, plus styled buttons
+    nested  - deep chains of nested divs with inline styles and backgrounds
+    spans   - huge numbers of small inline elements with text colors
+    tables  - big data tables with and without headers
+    mixed   - a blend of all of the above, closest to a real page
+
+Write the corpus to disk with:
+
+    python -m benchmarks.corpus [--out DIR] [--sizes 10K,1M] [--profiles forms,tables]
+"""
+import argparse
+import os
+import random
+from utils.custom_rules import CustomRule
+
+PROFILES = ('forms', 'nested', 'spans', 'tables', 'mixed')
+SIZES = ('10K', '100K', '1M', '10M', '50M')
+DEFAULT_SEED = 1
+
+_UNITS = {'K': 1000, 'M': 1000 * 1000}
+
+_COLORS = ('#000000', '#333333', '#767676', '#777777', '#cccccc', '#ffffff', '#0071bc', '#e31c3d', '#fdb81e')
+_WORDS = ('access', 'audit', 'button', 'content', 'form', 'label', 'page', 'report', 'table', 'text', 'user', 'value')
+
+def parse_size(size: str) -> int:
+    """Bytes in a size such as '10K', '50M' or '2048'."""
+    size = size.strip().upper()
+    if size[-1:] in _UNITS:
+        return int(float(size[:-1]) * _UNITS[size[-1]])
+    return int(size)
+
+def _words(rng, count):
+    return ' '.join(rng.choice(_WORDS) for _ in range(count))
+
+def _style(rng):
+    return f'color: {rng.choice(_COLORS)}; background-color: {rng.choice(_COLORS)}'
+
+def _form_block(rng, n):
+    fields = []
+    for i in range(8):
+        field_id = f'f{n}-{i}'
+        kind = rng.choice(('text', 'email', 'checkbox', 'hidden', 'submit'))
+        if rng.random() < 0.6:
+            fields.append(f'<label for="{field_id}">{_words(rng, 2)}</label>')
+        fields.append(f'<input type="{kind}" id="{field_id}" name="{field_id}">')
+    fields.append(f'<select id="s{n}"><option>{_words(rng, 1)}</option><option>{_words(rng, 1)}</option></select>')
+    fields.append(f'<textarea id="t{n}"></textarea>')
+    fields.append(f'<button class="usa-button" style="{_style(rng)}" tabindex="{rng.choice((0, 1))}">'
+                  f'{_words(rng, 1)}</button>')
+    return f'<form action="/submit/{n}">{"".join(fields)}</form>\n'
+
+def _nested_block(rng, n):
+    depth = rng.randint(20, 80)
+    opening = ''.join(
+        f'<div class="level-{d}" style="background-color: {rng.choice(_COLORS)}">' for d in range(depth)
+    )
+    leaf = f'<p style="{_style(rng)}">{_words(rng, 6)}</p><img src="/n{n}.png">'
+    return opening + leaf + '</div>' * depth + '\n'
+
+def _spans_block(rng, n):
+    spans = ''.join(
+        f'<span style="color: {rng.choice(_COLORS)}">{_words(rng, 2)}</span> ' for _ in range(40)
+    )
+    return f'<p id="p{n}">{spans}<a href="/s{n}" onclick="go()">{_words(rng, 1)}</a></p>\n'
+
+def _table_block(rng, n):
+    columns = rng.randint(4, 10)
+    rows = []
+    if rng.random() < 0.5:
+        rows.append('<tr>' + ''.join(f'<th>{_words(rng, 1)}</th>' for _ in range(columns)) + '</tr>')
+    for _ in range(rng.randint(20, 60)):
+        rows.append('<tr>' + ''.join(f'<td>{rng.randint(0, 99999)}</td>' for _ in range(columns)) + '</tr>')
+    caption = f'<caption>{_words(rng, 3)}</caption>' if rng.random() < 0.5 else ''
+    return f'<table>{caption}{"".join(rows)}</table>\n'
+
+def _heading_block(rng, n):
+    level = rng.choice((1, 2, 2, 3, 4, 6))
+    return (f'<h{level}>{_words(rng, 4)}</h{level}>'
+            f'<ul><li>{_words(rng, 3)}</li><li>{_words(rng, 3)}</li></ul>'
+            f'<img src="/h{n}.png" alt="{_words(rng, 2) if rng.random() < 0.5 else ""}">'
+            f'<div role="{rng.choice(("button", "navigation", "bogus"))}" aria-label="{_words(rng, 1)}">'
+            f'{_words(rng, 8)}</div>\n')
+
+_BLOCKS = {
+    'forms': (_form_block,),
+    'nested': (_nested_block,),
+    'spans': (_spans_block,),
+    'tables': (_table_block,),
+    'mixed': (_form_block, _nested_block, _spans_block, _table_block, _heading_block),
+}
+
+def generate_page(profile: str, size: int, seed: int = DEFAULT_SEED) -> bytes:
+    """A page of the given profile, padded with blocks until it is at least size bytes."""
+    if profile not in _BLOCKS:
+        raise ValueError(f'Unknown corpus profile: {profile}')
+    rng = random.Random(f'{profile}:{size}:{seed}')
+    blocks = _BLOCKS[profile]
+    parts = [f'<!DOCTYPE html><html lang="en"><head><title>{profile} benchmark</title></head><body>'
+             '<a href="#main">Skip to content</a><nav><a href="/">Home</a></nav><main id="main">\n']
+    length = len(parts[0])
+    n = 0
+    while length < size:
+        block = rng.choice(blocks)(rng, n)
+        parts.append(block)
+        length += len(block)
+        n += 1
+    parts.append('</main><footer><p>Benchmark page</p></footer></body></html>\n')
+    return ''.join(parts).encode('utf-8')
+
+def corpus(profiles=PROFILES, sizes=SIZES, seed: int = DEFAULT_SEED):
+    """Yield (name, content) for every profile and size, smallest pages first."""
+    for size in sorted(sizes, key=parse_size):
+        for profile in profiles:
+            yield f'{profile}-{size}', generate_page(profile, parse_size(size), seed)
+
+def stress_rules():
+    """Custom rules covering every condition type and both the tag-indexed and any-element paths."""
+    return [
+        CustomRule('bench-img-title', 'Images have a title', 'img', 'has_attr:title',
+                   'Image has a title attribute', 'Prefer alt text over title', 'warning'),
+        CustomRule('bench-submit', 'Submit inputs', 'input[type="submit"]', 'exists',
+                   'Submit input found', 'Use a button element', 'warning'),
+        CustomRule('bench-checkbox', 'Checkbox inputs', 'form input', 'attr_equals:type=checkbox',
+                   'Checkbox input found', 'Group checkboxes in a fieldset', 'warning'),
+        CustomRule('bench-click-here', 'Vague link text', 'a', 'contains_text:click',
+                   'Link says "click"', 'Describe the link target', 'error'),
+        CustomRule('bench-inline-color', 'Inline colors', 'span', 'matches:#[0-9a-f]{6}',
+                   'Inline color on span', 'Move colors to a stylesheet', 'warning'),
+        CustomRule('bench-table-cells', 'Numeric cells', 'table td', 'matches:\\d{5}',
+                   'Large number in table', 'Format large numbers', 'warning'),
+        CustomRule('bench-nested-div', 'Nested levels', 'div.level-10 > div', 'exists',
+                   'Deeply nested div', 'Flatten the markup', 'warning'),
+        CustomRule('bench-role', 'Any element with a role', '[role]', 'has_attr:aria-label',
+                   'Role with a label', 'Check the role is needed', 'warning'),
+        CustomRule('bench-first-child', 'First list items', 'li:first-child', 'exists',
+                   'First list item', 'None', 'warning'),
+        CustomRule('bench-never', 'Never matches', 'blink', 'not_exists',
+                   'Never reported', 'None', 'warning'),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', default='benchmark-corpus', help='Directory to write the pages to')
+    parser.add_argument('--sizes', default=','.join(SIZES), help='Comma-separated page sizes')
+    parser.add_argument('--profiles', default=','.join(PROFILES), help='Comma-separated page profiles')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for name, content in corpus(args.profiles.split(','), args.sizes.split(','), args.seed):
+        path = os.path.join(args.out, name + '.html')
+        with open(path, 'wb') as f:
+            f.write(content)
+        print(f'{path}: {len(content) / 1000:.1f} KB')
+
+if __name__ == '__main__':
+    main()
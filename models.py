@@ -1,27 +1,710 @@
+import base64
+import hashlib
 from datetime import datetime
+from urllib.parse import urlparse
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, delete, exists, func, insert, inspect, or_, select, text, update
 from sqlalchemy.dialects.postgresql import JSONB
+from utils.custom_rules import CustomRule
+from utils.issues import Issue
 
 db = SQLAlchemy()
 
+# JSONB on PostgreSQL, plain JSON elsewhere (e.g. SQLite for local runs);
+# None is stored as SQL NULL, as for rows of failed analyses
+IssueList = db.JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), 'postgresql')
+
+class IssueTemplate(db.Model):
+    """One distinct kind of issue; its message may contain an '{element}' placeholder."""
+    __tablename__ = 'issue_templates'
+
+    key = db.Column(db.String(16), primary_key=True)
+    type = db.Column(db.String(16), nullable=False)
+    category = db.Column(db.Text, nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    recommendation = db.Column(db.Text, nullable=False)
+
+class IssueSnippet(db.Model):
+    """Markup of an element that issues refer to, stored once however often it is reported."""
+    __tablename__ = 'issue_snippets'
+
+    key = db.Column(db.String(16), primary_key=True)
+    markup = db.Column(db.Text, nullable=False)
+
 class AnalysisHistory(db.Model):
     __tablename__ = 'analysis_history'
-    
+    __table_args__ = (
+        # Keyset pagination walks (created_at, id) newest first, optionally per URL or host
+        db.Index('ix_analysis_history_created_at_id', 'created_at', 'id'),
+        db.Index('ix_analysis_history_url_created_at', 'url', 'created_at'),
+        db.Index('ix_analysis_history_host_created_at', 'host', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     url = db.Column(db.String(2048), nullable=False)
-    accessibility_issues = db.Column(JSONB)
-    color_issues = db.Column(JSONB)
+    host = db.Column(db.String(255))
+    # Issues are stored as [template key, snippet key, selector, page template,
+    # value] entries without trailing Nones; rows written before the catalogue
+    # existed hold the full issue dicts instead
+    accessibility_refs = db.Column('accessibility_issues', IssueList)
+    color_refs = db.Column('color_issues', IssueList)
     success = db.Column(db.Boolean, default=True)
     error_message = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # What was analyzed, so an unchanged page can reuse this result in a later run
+    content_hash = db.Column(db.String(64))
+    rules_fingerprint = db.Column(db.String(16))
+    # Analyzer version and HTML parser that produced the issues (see analyzer_version)
+    analyzer = db.Column(db.String(64))
+    # Difference to the previous successful analysis of the URL:
+    # {'previous_id': id, 'new': [indexes into the issues], 'resolved': [entries]}
+    changes = db.Column(IssueList)
+
+    @property
+    def accessibility_issues(self):
+        return self._expanded_issues()[0]
+
+    @property
+    def color_issues(self):
+        return self._expanded_issues()[1]
+
+    def _expanded_issues(self):
+        # Rebuilt on first access only, with one snippet query for both lists
+        expanded = self.__dict__.get('_expanded')
+        if expanded is None:
+            refs = (self.accessibility_refs, self.color_refs)
+            snippets = _load_snippets(refs)
+            expanded = tuple(expand_issues(entries, snippets) for entries in refs)
+            self.__dict__['_expanded'] = expanded
+        return expanded
+
+    def changes_dict(self):
+        """New, resolved and unchanged issues compared to the previous analysis of the URL, or None."""
+        if not self.changes:
+            return None
+        current = (self.accessibility_issues or []) + (self.color_issues or [])
+        fingerprints = entry_fingerprints((self.accessibility_refs or []) + (self.color_refs or []))
+        resolved_entries = self.changes['resolved']
+        new = set(self.changes['new'])
+
+        def with_fingerprint(issue, fingerprint):
+            return dict(issue, fingerprint=fingerprint)
 
-    def to_dict(self):
         return {
+            'previous_id': self.changes['previous_id'],
+            'new': [with_fingerprint(current[i], fingerprints[i]) for i in sorted(new)],
+            'resolved': [
+                with_fingerprint(issue, fingerprint) for issue, fingerprint in zip(
+                    expand_issues(resolved_entries, _load_snippets([resolved_entries])),
+                    entry_fingerprints(resolved_entries),
+                )
+            ],
+            'unchanged': [
+                with_fingerprint(issue, fingerprint)
+                for i, (issue, fingerprint) in enumerate(zip(current, fingerprints)) if i not in new
+            ],
+        }
+
+    def to_dict(self, include_issues=True):
+        data = {
             'id': self.id,
             'url': self.url,
-            'accessibility_issues': self.accessibility_issues,
-            'color_issues': self.color_issues,
             'success': self.success,
             'error_message': self.error_message,
             'created_at': self.created_at.isoformat()
         }
+        if include_issues:
+            data['accessibility_issues'] = self.accessibility_issues
+            data['color_issues'] = self.color_issues
+        else:
+            # Counts come straight from the stored references, without expanding them
+            data['accessibility_issue_count'] = len(self.accessibility_refs or ())
+            data['color_issue_count'] = len(self.color_refs or ())
+        return data
+
+class AnalysisCategory(db.Model):
+    """Issue categories found by an analysis, for filtering history by category."""
+    __tablename__ = 'analysis_categories'
+    __table_args__ = (
+        db.Index('ix_analysis_categories_category', 'category', 'analysis_id'),
+    )
+
+    analysis_id = db.Column(db.Integer, db.ForeignKey('analysis_history.id', ondelete='CASCADE'), primary_key=True)
+    category = db.Column(db.String(255), primary_key=True)
+
+class LatestAnalysis(db.Model):
+    """The most recent analysis of each URL, kept up to date as history is written."""
+    __tablename__ = 'latest_analysis'
+    __table_args__ = (
+        db.Index('ix_latest_analysis_created_at', 'created_at', 'analysis_id'),
+        db.Index('ix_latest_analysis_host_created_at', 'host', 'created_at'),
+    )
+
+    url = db.Column(db.String(2048), primary_key=True)
+    host = db.Column(db.String(255))
+    analysis_id = db.Column(db.Integer, db.ForeignKey('analysis_history.id'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    analysis = db.relationship(AnalysisHistory, lazy='joined')
+
+class StoredRule(db.Model):
+    """A custom rule, keyed by name.
+
+    version is the rule store version of the rule's last change. Deleted rules stay
+    as tombstones so workers that poll for changes see the deletion.
+    """
+    __tablename__ = 'custom_rules'
+    __table_args__ = (
+        db.Index('ix_custom_rules_version', 'version'),
+    )
+
+    name = db.Column(db.String(255), primary_key=True)
+    description = db.Column(db.Text, nullable=False)
+    selector = db.Column(db.Text, nullable=False)
+    condition = db.Column(db.Text, nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    recommendation = db.Column(db.Text, nullable=False)
+    severity = db.Column(db.String(16), nullable=False)
+    # Rules are evaluated, and their issues reported, in position order
+    position = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+
+    def to_rule(self) -> CustomRule:
+        return CustomRule(self.name, self.description, self.selector, self.condition,
+                          self.message, self.recommendation, self.severity)
+
+class RuleStoreVersion(db.Model):
+    """Single row holding the rule store version, incremented by every rule change."""
+    __tablename__ = 'custom_rule_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+
+# Catalogue entries known to be committed, so repeated templates and snippets
+# are not sent again; templates are also kept here for expanding issues
+_templates = {}
+_stored_snippets = set()
+_MAX_REMEMBERED_TEMPLATES = 100000
+_MAX_REMEMBERED_SNIPPETS = 100000
+
+def _remember_templates(templates) -> None:
+    """Remember committed templates, given as key -> (type, category, message, recommendation)."""
+    # Messages that embed a color or a ratio make new templates without end
+    if len(_templates) + len(templates) > _MAX_REMEMBERED_TEMPLATES:
+        _templates.clear()
+    _templates.update(templates)
+
+def _catalogue_key(*parts) -> str:
+    return hashlib.sha256('\0'.join(parts).encode('utf-8', 'surrogatepass')).hexdigest()[:16]
+
+def compact_issues(issues, templates, snippets):
+    """Encode issues as catalogue references, collecting catalogue rows that still need storing."""
+    if issues is None:
+        return None
+    entries = []
+    for issue in issues:
+        # Issues that embed an element or a measured value carry their template separately
+        template = getattr(issue, 'template', issue['message'])
+        template_key = _catalogue_key(issue['type'], issue['category'], template, issue['recommendation'])
+        if template_key not in _templates:
+            templates[template_key] = {
+                'key': template_key,
+                'type': issue['type'],
+                'category': issue['category'],
+                'message': template,
+                'recommendation': issue['recommendation']
+            }
+
+        snippet = getattr(issue, 'snippet', None)
+        snippet_key = None
+        if snippet is not None:
+            snippet_key = _catalogue_key(snippet)
+            if snippet_key not in _stored_snippets:
+                snippets[snippet_key] = {'key': snippet_key, 'markup': snippet}
+
+        # The page template is kept so a reused result still lists the issue under it
+        entry = [template_key, snippet_key, getattr(issue, 'selector', None),
+                 issue.get('page_template'), getattr(issue, 'value', None)]
+        while entry[-1] is None and len(entry) > 3:
+            entry.pop()
+        entries.append(entry)
+    return entries
+
+def _entry_fields(entry):
+    """(template key, snippet key, selector, page template, value) of a stored entry, which omits trailing Nones."""
+    return tuple(entry) + (None,) * (5 - len(entry))
+
+def expand_issues(entries, snippets):
+    """Rebuild issue dicts from catalogue references; snippets maps snippet keys to markup."""
+    if entries is None:
+        return None
+    needed = {entry[0] for entry in entries if isinstance(entry, list)}
+    templates = {key: _templates[key] for key in needed if key in _templates}
+    missing = needed - templates.keys()
+    if missing:
+        loaded = {
+            template.key: (template.type, template.category, template.message, template.recommendation)
+            for template in db.session.execute(select(IssueTemplate).where(IssueTemplate.key.in_(missing))).scalars()
+        }
+        templates.update(loaded)
+        _remember_templates(loaded)
+
+    issues = []
+    for entry in entries:
+        if not isinstance(entry, list):
+            # Stored in full before the catalogue existed
+            issues.append(entry)
+            continue
+        template_key, snippet_key, selector, page_template, value = _entry_fields(entry)
+        type, category, message, recommendation = templates[template_key]
+        if snippet_key is not None or value is not None:
+            # Rebuilt as an Issue so storing it again yields the same references
+            snippet = snippets.get(snippet_key, '') if snippet_key is not None else None
+            issue = Issue(type, category, message, recommendation, snippet, selector, value)
+        else:
+            issue = {
+                'type': type,
+                'category': category,
+                'message': message,
+                'recommendation': recommendation
+            }
+        if page_template is not None:
+            issue['page_template'] = page_template
+        issues.append(issue)
+    return issues
+
+def _load_snippets(entry_lists):
+    """Markup of every snippet referenced by the given entry lists, keyed by snippet key."""
+    keys = {
+        entry[1] for entries in entry_lists for entry in entries or ()
+        if isinstance(entry, list) and entry[1]
+    }
+    if not keys:
+        return {}
+    return dict(db.session.execute(
+        select(IssueSnippet.key, IssueSnippet.markup).where(IssueSnippet.key.in_(keys))
+    ).all())
+
+def entry_fingerprints(entries):
+    """Stable fingerprint of each stored issue entry.
+
+    An issue is identified by its template, its measured value if any, and the
+    element it points at (selector path, else snippet). Repeats of the same issue
+    are told apart by their order.
+    """
+    seen = {}
+    fingerprints = []
+    for entry in entries:
+        if isinstance(entry, list):
+            template_key, snippet_key, selector, _, value = _entry_fields(entry)
+            identity = f'{template_key}|{selector or snippet_key or ""}'
+            if value is not None:
+                # A different measurement is a different issue, as when the value was part of the template
+                identity += f'|{value}'
+        else:
+            identity = '|'.join(str(entry.get(key)) for key in ('type', 'category', 'message', 'recommendation'))
+        occurrence = seen.get(identity, 0)
+        seen[identity] = occurrence + 1
+        fingerprints.append(_catalogue_key(identity, str(occurrence)))
+    return fingerprints
+
+def compare_entries(previous, current):
+    """Indexes of new entries in current, and the entries of previous that were resolved."""
+    previous_fingerprints = entry_fingerprints(previous)
+    current_fingerprints = entry_fingerprints(current)
+    previous_set = set(previous_fingerprints)
+    current_set = set(current_fingerprints)
+    new = [i for i, fingerprint in enumerate(current_fingerprints) if fingerprint not in previous_set]
+    resolved = [entry for entry, fingerprint in zip(previous, previous_fingerprints) if fingerprint not in current_set]
+    return new, resolved
+
+def _dialect_insert():
+    """The insert() construct of the current dialect when it supports ON CONFLICT, else None."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+def _insert_missing(model, rows):
+    """Insert catalogue rows, skipping keys another writer has already stored."""
+    dialect_insert = _dialect_insert()
+    if dialect_insert is None:
+        keys = [row['key'] for row in rows]
+        existing = set(db.session.execute(select(model.key).where(model.key.in_(keys))).scalars())
+        rows = [row for row in rows if row['key'] not in existing]
+        if rows:
+            db.session.execute(insert(model), rows)
+        return
+    db.session.execute(dialect_insert(model.__table__).on_conflict_do_nothing(index_elements=['key']), rows)
+
+def _update_latest(rows):
+    """Point latest_analysis at the given rows unless a newer analysis of the URL is already there."""
+    latest = {}
+    for row in rows:
+        # One row per URL, as a single upsert statement may not touch a row twice
+        if row['url'] not in latest or row['created_at'] >= latest[row['url']]['created_at']:
+            latest[row['url']] = row
+    rows = list(latest.values())
+
+    dialect_insert = _dialect_insert()
+    if dialect_insert is None:
+        current = dict(db.session.execute(
+            select(LatestAnalysis.url, LatestAnalysis.created_at).where(LatestAnalysis.url.in_(list(latest)))
+        ).all())
+        rows = [row for row in rows if row['url'] not in current or row['created_at'] >= current[row['url']]]
+        if rows:
+            db.session.execute(delete(LatestAnalysis).where(LatestAnalysis.url.in_([row['url'] for row in rows])))
+            db.session.execute(insert(LatestAnalysis), rows)
+        return
+
+    table = LatestAnalysis.__table__
+    statement = dialect_insert(table)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['url'],
+        set_={
+            'analysis_id': statement.excluded.analysis_id,
+            'created_at': statement.excluded.created_at,
+            'host': statement.excluded.host,
+        },
+        where=statement.excluded.created_at >= table.c.created_at,
+    ), rows)
+
+def _previous_analyses(urls):
+    """Id and issue entries of the latest successful analysis of each URL.
+
+    Read through latest_analysis, so the cost does not grow with the history.
+    Only URLs whose latest analysis failed, or that have no latest entry yet,
+    search their history.
+    """
+    rows = db.session.execute(
+        select(AnalysisHistory.id, AnalysisHistory.url, AnalysisHistory.success,
+               AnalysisHistory.accessibility_refs, AnalysisHistory.color_refs)
+        .join(LatestAnalysis, LatestAnalysis.analysis_id == AnalysisHistory.id)
+        .where(LatestAnalysis.url.in_(urls))
+    ).all()
+    previous = {
+        url: (analysis_id, (a11y or []) + (colors or []))
+        for analysis_id, url, success, a11y, colors in rows if success
+    }
+    remaining = list(set(urls) - previous.keys())
+    if remaining:
+        previous.update(_latest_successful(remaining))
+    return previous
+
+def _latest_successful(urls):
+    ranked = select(
+        AnalysisHistory.id,
+        AnalysisHistory.url,
+        AnalysisHistory.accessibility_refs.label('accessibility_refs'),
+        AnalysisHistory.color_refs.label('color_refs'),
+        func.row_number().over(
+            partition_by=AnalysisHistory.url,
+            order_by=(AnalysisHistory.created_at.desc(), AnalysisHistory.id.desc()),
+        ).label('rank'),
+    ).where(AnalysisHistory.url.in_(urls), AnalysisHistory.success.is_(True)).subquery()
+    rows = db.session.execute(
+        select(ranked.c.id, ranked.c.url, ranked.c.accessibility_refs, ranked.c.color_refs).where(ranked.c.rank == 1)
+    ).all()
+    return {url: (analysis_id, (a11y or []) + (colors or [])) for analysis_id, url, a11y, colors in rows}
+
+def _store_rows(rows, templates, snippets):
+    values = []
+    categories = []
+    for row in rows:
+        a11y_issues = row.pop('accessibility_issues', None)
+        color_issues = row.pop('color_issues', None)
+        categories.append({issue['category'] for issue in (a11y_issues or []) + (color_issues or [])})
+        row['accessibility_refs'] = compact_issues(a11y_issues, templates, snippets)
+        row['color_refs'] = compact_issues(color_issues, templates, snippets)
+        values.append(row)
+
+    previous = _previous_analyses([row['url'] for row in values if row['success']])
+    for row in values:
+        if row['success'] and row['url'] in previous:
+            previous_id, previous_entries = previous[row['url']]
+            new, resolved = compare_entries(previous_entries, (row['accessibility_refs'] or []) + (row['color_refs'] or []))
+            row['changes'] = {'previous_id': previous_id, 'new': new, 'resolved': resolved}
+
+    ids = db.session.scalars(
+        insert(AnalysisHistory).returning(AnalysisHistory.id, sort_by_parameter_order=True), values
+    ).all()
+
+    category_rows = [
+        {'analysis_id': analysis_id, 'category': category[:255]}
+        for analysis_id, names in zip(ids, categories) for category in names
+    ]
+    if category_rows:
+        db.session.execute(insert(AnalysisCategory), category_rows)
+    _update_latest([
+        {'url': row['url'], 'host': row['host'], 'analysis_id': analysis_id, 'created_at': row['created_at']}
+        for analysis_id, row in zip(ids, values)
+    ])
+
+def store_history(rows):
+    """Insert AnalysisHistory rows in bulk, together with their catalogue, category and latest-per-URL entries.
+
+    Each row is a dict of column values whose accessibility_issues and
+    color_issues hold the full issue lists. Successful rows also get the
+    changes since the previous successful analysis of their URL. Must run in
+    an app context.
+    """
+    # Rows are stored in rounds with each URL at most once per round, so a URL
+    # analyzed twice in one batch is compared against its earlier row
+    rounds = []
+    occurrences = {}
+    for row in rows:
+        row = dict(row)
+        row.setdefault('host', urlparse(row['url']).hostname)
+        row.setdefault('created_at', datetime.utcnow())
+        for column in ('error_message', 'content_hash', 'rules_fingerprint', 'analyzer', 'changes'):
+            row.setdefault(column, None)
+        occurrence = occurrences.get(row['url'], 0)
+        occurrences[row['url']] = occurrence + 1
+        if occurrence == len(rounds):
+            rounds.append([])
+        rounds[occurrence].append(row)
+
+    templates, snippets = {}, {}
+    for round_rows in rounds:
+        _store_rows(round_rows, templates, snippets)
+    if templates:
+        _insert_missing(IssueTemplate, list(templates.values()))
+    if snippets:
+        _insert_missing(IssueSnippet, list(snippets.values()))
+    db.session.commit()
+
+    # Only remember catalogue entries once they are committed
+    _remember_templates({
+        template['key']: (template['type'], template['category'], template['message'], template['recommendation'])
+        for template in templates.values()
+    })
+    if len(_stored_snippets) + len(snippets) > _MAX_REMEMBERED_SNIPPETS:
+        _stored_snippets.clear()
+    _stored_snippets.update(snippets)
+
+def find_reusable_result(url, content_hash, rules_fingerprint, analyzer):
+    """Issues of the latest successful analysis of url if it saw the same content and rules with the same analyzer, else None."""
+    analysis = db.session.scalars(
+        select(AnalysisHistory)
+        .where(AnalysisHistory.url == url, AnalysisHistory.success.is_(True))
+        .order_by(AnalysisHistory.created_at.desc(), AnalysisHistory.id.desc())
+        .limit(1)
+    ).first()
+    if (analysis is None or analysis.content_hash != content_hash or analysis.rules_fingerprint != rules_fingerprint
+            or analysis.analyzer != analyzer):
+        return None
+    return analysis.accessibility_issues, analysis.color_issues
+
+def rule_store_version() -> int:
+    """Current rule store version; a single primary key lookup, cheap enough to poll."""
+    return db.session.execute(select(RuleStoreVersion.version).where(RuleStoreVersion.id == 1)).scalar() or 0
+
+def _next_rule_version() -> int:
+    """Increment the rule store version in the current transaction and return it.
+
+    The update locks the version row, so concurrent rule changes are serialized.
+    """
+    dialect_insert = _dialect_insert()
+    if dialect_insert is not None:
+        db.session.execute(dialect_insert(RuleStoreVersion.__table__).values(id=1, version=0)
+                           .on_conflict_do_nothing(index_elements=['id']))
+    elif db.session.get(RuleStoreVersion, 1) is None:
+        db.session.add(RuleStoreVersion(id=1, version=0))
+        db.session.flush()
+    return db.session.execute(
+        update(RuleStoreVersion).where(RuleStoreVersion.id == 1)
+        .values(version=RuleStoreVersion.version + 1).returning(RuleStoreVersion.version)
+    ).scalar_one()
+
+def _next_rule_position() -> int:
+    return (db.session.execute(select(func.max(StoredRule.position))).scalar() or 0) + 1
+
+def save_rule(rule: CustomRule) -> int:
+    """Store a rule, replacing a rule of the same name in place; returns the new store version."""
+    version = _next_rule_version()
+    stored = db.session.get(StoredRule, rule.name)
+    if stored is None:
+        stored = StoredRule(name=rule.name, position=_next_rule_position())
+        db.session.add(stored)
+    elif stored.deleted:
+        # A deleted rule that is added again goes to the end, as a new rule would
+        stored.position = _next_rule_position()
+    stored.description = rule.description
+    stored.selector = rule.selector
+    stored.condition = rule.condition
+    stored.message = rule.message
+    stored.recommendation = rule.recommendation
+    stored.severity = rule.severity
+    stored.version = version
+    stored.deleted = False
+    db.session.commit()
+    return version
+
+def delete_rule(name: str) -> bool:
+    """Delete a rule by name, leaving a tombstone; returns whether it existed."""
+    stored = db.session.get(StoredRule, name)
+    if stored is None or stored.deleted:
+        return False
+    stored.version = _next_rule_version()
+    stored.deleted = True
+    db.session.commit()
+    return True
+
+def rule_changes(since_version: int):
+    """Rules changed after since_version, as (version, [(position, rule)], [deleted names]).
+
+    The version returned covers every change included, so passing it back later
+    only returns what changed after this call.
+    """
+    version = rule_store_version()
+    rows = db.session.execute(
+        select(StoredRule).where(StoredRule.version > since_version).order_by(StoredRule.position)
+    ).scalars().all()
+    version = max([version] + [row.version for row in rows])
+    changed = [(row.position, row.to_rule()) for row in rows if not row.deleted]
+    removed = [row.name for row in rows if row.deleted]
+    return version, changed, removed
+
+def upgrade_schema():
+    """Create missing tables, and add columns and indexes that older databases lack.
+
+    Safe to run on every start. Rows written before these existed are filled in
+    by backfill_history.
+    """
+    db.create_all()
+    existing = {column['name'] for column in inspect(db.engine).get_columns(AnalysisHistory.__tablename__)}
+    missing = [column for column in AnalysisHistory.__table__.columns if column.name not in existing]
+    if missing:
+        with db.engine.begin() as connection:
+            for column in missing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.execute(text(f'ALTER TABLE {AnalysisHistory.__tablename__} ADD COLUMN {column.name} {column_type}'))
+    for index in AnalysisHistory.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+def backfill_history(batch_size: int = 1000, progress=None) -> int:
+    """Give history rows written before upgrade_schema their host, categories and latest-per-URL entry.
+
+    Rows without a host are handled in id order, one transaction per batch, so
+    an interrupted backfill resumes where it stopped and runs alongside new
+    writes. progress, if given, is called with the running row count after each
+    batch. Changes since the previous analysis are not computed for old rows.
+    Returns the number of rows handled.
+    """
+    handled = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(AnalysisHistory.id, AnalysisHistory.url, AnalysisHistory.created_at,
+                   AnalysisHistory.accessibility_refs, AnalysisHistory.color_refs)
+            .where(AnalysisHistory.host.is_(None), AnalysisHistory.id > last_id)
+            .order_by(AnalysisHistory.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return handled
+        last_id = rows[-1].id
+
+        # Rows of URLs without a hostname stay without one and are passed over on later runs
+        hosts = {row.id: urlparse(row.url).hostname for row in rows}
+        updates = [{'id': analysis_id, 'host': host} for analysis_id, host in hosts.items() if host]
+        if updates:
+            db.session.execute(update(AnalysisHistory), updates)
+
+        entries = {row.id: (row.accessibility_refs or []) + (row.color_refs or []) for row in rows}
+        keys = {entry[0] for row_entries in entries.values() for entry in row_entries if isinstance(entry, list)}
+        template_categories = dict(db.session.execute(
+            select(IssueTemplate.key, IssueTemplate.category).where(IssueTemplate.key.in_(keys))
+        ).all()) if keys else {}
+        # Such a row written after the upgrade already has its categories
+        categorized = set(db.session.scalars(
+            select(AnalysisCategory.analysis_id).where(AnalysisCategory.analysis_id.in_(list(entries)))
+        ))
+        category_rows = [
+            {'analysis_id': analysis_id, 'category': category[:255]}
+            for analysis_id, row_entries in entries.items() if analysis_id not in categorized
+            for category in {
+                template_categories.get(entry[0]) if isinstance(entry, list) else entry.get('category')
+                for entry in row_entries
+            } if category
+        ]
+        if category_rows:
+            db.session.execute(insert(AnalysisCategory), category_rows)
+
+        _update_latest([
+            {'url': row.url, 'host': hosts[row.id], 'analysis_id': row.id, 'created_at': row.created_at}
+            for row in rows if row.created_at is not None
+        ])
+        db.session.commit()
+        handled += len(rows)
+        if progress is not None:
+            progress(handled)
+
+def encode_cursor(created_at, analysis_id) -> str:
+    return base64.urlsafe_b64encode(f'{created_at.isoformat()}|{analysis_id}'.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str):
+    """Return (created_at, id) from a cursor, raising ValueError if it is malformed."""
+    try:
+        created_at, analysis_id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('|')
+        return datetime.fromisoformat(created_at), int(analysis_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+
+def _before(created_at_column, id_column, cursor):
+    created_at, analysis_id = decode_cursor(cursor)
+    return or_(created_at_column < created_at, and_(created_at_column == created_at, id_column < analysis_id))
+
+def query_history(url=None, host=None, since=None, until=None, success=None, category=None,
+                  cursor=None, limit=20):
+    """One page of history, newest first, and the cursor of the next page (None on the last page).
+
+    Uses keyset pagination on (created_at, id), so a page costs the same however
+    deep it is and no total count is computed.
+    """
+    query = select(AnalysisHistory)
+    if url is not None:
+        query = query.where(AnalysisHistory.url == url)
+    if host is not None:
+        query = query.where(AnalysisHistory.host == host.lower())
+    if since is not None:
+        query = query.where(AnalysisHistory.created_at >= since)
+    if until is not None:
+        query = query.where(AnalysisHistory.created_at < until)
+    if success is not None:
+        query = query.where(AnalysisHistory.success == success)
+    if category is not None:
+        query = query.where(exists().where(
+            AnalysisCategory.analysis_id == AnalysisHistory.id,
+            AnalysisCategory.category == category,
+        ))
+    if cursor:
+        query = query.where(_before(AnalysisHistory.created_at, AnalysisHistory.id, cursor))
+
+    query = query.order_by(AnalysisHistory.created_at.desc(), AnalysisHistory.id.desc()).limit(limit + 1)
+    items = db.session.scalars(query).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+    return items, next_cursor
+
+def query_latest(host=None, cursor=None, limit=20):
+    """The latest analysis of each URL, most recently analyzed first, with the next page's cursor."""
+    query = select(LatestAnalysis)
+    if host is not None:
+        query = query.where(LatestAnalysis.host == host.lower())
+    if cursor:
+        query = query.where(_before(LatestAnalysis.created_at, LatestAnalysis.analysis_id, cursor))
+    query = query.order_by(LatestAnalysis.created_at.desc(), LatestAnalysis.analysis_id.desc()).limit(limit + 1)
+
+    entries = db.session.scalars(query).all()
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1].created_at, entries[-1].analysis_id)
+    return [entry.analysis for entry in entries], next_cursor
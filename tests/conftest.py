@@ -0,0 +1,58 @@
+import functools
+import gzip
+import http.server
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+class _FixtureHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves a fixture directory; '{origin}' in sitemaps becomes the server's own origin."""
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not path.endswith(('.xml', '.xml.gz')) or not os.path.isfile(path):
+            return super().send_head()
+        with open(path, 'rb') as f:
+            body = f.read()
+        compressed = path.endswith('.gz')
+        if compressed:
+            body = gzip.decompress(body)
+        body = body.replace(b'{origin}', f'http://127.0.0.1:{self.server.server_port}'.encode())
+        if compressed:
+            body = gzip.compress(body)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/gzip' if compressed else 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return None
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def serve():
+    """Starts a local HTTP server for a request handler class and returns its origin; servers stop after the test."""
+    servers = []
+
+    def start(handler):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        servers.append(server)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{server.server_port}'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture
+def crawl_site(serve):
+    """Origin of a local HTTP server for tests/fixtures/crawl_site."""
+    return serve(functools.partial(_FixtureHandler, directory=os.path.join(FIXTURES, 'crawl_site')))
@@ -0,0 +1,107 @@
+import asyncio
+
+from utils.crawler import CrawlConfig, CrawlFrontier, Crawler, extract_links, normalize_url, parse_sitemap
+from utils.fetcher import AsyncFetcher, FetchConfig
+from utils.result_cache import content_hash
+
+CONFIG = CrawlConfig(max_depth=3, max_pages=50, concurrency=4, host_concurrency=2, host_delay=0)
+
+async def _analyze(url, page):
+    return {'url': url, 'success': True, 'bytes': len(page.content)}
+
+def _crawl(frontier, crawl_id):
+    async def run():
+        async with AsyncFetcher(FetchConfig()) as fetcher:
+            return await Crawler(frontier, fetcher, _analyze, CONFIG, heartbeat_interval=0.1).run(crawl_id)
+    return asyncio.run(run())
+
+def _states(frontier, crawl_id, origin):
+    return {page['url'][len(origin):]: page['state'] for page in frontier.pages(crawl_id, limit=100)}
+
+def _assert_one_copy_done(frontier, crawl_id, origin):
+    # about.html and copy.html have the same markup; whichever finishes downloading first is checked
+    pages = {page['url'][len(origin):]: page for page in frontier.pages(crawl_id, limit=100)}
+    about, copy = pages['/about.html'], pages['/copy.html']
+    assert {about['state'], copy['state']} == {'done', 'duplicate'}
+    original, duplicate = (about, copy) if about['state'] == 'done' else (copy, about)
+    assert duplicate['result']['duplicate_of'] == original['url']
+
+def test_normalize_url():
+    assert normalize_url('HTTP://Example.COM:80/a/./b/../c?q=1#top') == 'http://example.com/a/c?q=1'
+    assert normalize_url('https://example.com:443') == 'https://example.com/'
+    assert normalize_url('docs/', 'http://example.com/index.html') == 'http://example.com/docs/'
+    assert normalize_url('mailto:someone@example.com') is None
+    assert normalize_url('ftp://example.com/file') is None
+
+def test_extract_links_honours_base_href():
+    content = b'<head><base href="/chain/"></head><a href="1.html">1</a><a href="/top.html#x">top</a>'
+    assert extract_links(content, None, 'http://example.com/docs/') == [
+        'http://example.com/chain/1.html', 'http://example.com/top.html',
+    ]
+
+def test_crawl_from_seed_page(crawl_site):
+    frontier = CrawlFrontier()
+    crawl_id = frontier.create(f'{crawl_site}/', CONFIG.max_depth, CONFIG.max_pages)
+    assert frontier.start(crawl_id)
+
+    assert _crawl(frontier, crawl_id) == 'finished'
+
+    states = _states(frontier, crawl_id, crawl_site)
+    _assert_one_copy_done(frontier, crawl_id, crawl_site)
+    del states['/about.html'], states['/copy.html']
+    assert states == {
+        '/': 'done',
+        '/notes.txt': 'skipped',
+        '/missing.html': 'failed',
+        '/docs/': 'done',
+        # Reached through the <base href> of /docs/
+        '/chain/1.html': 'done',
+        # At the maximum depth, so its link to /chain/3.html is not followed
+        '/chain/2.html': 'done',
+    }
+    pages = {page['url']: page for page in frontier.pages(crawl_id)}
+    assert pages[f'{crawl_site}/chain/2.html']['depth'] == 3
+    status = frontier.status(crawl_id)
+    assert (status['done'], status['duplicate'], status['skipped'], status['failed'], status['pending']) == (5, 1, 1, 1, 0)
+
+def test_crawl_respects_page_budget(crawl_site):
+    frontier = CrawlFrontier()
+    crawl_id = frontier.create(f'{crawl_site}/', CONFIG.max_depth, 3)
+    frontier.start(crawl_id)
+
+    _crawl(frontier, crawl_id)
+
+    assert frontier.status(crawl_id)['pages'] == 3
+    assert len(frontier.pages(crawl_id)) == 3
+
+def test_crawl_from_gzipped_sitemap_index(crawl_site):
+    frontier = CrawlFrontier()
+    crawl_id = frontier.create(f'{crawl_site}/sitemap_index.xml', 0, CONFIG.max_pages, sitemap=True)
+    frontier.start(crawl_id)
+
+    assert _crawl(frontier, crawl_id) == 'finished'
+
+    # The off-origin page listed in the sitemap is not admitted, and pages at depth 0 lead nowhere
+    assert _states(frontier, crawl_id, crawl_site) == {'/about.html': 'done', '/chain/3.html': 'done'}
+
+def test_parse_sitemap_index():
+    content = b'<sitemapindex><sitemap><loc> http://example.com/a.xml.gz </loc></sitemap></sitemapindex>'
+    assert parse_sitemap(content) == ([], ['http://example.com/a.xml.gz'])
+
+def test_crawl_resumed_after_its_runner_died(crawl_site):
+    frontier = CrawlFrontier(lease_seconds=0)
+    crawl_id = frontier.create(f'{crawl_site}/', CONFIG.max_depth, CONFIG.max_pages)
+    frontier.start(crawl_id)
+    # A runner claimed the seed and its content, then died before completing it
+    entry = frontier.claim(crawl_id, 1)[0]
+
+    async def fetch_seed():
+        async with AsyncFetcher(FetchConfig()) as fetcher:
+            return await fetcher.fetch(entry.url)
+    frontier.claim_content(crawl_id, content_hash(asyncio.run(fetch_seed()).content), entry.url)
+    assert frontier.start(crawl_id)
+
+    assert _crawl(frontier, crawl_id) == 'finished'
+
+    assert _states(frontier, crawl_id, crawl_site)['/'] == 'done'
+    _assert_one_copy_done(frontier, crawl_id, crawl_site)
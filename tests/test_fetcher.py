@@ -0,0 +1,129 @@
+import asyncio
+import http.server
+import socket
+import time
+
+import pytest
+
+from utils.fetcher import AsyncFetcher, FetchConfig, FetchError, PageTooLarge
+
+PAGE = b'<html><body><p>caf\xe9</p></body></html>'
+BIG = b'x' * 5000
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/slow-headers':
+            time.sleep(1)
+        if self.path == '/page' and self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.send_header('ETag', '"v1"')
+            self.end_headers()
+            return
+        if self.path == '/dated' and self.headers.get('If-Modified-Since') == 'Wed, 01 Jan 2025 00:00:00 GMT':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=iso-8859-1' if self.path == '/page' else 'text/html')
+        body = b'<p>fast</p>'
+        sized = True
+        if self.path == '/page':
+            self.send_header('ETag', '"v1"')
+            body = PAGE
+        elif self.path == '/dated':
+            self.send_header('Last-Modified', 'Wed, 01 Jan 2025 00:00:00 GMT')
+            body = b'<p>dated</p>'
+        elif self.path.startswith('/big'):
+            body = BIG
+            # Without a Content-Length the cap is only hit while reading the body
+            sized = self.path == '/big'
+        elif self.path == '/slow-body':
+            self.end_headers()
+            self.wfile.flush()
+            time.sleep(1)
+            return
+        if sized:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def _fetch(url, config=None, **kwargs):
+    async def run():
+        async with AsyncFetcher(config or FetchConfig()) as fetcher:
+            return await fetcher.fetch(url, **kwargs)
+    return asyncio.run(run())
+
+def _stream(url, config):
+    async def run():
+        async with AsyncFetcher(config) as fetcher:
+            async with fetcher.stream(url) as page:
+                return b''.join([chunk async for chunk in page.chunks])
+    return asyncio.run(run())
+
+@pytest.fixture
+def site(serve):
+    return serve(_Handler)
+
+def test_charset_from_content_type(site):
+    result = _fetch(f'{site}/page')
+    assert result.status == 200
+    assert result.charset == 'iso-8859-1'
+    assert result.text() == '<html><body><p>café</p></body></html>'
+
+    result = _fetch(f'{site}/fast')
+    assert result.charset is None
+    assert result.text() == '<p>fast</p>'
+
+def test_conditional_revalidation(site):
+    first = _fetch(f'{site}/page')
+    assert first.etag == '"v1"'
+    assert not first.not_modified
+
+    again = _fetch(f'{site}/page', etag=first.etag)
+    assert again.not_modified
+    assert again.content == b''
+
+    dated = _fetch(f'{site}/dated')
+    assert _fetch(f'{site}/dated', last_modified=dated.last_modified).not_modified
+
+@pytest.mark.parametrize('path', ['/big', '/big-unsized'])
+def test_size_cap(site, path):
+    config = FetchConfig(max_bytes=1000, chunk_size=256)
+    with pytest.raises(PageTooLarge):
+        _fetch(f'{site}{path}', config)
+    # A larger cap for this fetch only, as for stylesheets
+    assert _fetch(f'{site}{path}', config, max_bytes=len(BIG)).content == BIG
+    # Streaming has no cap unless max_stream_bytes is set
+    assert _stream(f'{site}{path}', config) == BIG
+    with pytest.raises(PageTooLarge):
+        _stream(f'{site}{path}', FetchConfig(max_bytes=1000, max_stream_bytes=2000, chunk_size=256))
+
+@pytest.mark.parametrize('path', ['/slow-headers', '/slow-body'])
+def test_read_timeout(site, path):
+    with pytest.raises(FetchError, match='timed out'):
+        _fetch(f'{site}{path}', FetchConfig(read_timeout=0.2))
+
+def test_connect_timeout():
+    # A listening socket whose accept queue is full leaves further connection attempts unanswered
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(0)
+    port = listener.getsockname()[1]
+    queued = []
+    try:
+        for _ in range(3):
+            client = socket.socket()
+            client.setblocking(False)
+            client.connect_ex(('127.0.0.1', port))
+            queued.append(client)
+        started = time.perf_counter()
+        with pytest.raises(FetchError, match='timed out'):
+            _fetch(f'http://127.0.0.1:{port}/', FetchConfig(connect_timeout=0.2, read_timeout=30))
+        assert time.perf_counter() - started < 5
+    finally:
+        for client in queued:
+            client.close()
+        listener.close()
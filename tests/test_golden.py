@@ -0,0 +1,59 @@
+"""Findings of AccessibilityChecker on fixed pages, compared against recorded output.
+
+tests/fixtures/golden/accessibility.json holds the issues, in report order,
+for each page under tests/fixtures/golden and benchmarks/fixtures, checked
+with the custom rules in rules.json. Update it only with a deliberate change
+of findings.
+"""
+import json
+import os
+
+import pytest
+
+from utils.accessibility_checker import AccessibilityChecker
+from utils.custom_rules import CustomRule, RuleSet
+from utils.document import ParsedDocument, available_parsers
+from utils.templates import TemplateCache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN = os.path.join(ROOT, 'tests', 'fixtures', 'golden')
+PAGES = {
+    'checks.html': os.path.join(GOLDEN, 'checks.html'),
+    'product_page.html': os.path.join(ROOT, 'benchmarks', 'fixtures', 'product_page.html'),
+    'survey_form.html': os.path.join(ROOT, 'benchmarks', 'fixtures', 'survey_form.html'),
+}
+
+def _load(name):
+    with open(os.path.join(GOLDEN, name), encoding='utf-8') as f:
+        return json.load(f)
+
+EXPECTED = _load('accessibility.json')
+RULES = RuleSet(1, tuple(CustomRule(**rule) for rule in _load('rules.json')))
+
+def _analyze(page, parser, templates=None):
+    with open(PAGES[page], 'rb') as f:
+        document = ParsedDocument(f.read(), parser=parser)
+    return [dict(issue) for issue in AccessibilityChecker(document, RULES).analyze(templates=templates)]
+
+@pytest.fixture(autouse=True)
+def _unbounded_snippets(monkeypatch):
+    # Recorded messages hold whole elements, as they do under the default budgets
+    monkeypatch.delenv('SNIPPET_MAX_BYTES', raising=False)
+    monkeypatch.delenv('REPORT_SNIPPET_MAX_BYTES', raising=False)
+
+def test_every_page_has_recorded_output():
+    assert sorted(EXPECTED) == sorted(PAGES)
+
+# html5lib keeps source whitespace inside snippets, so its messages differ
+@pytest.mark.parametrize('parser', [parser for parser in ('html.parser', 'lxml') if parser in available_parsers()])
+@pytest.mark.parametrize('page', sorted(PAGES))
+def test_findings_match_recorded_output(page, parser):
+    assert _analyze(page, parser) == EXPECTED[page]
+
+@pytest.mark.parametrize('page', sorted(PAGES))
+def test_replayed_page_chrome_gives_the_same_findings(page):
+    templates = TemplateCache()
+    recorded = _analyze(page, 'html.parser', templates)
+    replayed = _analyze(page, 'html.parser', templates)
+    assert recorded == replayed
+    assert [{key: value for key, value in issue.items() if key != 'page_template'} for issue in replayed] == EXPECTED[page]
@@ -1,63 +1,103 @@
-from bs4 import BeautifulSoup
-from .custom_rules import CustomRuleManager, CustomRule
+from .custom_rules import CustomRuleManager, CustomRule, RuleSet
+from .document import parse_document
+from .document_index import DocumentIndex
+from .issues import Issue, SelectorPaths
+from .snippets import SnippetBudget
+from .templates import TemplateRegions
+from .tree_walker import TreeWalker
+
+INTERACTIVE_TAGS = ['button', 'a', 'input', 'select', 'textarea']
 
 class AccessibilityChecker:
-    def __init__(self, html_content):
-        self.soup = BeautifulSoup(html_content, 'html.parser')
-        self.custom_rule_manager = CustomRuleManager()
-        
-    def analyze(self):
-        issues = []
-        
-        # Existing checks
-        self._check_images(issues)
-        self._check_headings(issues)
-        self._check_forms(issues)
-        self._check_aria(issues)
-        
-        # New WCAG 2.1 checks
-        self._check_keyboard_navigation(issues)
-        self._check_focus_management(issues)
-        self._check_skip_links(issues)
-        self._check_language(issues)
-        self._check_document_structure(issues)
-        self._check_tables(issues)
-        self._check_lists(issues)
-        self._check_multimedia(issues)
-        
-        # Evaluate custom rules
-        custom_issues = self.custom_rule_manager.evaluate_rules(self.soup)
-        issues.extend(custom_issues)
-        
-        return issues
+    def __init__(self, html_content, rule_set: RuleSet = None):
+        self.document = parse_document(html_content)
+        self.soup = self.document.soup
+        # Bound to a rule set snapshot, so a checker per analysis is cheap and thread-safe
+        self.custom_rule_manager = CustomRuleManager(rule_set)
+
+    def analyze(self, timings=None, templates=None):
+        """Run every check in one walk; timings, if given, collects seconds spent per check.
+
+        templates, a TemplateCache, lets repeated page chrome replay the issues
+        recorded for it on an earlier page (see utils.templates).
+        """
+        checks = [
+            # Existing checks
+            self._check_images,
+            self._check_headings,
+            self._check_forms,
+            self._check_aria,
+
+            # New WCAG 2.1 checks
+            self._check_keyboard_navigation,
+            self._check_focus_management,
+            self._check_skip_links,
+            self._check_language,
+            self._check_document_structure,
+            self._check_tables,
+            self._check_lists,
+            self._check_multimedia,
+        ]
+
+        # Every check registers its visitors and gets its own issue list,
+        # so the report keeps the per-check ordering after a single walk
+        walker = TreeWalker(timings)
+        self.selectors = SelectorPaths()
+        self.snippets = SnippetBudget.from_env()
+        self.regions = TemplateRegions(templates, 'accessibility', self.document.fingerprints,
+                                       self.selectors, self.snippets)
+        self.regions.register(walker)
+        self.index = DocumentIndex()
+        self.index.register(walker)
+        check_issues = []
+        for check in checks:
+            bucket = []
+            check(walker, bucket)
+            check_issues.append(bucket)
+
+        # Evaluate custom rules in the same walk
+        custom_issues = []
+        self.custom_rule_manager.register(walker, custom_issues)
+        check_issues.append(custom_issues)
+
+        walker.walk(self.soup)
+
+        return [issue for bucket in check_issues for issue in bucket]
 
     def add_custom_rule(self, rule: CustomRule):
         """Add a custom accessibility rule."""
         self.custom_rule_manager.add_rule(rule)
-        
+
     def remove_custom_rule(self, rule_name: str):
         """Remove a custom accessibility rule."""
         self.custom_rule_manager.remove_rule(rule_name)
-        
+
     def get_custom_rule(self, rule_name: str) -> CustomRule:
         """Get a custom accessibility rule by name."""
         return self.custom_rule_manager.get_rule(rule_name)
-    
-    def _check_images(self, issues):
-        images = self.soup.find_all('img')
-        for img in images:
+
+    def _element_issue(self, type, category, template, recommendation, element):
+        """Issue whose message embeds a bounded snippet of the element's markup in place of '{element}'."""
+        return Issue(type, category, template, recommendation, self.snippets.render(element), self.selectors.path(element))
+
+    def _check_images(self, walker, issues):
+        def visit_img(img):
             if not img.get('alt'):
-                issues.append({
-                    'type': 'error',
-                    'category': 'Images',
-                    'message': f'Image missing alt text: {img}',
-                    'recommendation': 'Add descriptive alt text to the image'
-                })
+                issues.append(self._element_issue(
+                    'error',
+                    'Images',
+                    'Image missing alt text: {element}',
+                    'Add descriptive alt text to the image',
+                    img
+                ))
+
+        walker.on_enter('img', self.regions.local(visit_img, issues))
 
-    def _check_headings(self, issues):
-        headings = self.soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+    def _check_headings(self, walker, issues):
         prev_level = 0
-        for heading in headings:
+
+        def visit_heading(heading):
+            nonlocal prev_level
             current_level = int(heading.name[1])
             if current_level - prev_level > 1:
                 issues.append({
@@ -68,60 +108,89 @@ class AccessibilityChecker:
                 })
             prev_level = current_level
 
-    def _check_forms(self, issues):
-        inputs = self.soup.find_all('input')
-        for input_elem in inputs:
+        walker.on_enter(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'], visit_heading)
+
+    def _check_forms(self, walker, issues):
+        inputs = []
+
+        def visit_input(input_elem):
             if input_elem.get('type') not in ['submit', 'button', 'hidden']:
-                label = self.soup.find('label', {'for': input_elem.get('id')})
-                if not label:
-                    issues.append({
-                        'type': 'error',
-                        'category': 'Forms',
-                        'message': f'Input missing label: {input_elem}',
-                        'recommendation': 'Add proper label for the input field'
-                    })
+                inputs.append(input_elem)
+
+        def finish():
+            # Labels may follow their input, so resolve once the index is complete
+            for input_elem in inputs:
+                if not self.index.has_label(input_elem):
+                    issues.append(self._element_issue(
+                        'error',
+                        'Forms',
+                        'Input missing label: {element}',
+                        'Add proper label for the input field',
+                        input_elem
+                    ))
+
+        walker.on_enter('input', visit_input)
+        walker.on_finish(finish)
 
-    def _check_aria(self, issues):
-        elements_with_aria = self.soup.find_all(lambda tag: any(attr.startswith('aria-') for attr in tag.attrs))
-        for element in elements_with_aria:
+    def _check_aria(self, walker, issues):
+        def visit_element(element):
             if 'role' not in element.attrs:
-                issues.append({
-                    'type': 'warning',
-                    'category': 'ARIA',
-                    'message': f'Element with ARIA attributes missing role: {element}',
-                    'recommendation': 'Add appropriate role attribute'
-                })
+                issues.append(self._element_issue(
+                    'warning',
+                    'ARIA',
+                    'Element with ARIA attributes missing role: {element}',
+                    'Add appropriate role attribute',
+                    element
+                ))
+
+        walker.on_match(
+            self.regions.predicate(lambda tag: any(attr.startswith('aria-') for attr in tag.attrs)),
+            self.regions.local(visit_element, issues)
+        )
+
+    def _check_keyboard_navigation(self, walker, issues):
+        tabindex_issues = []
+        handler_issues = []
 
-    def _check_keyboard_navigation(self, issues):
         # Check for positive tabindex values
-        elements_with_tabindex = self.soup.find_all(lambda tag: 'tabindex' in tag.attrs)
-        for element in elements_with_tabindex:
+        def visit_tabindex(element):
             tabindex = element.get('tabindex')
             try:
                 if int(tabindex) > 0:
-                    issues.append({
-                        'type': 'warning',
-                        'category': 'Keyboard Navigation',
-                        'message': f'Positive tabindex value found: {element}',
-                        'recommendation': 'Avoid using positive tabindex values as they disrupt natural tab order'
-                    })
+                    tabindex_issues.append(self._element_issue(
+                        'warning',
+                        'Keyboard Navigation',
+                        'Positive tabindex value found: {element}',
+                        'Avoid using positive tabindex values as they disrupt natural tab order',
+                        element
+                    ))
             except ValueError:
                 pass
 
         # Check for potential keyboard traps
-        interactive_elements = self.soup.find_all(['button', 'a', 'input', 'select', 'textarea'])
-        for element in interactive_elements:
+        def visit_interactive(element):
             if element.get('onclick') and not element.get('onkeypress'):
-                issues.append({
-                    'type': 'error',
-                    'category': 'Keyboard Navigation',
-                    'message': f'Element with onclick but no keyboard event handler: {element}',
-                    'recommendation': 'Ensure all interactive elements are keyboard accessible'
-                })
+                handler_issues.append(self._element_issue(
+                    'error',
+                    'Keyboard Navigation',
+                    'Element with onclick but no keyboard event handler: {element}',
+                    'Ensure all interactive elements are keyboard accessible',
+                    element
+                ))
+
+        def finish():
+            issues.extend(tabindex_issues)
+            issues.extend(handler_issues)
 
-    def _check_focus_management(self, issues):
-        elements_with_focus = self.soup.find_all(['button', 'a', 'input', 'select', 'textarea'])
-        for element in elements_with_focus:
+        walker.on_match(
+            self.regions.predicate(lambda tag: 'tabindex' in tag.attrs),
+            self.regions.local(visit_tabindex, tabindex_issues)
+        )
+        walker.on_enter(INTERACTIVE_TAGS, self.regions.local(visit_interactive, handler_issues))
+        walker.on_finish(finish)
+
+    def _check_focus_management(self, walker, issues):
+        def visit_interactive(element):
             if element.get('style') and ('outline: none' in element.get('style') or 'outline:none' in element.get('style')):
                 issues.append({
                     'type': 'error',
@@ -130,83 +199,155 @@ class AccessibilityChecker:
                     'recommendation': 'Maintain visible focus indicators for keyboard navigation'
                 })
 
-    def _check_skip_links(self, issues):
-        skip_links = self.soup.find_all('a', href='#main-content') or self.soup.find_all('a', text=lambda t: t and 'skip' in t.lower())
-        if not skip_links:
-            issues.append({
-                'type': 'warning',
-                'category': 'Navigation',
-                'message': 'No skip links found at the beginning of the page',
-                'recommendation': 'Add skip links to bypass repetitive navigation'
-            })
-
-    def _check_language(self, issues):
-        html_tag = self.soup.find('html')
-        if not html_tag or not html_tag.get('lang'):
-            issues.append({
-                'type': 'error',
-                'category': 'Language',
-                'message': 'HTML lang attribute missing',
-                'recommendation': 'Add a valid lang attribute to the HTML element'
-            })
-
-    def _check_document_structure(self, issues):
-        # Check for main landmark
-        if not self.soup.find('main') and not self.soup.find(role='main'):
-            issues.append({
-                'type': 'error',
-                'category': 'Document Structure',
-                'message': 'No main landmark found',
-                'recommendation': 'Add a <main> element or role="main" to identify the main content'
-            })
-
-        # Check for other important landmarks
-        landmarks = {
-            'header': 'banner',
-            'nav': 'navigation',
-            'footer': 'contentinfo'
-        }
-        for tag, role in landmarks.items():
-            if not self.soup.find(tag) and not self.soup.find(role=role):
-                issues.append({
-                    'type': 'warning',
-                    'category': 'Document Structure',
-                    'message': f'No {tag} landmark found',
-                    'recommendation': f'Add a <{tag}> element or role="{role}" for better document structure'
-                })
+        walker.on_enter(INTERACTIVE_TAGS, self.regions.local(visit_interactive, issues))
+
+    def _check_skip_links(self, walker, issues):
+        skip_links = []
+
+        def visit_link(link):
+            text = link.string
+            if link.get('href') == '#main-content' or (text and 'skip' in text.lower()):
+                skip_links.append(link)
 
-    def _check_tables(self, issues):
-        tables = self.soup.find_all('table')
-        for table in tables:
-            if not table.find('caption'):
+        def finish():
+            if not skip_links:
                 issues.append({
                     'type': 'warning',
-                    'category': 'Tables',
-                    'message': 'Table missing caption',
-                    'recommendation': 'Add a caption to describe the table content'
+                    'category': 'Navigation',
+                    'message': 'No skip links found at the beginning of the page',
+                    'recommendation': 'Add skip links to bypass repetitive navigation'
                 })
-            
-            if not table.find_all('th'):
+
+        walker.on_enter('a', visit_link)
+        walker.on_finish(finish)
+
+    def _check_language(self, walker, issues):
+        html_tags = []
+
+        def finish():
+            html_tag = html_tags[0] if html_tags else None
+            if not html_tag or not html_tag.get('lang'):
                 issues.append({
                     'type': 'error',
-                    'category': 'Tables',
-                    'message': 'Table missing header cells',
-                    'recommendation': 'Use <th> elements to identify table headers'
+                    'category': 'Language',
+                    'message': 'HTML lang attribute missing',
+                    'recommendation': 'Add a valid lang attribute to the HTML element'
                 })
 
-    def _check_lists(self, issues):
-        lists = self.soup.find_all(['ul', 'ol'])
-        for list_elem in lists:
-            if not list_elem.find_all('li'):
+        walker.on_enter('html', html_tags.append)
+        walker.on_finish(finish)
+
+    def _check_document_structure(self, walker, issues):
+        landmarks = {
+            'header': 'banner',
+            'nav': 'navigation',
+            'footer': 'contentinfo'
+        }
+        def finish():
+            # Check for main landmark
+            if not self.index.has_landmark('main', 'main'):
                 issues.append({
                     'type': 'error',
-                    'category': 'Lists',
-                    'message': 'Empty list found',
-                    'recommendation': 'Remove empty lists or add list items'
+                    'category': 'Document Structure',
+                    'message': 'No main landmark found',
+                    'recommendation': 'Add a <main> element or role="main" to identify the main content'
                 })
-            
-            for child in list_elem.children:
-                if child.name and child.name != 'li':
+
+            # Check for other important landmarks
+            for tag, role in landmarks.items():
+                if not self.index.has_landmark(tag, role):
+                    issues.append({
+                        'type': 'warning',
+                        'category': 'Document Structure',
+                        'message': f'No {tag} landmark found',
+                        'recommendation': f'Add a <{tag}> element or role="{role}" for better document structure'
+                    })
+
+        walker.on_finish(finish)
+
+    def _check_tables(self, walker, issues):
+        tables = []
+        open_tables = []
+
+        def enter_table(table):
+            record = {'caption': False, 'th': False}
+            tables.append(record)
+            open_tables.append(record)
+
+        def leave_table(table):
+            record = open_tables.pop()
+            if open_tables:
+                # Nested content also counts for the enclosing table
+                open_tables[-1]['caption'] |= record['caption']
+                open_tables[-1]['th'] |= record['th']
+
+        def mark(key):
+            def visit(element):
+                if open_tables:
+                    open_tables[-1][key] = True
+            return visit
+
+        def finish():
+            for record in tables:
+                if not record['caption']:
+                    issues.append({
+                        'type': 'warning',
+                        'category': 'Tables',
+                        'message': 'Table missing caption',
+                        'recommendation': 'Add a caption to describe the table content'
+                    })
+
+                if not record['th']:
+                    issues.append({
+                        'type': 'error',
+                        'category': 'Tables',
+                        'message': 'Table missing header cells',
+                        'recommendation': 'Use <th> elements to identify table headers'
+                    })
+
+        walker.on_enter('table', enter_table)
+        walker.on_leave('table', leave_table)
+        walker.on_enter('caption', mark('caption'))
+        walker.on_enter('th', mark('th'))
+        walker.on_finish(finish)
+
+    def _check_lists(self, walker, issues):
+        lists = []
+        open_lists = []
+
+        def enter_list(list_elem):
+            record = {'element': list_elem, 'has_items': False, 'invalid_children': 0}
+            lists.append(record)
+            open_lists.append(record)
+
+        def leave_list(list_elem):
+            record = open_lists.pop()
+            if open_lists and record['has_items']:
+                open_lists[-1]['has_items'] = True
+
+        def visit_item(item):
+            if open_lists:
+                open_lists[-1]['has_items'] = True
+
+        def visit_list_child(child):
+            if child.name != 'li':
+                # A nested list has already pushed itself, so look past it for the parent
+                for record in reversed(open_lists):
+                    if record['element'] is child.parent:
+                        record['invalid_children'] += 1
+                        break
+
+        def finish():
+            for record in lists:
+                if not record['has_items']:
+                    issues.append({
+                        'type': 'error',
+                        'category': 'Lists',
+                        'message': 'Empty list found',
+                        'recommendation': 'Remove empty lists or add list items'
+                    })
+
+                for _ in range(record['invalid_children']):
                     issues.append({
                         'type': 'error',
                         'category': 'Lists',
@@ -214,25 +355,66 @@ class AccessibilityChecker:
                         'recommendation': 'Use only <li> elements as direct children of lists'
                     })
 
-    def _check_multimedia(self, issues):
+        walker.on_enter(['ul', 'ol'], enter_list)
+        walker.on_leave(['ul', 'ol'], leave_list)
+        walker.on_enter('li', visit_item)
+        walker.on_match(lambda tag: tag.parent is not None and tag.parent.name in ('ul', 'ol'), visit_list_child)
+        walker.on_finish(finish)
+
+    def _check_multimedia(self, walker, issues):
+        videos = []
+        open_videos = []
+        audio_count = 0
+        has_transcript = False
+
         # Check video elements
-        videos = self.soup.find_all('video')
-        for video in videos:
-            if not video.find('track', type='captions'):
-                issues.append({
-                    'type': 'error',
-                    'category': 'Multimedia',
-                    'message': 'Video missing captions',
-                    'recommendation': 'Add captions using the <track> element'
-                })
+        def enter_video(video):
+            record = {'captions': False}
+            videos.append(record)
+            open_videos.append(record)
+
+        def leave_video(video):
+            record = open_videos.pop()
+            if open_videos and record['captions']:
+                open_videos[-1]['captions'] = True
+
+        def visit_track(track):
+            if open_videos and track.get('type') == 'captions':
+                open_videos[-1]['captions'] = True
 
         # Check audio elements
-        audios = self.soup.find_all('audio')
-        for audio in audios:
-            if not self.soup.find('a', href=lambda x: x and x.endswith(('.txt', '.pdf'))):
-                issues.append({
-                    'type': 'warning',
-                    'category': 'Multimedia',
-                    'message': 'Audio content might be missing transcript',
-                    'recommendation': 'Provide a transcript for audio content'
-                })
+        def visit_audio(audio):
+            nonlocal audio_count
+            audio_count += 1
+
+        def visit_link(link):
+            nonlocal has_transcript
+            href = link.get('href')
+            if href and href.endswith(('.txt', '.pdf')):
+                has_transcript = True
+
+        def finish():
+            for record in videos:
+                if not record['captions']:
+                    issues.append({
+                        'type': 'error',
+                        'category': 'Multimedia',
+                        'message': 'Video missing captions',
+                        'recommendation': 'Add captions using the <track> element'
+                    })
+
+            if not has_transcript:
+                for _ in range(audio_count):
+                    issues.append({
+                        'type': 'warning',
+                        'category': 'Multimedia',
+                        'message': 'Audio content might be missing transcript',
+                        'recommendation': 'Provide a transcript for audio content'
+                    })
+
+        walker.on_enter('video', enter_video)
+        walker.on_leave('video', leave_video)
+        walker.on_enter('track', visit_track)
+        walker.on_enter('audio', visit_audio)
+        walker.on_enter('a', visit_link)
+        walker.on_finish(finish)
@@ -0,0 +1,332 @@
+"""Offline accessibility audit of saved pages, without the web app or a database.
+
+Pages are read from directories, tarballs (.tar, .tar.gz, .tgz, .tar.bz2,
+.tar.xz), WARC archives (.warc, .warc.gz) or single HTML files, checked on a
+pool of worker processes, and written as they finish as JSON lines (one
+object per page) or CSV (one row per issue).
+
+    python audit.py SOURCE [SOURCE ...] [--output results.jsonl] [--format jsonl|csv]
+                    [--workers N] [--rules rules.json] [--resume]
+
+With --output, progress is checkpointed next to the output file, and --resume
+continues an interrupted run: pages already written are skipped and anything
+written after the last checkpoint is discarded, so no page appears twice.
+"""
+import argparse
+import concurrent.futures
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import tarfile
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional, Tuple
+from .custom_rules import CustomRule, RuleSet
+from .executor import create_executor
+from .result_cache import ResultCache, content_hash
+
+HTML_EXTENSIONS = ('.html', '.htm', '.xhtml')
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+WARC_SUFFIXES = ('.warc', '.warc.gz')
+
+CSV_COLUMNS = ('id', 'url', 'analyzer', 'type', 'category', 'message', 'recommendation', 'selector')
+
+_CHARSET = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+@dataclass(frozen=True)
+class Document:
+    """One saved page: a unique id, its raw bytes, its charset if known, and its URL for archived pages."""
+    id: str
+    content: bytes
+    encoding: Optional[str] = None
+    url: Optional[str] = None
+
+def iter_directory(path: str, extensions=HTML_EXTENSIONS) -> Iterator[Document]:
+    """HTML files below path, in sorted order, identified by their path including path itself.
+
+    Pages at the same relative path in two source directories, such as each
+    site's index.html, so keep distinct ids.
+    """
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(extensions):
+                file_path = os.path.join(root, name)
+                with open(file_path, 'rb') as f:
+                    yield Document(file_path, f.read())
+
+def iter_tarball(path: str, extensions=HTML_EXTENSIONS) -> Iterator[Document]:
+    """HTML members of a tarball, read in a single sequential pass, identified as 'archive!member'."""
+    with tarfile.open(path, 'r|*') as archive:
+        for member in archive:
+            if member.isfile() and member.name.lower().endswith(extensions):
+                yield Document(f'{path}!{member.name}', archive.extractfile(member).read())
+
+def iter_warc(path: str) -> Iterator[Document]:
+    """Successful HTML responses in a WARC file, identified as 'archive!record id'.
+
+    A URL can be captured more than once, so the WARC record id rather than the
+    URL identifies the document; the URL is kept alongside.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as stream:
+        for headers, block in _warc_records(stream):
+            if headers.get('warc-type') != 'response':
+                continue
+            if not headers.get('content-type', '').startswith('application/http'):
+                continue
+            try:
+                status, http_headers, body = _parse_http_response(block)
+            except (ValueError, IndexError, OSError, zlib.error):
+                continue
+            content_type = http_headers.get('content-type', '')
+            if status != 200 or ('html' not in content_type.lower()):
+                continue
+            charset = _CHARSET.search(content_type)
+            yield Document(
+                f'{path}!{headers.get("warc-record-id", "")}',
+                body,
+                charset.group(1) if charset else None,
+                headers.get('warc-target-uri'),
+            )
+
+def _warc_records(stream) -> Iterator[Tuple[dict, bytes]]:
+    while True:
+        line = stream.readline()
+        if not line:
+            return
+        if not line.strip():
+            continue
+        if not line.startswith(b'WARC/'):
+            raise ValueError(f'Expected a WARC record header, got {line[:40]!r}')
+        headers = {}
+        for line in iter(stream.readline, b''):
+            if not line.strip():
+                break
+            name, _, value = line.decode('utf-8', 'replace').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        yield headers, stream.read(int(headers.get('content-length', 0)))
+
+def _parse_http_response(block: bytes):
+    head, separator, body = block.partition(b'\r\n\r\n')
+    if not separator:
+        head, _, body = block.partition(b'\n\n')
+    lines = head.decode('iso-8859-1').splitlines()
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    # Archives keep the body as it was sent, so undo the transfer and content encodings
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = _dechunk(body)
+    encoding = headers.get('content-encoding', '').lower()
+    if encoding in ('gzip', 'x-gzip'):
+        body = gzip.decompress(body)
+    elif encoding == 'deflate':
+        try:
+            body = zlib.decompress(body)
+        except zlib.error:
+            body = zlib.decompress(body, -zlib.MAX_WBITS)
+    return status, headers, body
+
+def _dechunk(body: bytes) -> bytes:
+    chunks = []
+    position = 0
+    while position < len(body):
+        line_end = body.index(b'\r\n', position)
+        size = int(body[position:line_end].split(b';')[0], 16)
+        if size == 0:
+            break
+        start = line_end + 2
+        chunks.append(body[start:start + size])
+        position = start + size + 2
+    return b''.join(chunks)
+
+def iter_sources(paths: Iterable[str], extensions=HTML_EXTENSIONS) -> Iterator[Document]:
+    """Documents from every path, picking the reader by what the path is."""
+    for path in paths:
+        lower = path.lower()
+        if os.path.isdir(path):
+            yield from iter_directory(path, extensions)
+        elif lower.endswith(WARC_SUFFIXES):
+            yield from iter_warc(path)
+        elif lower.endswith(TAR_SUFFIXES):
+            yield from iter_tarball(path, extensions)
+        else:
+            with open(path, 'rb') as f:
+                yield Document(path, f.read())
+
+def audit(documents: Iterable[Document], executor, rule_set: RuleSet, max_pending: int = 64,
+          skip=frozenset()) -> Iterator[dict]:
+    """Check documents on executor, yielding a record per document as it finishes.
+
+    At most max_pending documents are read ahead, so memory stays bounded on
+    large archives. Documents whose id is in skip are not checked, and pages
+    with identical content are only checked once while their result is cached.
+    """
+    cache = ResultCache()
+    pending = {}
+
+    def finished(future):
+        document, page_hash = pending.pop(future)
+        try:
+            a11y_issues, color_issues, _ = future.result()
+        except Exception as e:
+            return {'id': document.id, 'url': document.url, 'bytes': len(document.content), 'error': str(e)}
+        cache.put(page_hash, rule_set.version, (a11y_issues, color_issues))
+        return _record(document, page_hash, a11y_issues, color_issues)
+
+    for document in documents:
+        if document.id in skip:
+            continue
+        page_hash = content_hash(document.content)
+        cached = cache.get(page_hash, rule_set.version)
+        if cached is not None:
+            yield _record(document, page_hash, *cached)
+            continue
+        while len(pending) >= max_pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield finished(future)
+        future = executor.submit(document.content, document.encoding, rule_set)
+        pending[future] = (document, page_hash)
+
+    while pending:
+        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            yield finished(future)
+
+def _record(document, page_hash, a11y_issues, color_issues):
+    return {
+        'id': document.id,
+        'url': document.url,
+        'bytes': len(document.content),
+        'content_hash': page_hash,
+        'accessibility': a11y_issues,
+        'colors': color_issues,
+    }
+
+def format_jsonl(record: dict, first: bool) -> str:
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+def format_csv(record: dict, first: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if first:
+        writer.writerow(CSV_COLUMNS)
+    if 'error' in record:
+        writer.writerow([record['id'], record['url'] or '', 'error', 'error', '', record['error'], '', ''])
+    for analyzer in ('accessibility', 'colors'):
+        for issue in record.get(analyzer, ()):
+            writer.writerow([record['id'], record['url'] or '', analyzer, issue['type'], issue['category'], issue['message'],
+                             issue['recommendation'], getattr(issue, 'selector', None) or ''])
+    return buffer.getvalue()
+
+FORMATTERS = {'jsonl': format_jsonl, 'csv': format_csv}
+
+class Checkpoint:
+    """Append-only log of (document id, output size after it) for resuming a run.
+
+    Each entry is written only after the document's output has been flushed,
+    so the last entry marks how much of the output is complete.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = set()
+        self.offset = 0
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        document_id, offset = json.loads(line)
+                    except ValueError:
+                        # A line cut short by the interruption
+                        break
+                    self.done.add(document_id)
+                    self.offset = offset
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, document_id: str, offset: int) -> None:
+        self._file.write(json.dumps([document_id, offset]) + '\n')
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+def load_rules(path: str) -> RuleSet:
+    """Rule set from a JSON list of rules in the /custom-rules format."""
+    with open(path, encoding='utf-8') as f:
+        rules = json.load(f)
+    return RuleSet(1, tuple(CustomRule(**rule) for rule in rules))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sources', nargs='+', help='Directories, tarballs, WARC files or HTML files')
+    parser.add_argument('--output', '-o', default='-', help='Output file (default: standard output)')
+    parser.add_argument('--format', choices=sorted(FORMATTERS), default='jsonl')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--rules', help='JSON file with custom rules to check as well')
+    parser.add_argument('--extensions', default=','.join(HTML_EXTENSIONS),
+                        help='File extensions read from directories and tarballs')
+    parser.add_argument('--checkpoint', help='Checkpoint file (default: OUTPUT.checkpoint)')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted run from its checkpoint')
+    args = parser.parse_args(argv)
+
+    if args.resume and args.output == '-':
+        parser.error('--resume needs --output')
+    rule_set = load_rules(args.rules) if args.rules else RuleSet()
+    extensions = tuple(extension.strip().lower() for extension in args.extensions.split(','))
+    formatter = FORMATTERS[args.format]
+
+    checkpoint = None
+    if args.output == '-':
+        output = sys.stdout.buffer
+        offset = 0
+    else:
+        checkpoint_path = args.checkpoint or args.output + '.checkpoint'
+        if not args.resume and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        checkpoint = Checkpoint(checkpoint_path)
+        offset = checkpoint.offset
+        output = open(args.output, 'r+b' if args.resume and os.path.exists(args.output) else 'wb')
+        # Drop output written after the last checkpoint; those documents are checked again
+        output.truncate(offset)
+        output.seek(offset)
+
+    executor = create_executor(max_workers=args.workers, rule_set=rule_set)
+    started = time.perf_counter()
+    audited = failed = 0
+    try:
+        documents = iter_sources(args.sources, extensions)
+        skip = checkpoint.done if checkpoint else frozenset()
+        for record in audit(documents, executor, rule_set, max_pending=executor.max_workers * 4, skip=skip):
+            data = formatter(record, offset == 0).encode('utf-8')
+            output.write(data)
+            output.flush()
+            offset += len(data)
+            if checkpoint:
+                checkpoint.record(record['id'], offset)
+            audited += 1
+            failed += 'error' in record
+    except KeyboardInterrupt:
+        print('Interrupted; run again with --resume to continue', file=sys.stderr)
+        sys.exit(130)
+    finally:
+        executor.shutdown(wait=False)
+        if output is not sys.stdout.buffer:
+            output.close()
+        if checkpoint:
+            checkpoint.close()
+
+    elapsed = time.perf_counter() - started
+    skipped = len(checkpoint.done) if checkpoint else 0
+    print(f'Audited {audited} documents ({failed} failed, {skipped} already done) in {elapsed:.1f}s',
+          file=sys.stderr)
@@ -1,127 +1,199 @@
-from bs4 import BeautifulSoup
 import re
-import colorsys
+from functools import lru_cache
+from .document import parse_document
+from .issues import Issue
+from .stylesheets import ComputedStyles, document_stylesheets
+from .templates import TemplateRegions
+from .tree_walker import TreeWalker
+
+try:
+    import numpy as np
+except ImportError:  # optional; ratios are then computed once per distinct color pair
+    np = None
+
+FDS_COLORS = {
+    'green': ['#36B727', '#044014', '#4AD539'],
+    'neutral': '#F9F7F5'
+}
+
+def hex_to_rgb(hex_color):
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+def relative_luminance(rgb):
+    r, g, b = [x/255 if x <= 255 else 1.0 for x in rgb]
+    r = r/12.92 if r <= 0.03928 else ((r+0.055)/1.055) ** 2.4
+    g = g/12.92 if g <= 0.03928 else ((g+0.055)/1.055) ** 2.4
+    b = b/12.92 if b <= 0.03928 else ((b+0.055)/1.055) ** 2.4
+    return 0.2126 * r + 0.7152 * g + 0.0722 * b
+
+@lru_cache(maxsize=4096)
+def color_luminance(hex_color):
+    """Relative luminance of a hex color, computed once per distinct color."""
+    return relative_luminance(hex_to_rgb(hex_color))
+
+def contrast_ratio(color1, color2):
+    l1 = color_luminance(color1)
+    l2 = color_luminance(color2)
+    lighter = max(l1, l2)
+    darker = min(l1, l2)
+    return (lighter + 0.05) / (darker + 0.05)
+
+def contrast_ratios(pairs):
+    """Contrast ratios for a list of (text color, background color) pairs.
+
+    Luminance is looked up once per distinct color; with NumPy installed the
+    ratios are then computed for all pairs at once.
+    """
+    if not pairs:
+        return []
+    if np is None:
+        ratios = {}
+        return [ratios[pair] if pair in ratios else ratios.setdefault(pair, contrast_ratio(*pair))
+                for pair in pairs]
+
+    palette = {}
+    indexes = np.array([[palette.setdefault(color, len(palette)) for color in pair] for pair in pairs])
+    luminance = np.array([color_luminance(color) for color in palette])[indexes]
+    lighter = luminance.max(axis=1)
+    darker = luminance.min(axis=1)
+    return ((lighter + 0.05) / (darker + 0.05)).tolist()
+
+def style_color(style, property_name):
+    """Hex color set for property_name in an inline style string, or None."""
+    color_match = re.search(rf'{property_name}:\s*#([0-9a-fA-F]{{6}})', style)
+    if color_match:
+        return f'#{color_match.group(1)}'
+    return None
+
+def is_large_text_style(style):
+    """Whether an inline style makes text large under WCAG 2.1 (18px, or 14px bold)."""
+    font_size_match = re.search(r'font-size:\s*(\d+)px', style)
+    if font_size_match:
+        size = int(font_size_match.group(1))
+        return size >= 18 or (size >= 14 and 'bold' in style)
+    return False
 
 class ColorValidator:
-    def __init__(self, html_content):
-        self.soup = BeautifulSoup(html_content, 'html.parser')
-        self.fds_colors = {
-            'green': ['#36B727', '#044014', '#4AD539'],
-            'neutral': '#F9F7F5'
-        }
-        
-    def validate(self):
-        issues = []
-        
-        # Check inline styles
-        self._check_inline_styles(issues)
-        # Check background colors
-        self._check_backgrounds(issues)
-        # Check button styles
-        self._check_buttons(issues)
-        # Check color contrast
-        self._check_color_contrast(issues)
+    def __init__(self, html_content, stylesheets=None):
+        """stylesheets maps the href of each downloaded linked stylesheet, as written in the page, to its (key, text); see document_stylesheets."""
+        self.document = parse_document(html_content)
+        self.soup = self.document.soup
+        self.stylesheets = stylesheets
+        self.fds_colors = FDS_COLORS
         
-        return issues
-
-    def _hex_to_rgb(self, hex_color):
-        hex_color = hex_color.lstrip('#')
-        return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-
-    def _get_relative_luminance(self, rgb):
-        r, g, b = [x/255 if x <= 255 else 1.0 for x in rgb]
-        r = r/12.92 if r <= 0.03928 else ((r+0.055)/1.055) ** 2.4
-        g = g/12.92 if g <= 0.03928 else ((g+0.055)/1.055) ** 2.4
-        b = b/12.92 if b <= 0.03928 else ((b+0.055)/1.055) ** 2.4
-        return 0.2126 * r + 0.7152 * g + 0.0722 * b
-
-    def _calculate_contrast_ratio(self, color1, color2):
-        l1 = self._get_relative_luminance(self._hex_to_rgb(color1))
-        l2 = self._get_relative_luminance(self._hex_to_rgb(color2))
-        lighter = max(l1, l2)
-        darker = min(l1, l2)
-        return (lighter + 0.05) / (darker + 0.05)
+    def validate(self, timings=None, templates=None):
+        """Run every check in one walk; timings, if given, collects seconds spent per check.
+
+        templates, a TemplateCache, lets repeated page chrome replay its recorded issues.
+        """
+        checks = [
+            # Check inline styles
+            self._check_inline_styles,
+            # Check background colors
+            self._check_backgrounds,
+            # Check button styles
+            self._check_buttons,
+            # Check color contrast
+            self._check_color_contrast,
+        ]
+
+        # Same single-walk layout as AccessibilityChecker, one issue list per check
+        walker = TreeWalker(timings)
+        self.regions = TemplateRegions(templates, 'colors', self.document.fingerprints)
+        self.regions.register(walker)
+        self._register_styles(walker)
+        check_issues = []
+        for check in checks:
+            bucket = []
+            check(walker, bucket)
+            check_issues.append(bucket)
+
+        walker.walk(self.soup)
+
+        return [issue for bucket in check_issues for issue in bucket]
+
+    def _register_styles(self, walker):
+        # Computed style of every open element from the page's stylesheets, resolved
+        # top down, so a lookup never walks ancestors or tests every rule
+        self.styles = ComputedStyles(document_stylesheets(self.soup, self.stylesheets))
+        self.styles.register(walker)
     
-    def _check_inline_styles(self, issues):
-        elements = self.soup.find_all(style=True)
-        for element in elements:
-            style = element['style']
-            if 'color' in style or 'background' in style:
+    def _check_inline_styles(self, walker, issues):
+        def visit_element(element):
+            style = element.get('style')
+            if style and ('color' in style or 'background' in style):
                 colors = re.findall(r'#[0-9a-fA-F]{6}', style)
                 for color in colors:
                     if color not in self.fds_colors['green'] and color != self.fds_colors['neutral']:
-                        issues.append({
-                            'type': 'error',
-                            'category': 'Colors',
-                            'message': f'Non-compliant color used: {color}',
-                            'recommendation': 'Use FDS approved colors'
-                        })
-
-    def _check_color_contrast(self, issues):
-        elements = self.soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'span', 'a'])
-        for element in elements:
-            # Get text and background colors
-            text_color = self._get_element_color(element, 'color') or '#000000'
-            bg_color = self._get_element_background(element) or '#FFFFFF'
-            
-            contrast_ratio = self._calculate_contrast_ratio(text_color, bg_color)
-            
-            # WCAG 2.1 Level AA requirements
-            is_large_text = self._is_large_text(element)
-            required_ratio = 3.0 if is_large_text else 4.5
-            
-            if contrast_ratio < required_ratio:
-                issues.append({
-                    'type': 'error',
-                    'category': 'Color Contrast',
-                    'message': f'Insufficient contrast ratio ({contrast_ratio:.2f}:1) for text element',
-                    'recommendation': f'Increase contrast ratio to at least {required_ratio}:1 for {is_large_text and "large" or "normal"} text'
-                })
+                        issues.append(Issue(
+                            'error', 'Colors', 'Non-compliant color used: {value}', 'Use FDS approved colors',
+                            value=color,
+                        ))
+
+        walker.on_match(
+            self.regions.predicate(lambda element: 'style' in element.attrs),
+            self.regions.local(visit_element, issues)
+        )
+
+    def _check_color_contrast(self, walker, issues):
+        # Pairs are collected during the walk and their ratios computed in one batch
+        candidates = []
 
-    def _get_element_color(self, element, property_name):
-        style = element.get('style', '')
-        color_match = re.search(rf'{property_name}:\s*#([0-9a-fA-F]{{6}})', style)
-        if color_match:
-            return f'#{color_match.group(1)}'
-        return None
-
-    def _get_element_background(self, element):
-        current = element
-        while current:
-            bg_color = self._get_element_color(current, 'background-color')
-            if bg_color:
-                return bg_color
-            current = current.parent
-        return None
+        def visit_text(element):
+            # Computed text and background colors
+            style = self.styles.current
+            candidates.append((style.text_color, style.background_color, self._is_large_text(element)))
+
+        def finish():
+            ratios = contrast_ratios([(text_color, bg_color) for text_color, bg_color, _ in candidates])
+            for (_, _, is_large_text), contrast_ratio in zip(candidates, ratios):
+                # WCAG 2.1 Level AA requirements
+                required_ratio = 3.0 if is_large_text else 4.5
+
+                if contrast_ratio < required_ratio:
+                    issues.append(Issue(
+                        'error', 'Color Contrast', 'Insufficient contrast ratio ({value}:1) for text element',
+                        f'Increase contrast ratio to at least {required_ratio}:1 for {is_large_text and "large" or "normal"} text',
+                        value=f'{contrast_ratio:.2f}',
+                    ))
+
+        walker.on_enter(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'span', 'a'], visit_text)
+        walker.on_finish(finish)
 
     def _is_large_text(self, element):
-        style = element.get('style', '')
-        font_size_match = re.search(r'font-size:\s*(\d+)px', style)
-        if font_size_match:
-            size = int(font_size_match.group(1))
-            return size >= 18 or (size >= 14 and 'bold' in style)
-        return False
+        """Whether the element's computed font makes it large text (18px, or 14px bold)."""
+        style = self.styles.current
+        return style.font_size >= 18 or (style.font_size >= 14 and style.font_weight >= 700)
     
-    def _check_backgrounds(self, issues):
-        elements = self.soup.find_all(class_=True)
-        bg_classes = [cls for elem in elements for cls in elem['class'] 
-                     if 'bg-' in cls or 'background' in cls]
-        
-        if not any('bg-neutral' in cls for cls in bg_classes):
-            issues.append({
-                'type': 'warning',
-                'category': 'Background',
-                'message': 'Page might not meet 50% neutral background requirement',
-                'recommendation': 'Ensure sufficient use of neutral background'
-            })
-
-    def _check_buttons(self, issues):
-        buttons = self.soup.find_all(['button', 'a'], class_=True)
-        for button in buttons:
-            if not any('btn-' in cls for cls in button['class']):
+    def _check_backgrounds(self, walker, issues):
+        has_neutral = False
+
+        def visit_element(element):
+            nonlocal has_neutral
+            if any('bg-neutral' in cls for cls in element['class']):
+                has_neutral = True
+
+        def finish():
+            if not has_neutral:
+                issues.append({
+                    'type': 'warning',
+                    'category': 'Background',
+                    'message': 'Page might not meet 50% neutral background requirement',
+                    'recommendation': 'Ensure sufficient use of neutral background'
+                })
+
+        walker.on_match(lambda element: 'class' in element.attrs, visit_element)
+        walker.on_finish(finish)
+
+    def _check_buttons(self, walker, issues):
+        def visit_button(button):
+            if 'class' in button.attrs and not any('btn-' in cls for cls in button['class']):
                 issues.append({
                     'type': 'warning',
                     'category': 'Buttons',
                     'message': 'Button missing FDS styling',
                     'recommendation': 'Apply FDS button classes'
                 })
+
+        walker.on_enter(['button', 'a'], self.regions.local(visit_button, issues))
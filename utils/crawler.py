@@ -0,0 +1,585 @@
+"""Site crawls: start from a seed page or sitemap and audit the same-origin pages they lead to.
+
+A crawl's frontier (the URLs admitted so far, their depth and state, and the
+content hashes seen) lives in a CrawlFrontier, so a crawl can be paused,
+resumed, or picked up again after a restart. Crawler runs one crawl: it
+downloads pages breadth-first within per-host concurrency and rate limits,
+follows same-origin links up to the depth and page budgets, skips URLs and
+contents it has already seen, and hands every new page to an analyze callback.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import posixpath
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import dataclass
+from html.parser import HTMLParser as _EventParser
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from xml.etree import ElementTree
+from .fetcher import PageTooLarge
+from .jobs import _Transaction, _now
+from .metrics import CRAWL_PAGES
+from .result_cache import content_hash
+from .templates import template_issue_groups
+
+CRAWL_STORE_ENV_VAR = 'CRAWL_STORE'
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+HTML_TYPES = ('text/html', 'application/xhtml+xml')
+# Links to these are not followed; anything else is fetched and skipped unless it is HTML
+SKIPPED_EXTENSIONS = (
+    '.pdf', '.zip', '.gz', '.tar', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.ico',
+    '.css', '.js', '.json', '.mp3', '.mp4', '.webm', '.avi', '.mov', '.woff', '.woff2', '.ttf',
+    '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+)
+# Sitemaps are at most 50 MB uncompressed
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024
+
+# Final states of a crawled URL
+FINISHED_STATES = ('done', 'failed', 'duplicate', 'skipped')
+
+@dataclass(frozen=True)
+class CrawlConfig:
+    """Budgets and politeness limits for crawls."""
+    max_depth: int = 3
+    max_pages: int = 100
+    concurrency: int = 8
+    host_concurrency: int = 2
+    host_delay: float = 0.25
+
+    @classmethod
+    def from_env(cls) -> 'CrawlConfig':
+        """Build a config from CRAWL_* environment variables, keeping defaults for unset ones."""
+        defaults = cls()
+        return cls(
+            max_depth=int(os.getenv('CRAWL_MAX_DEPTH', defaults.max_depth)),
+            max_pages=int(os.getenv('CRAWL_MAX_PAGES', defaults.max_pages)),
+            concurrency=int(os.getenv('CRAWL_CONCURRENCY', defaults.concurrency)),
+            host_concurrency=int(os.getenv('CRAWL_HOST_CONCURRENCY', defaults.host_concurrency)),
+            host_delay=float(os.getenv('CRAWL_HOST_DELAY', defaults.host_delay)),
+        )
+
+def _remove_dot_segments(path: str) -> str:
+    if '.' not in path:
+        return path
+    normalized = posixpath.normpath(path)
+    # normpath keeps a leading '//' and drops a trailing slash, which are both significant
+    if normalized.startswith('//'):
+        normalized = '/' + normalized.lstrip('/')
+    if path.endswith(('/', '/.', '/..')) and normalized != '/':
+        normalized += '/'
+    return normalized
+
+def normalize_url(url: str, base: str = None) -> Optional[str]:
+    """Canonical form of an http(s) URL, resolved against base, or None for anything else.
+
+    Scheme and host are lowercased, default ports, credentials and the fragment
+    are dropped, and '.' and '..' path segments are resolved, so different
+    spellings of the same page are crawled once.
+    """
+    try:
+        if base is not None:
+            url = urljoin(base, url.strip())
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        host = parts.hostname
+        port = parts.port
+    except ValueError:
+        return None
+    if scheme not in DEFAULT_PORTS or not host:
+        return None
+    if ':' in host:
+        host = f'[{host}]'
+    netloc = host if port is None or port == DEFAULT_PORTS[scheme] else f'{host}:{port}'
+    return urlunsplit((scheme, netloc, _remove_dot_segments(parts.path) or '/', parts.query, ''))
+
+def origin(url: str) -> str:
+    """'scheme://host[:port]' of a normalized URL."""
+    parts = urlsplit(url)
+    return f'{parts.scheme}://{parts.netloc}'
+
+def is_sitemap_url(url: str) -> bool:
+    return urlsplit(url).path.lower().endswith(('.xml', '.xml.gz'))
+
+class _LinkExtractor(_EventParser):
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.links = []
+        self._base_seen = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'base' and not self._base_seen:
+            href = dict(attrs).get('href')
+            if href:
+                self._base_seen = True
+                self.base_url = urljoin(self.base_url, href)
+        elif tag in ('a', 'area'):
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append((href, self.base_url))
+
+def extract_links(content: bytes, charset: Optional[str], base_url: str) -> List[str]:
+    """Normalized http(s) targets of the page's <a> and <area> links, honouring <base href>, in page order."""
+    extractor = _LinkExtractor(base_url)
+    extractor.feed(content.decode(charset or 'utf-8', errors='replace'))
+    extractor.close()
+    links = []
+    seen = set()
+    for href, base in extractor.links:
+        url = normalize_url(href, base)
+        if url is not None and url not in seen:
+            seen.add(url)
+            links.append(url)
+    return links
+
+def parse_sitemap(content: bytes) -> Tuple[List[str], List[str]]:
+    """(page URLs, nested sitemap URLs) listed in a sitemap or sitemap index, which may be gzipped."""
+    if content[:2] == b'\x1f\x8b':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        content = decompressor.decompress(content, MAX_SITEMAP_BYTES)
+        if decompressor.unconsumed_tail:
+            raise ValueError(f'Sitemap is larger than {MAX_SITEMAP_BYTES} bytes uncompressed')
+    root = ElementTree.fromstring(content)
+    # Elements are namespaced ('{http://www.sitemaps.org/schemas/sitemap/0.9}loc'), but not always
+    locations = [
+        element.text.strip() for element in root.iter()
+        if element.tag.rsplit('}', 1)[-1] == 'loc' and element.text and element.text.strip()
+    ]
+    if root.tag.rsplit('}', 1)[-1] == 'sitemapindex':
+        return [], locations
+    return locations, []
+
+class HostLimiter:
+    """Caps concurrent requests per host and spaces out their starts by min_interval seconds."""
+
+    def __init__(self, concurrency: int = 2, min_interval: float = 0.0):
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self._semaphores = {}
+        self._next_start = {}
+
+    @contextlib.asynccontextmanager
+    async def slot(self, host: str):
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self.concurrency)
+        async with semaphore:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.min_interval
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+@dataclass
+class CrawlEntry:
+    """One URL of a crawl's frontier; kind is 'page' or 'sitemap'."""
+    crawl_id: str
+    url: str
+    depth: int
+    kind: str = 'page'
+
+class CrawlFrontier:
+    """Crawls and their frontiers, stored in SQLite.
+
+    With a file path, every process that opens it shares the crawls, and they
+    survive restarts; ':memory:' keeps them in this process only. A running
+    crawl renews a heartbeat, and one whose runner stopped beating for
+    lease_seconds (because its process died) can be resumed elsewhere.
+    """
+
+    def __init__(self, path: str = ':memory:', lease_seconds: float = 300):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._shared = None
+        self._lock = threading.Lock()
+        if path == ':memory:':
+            # An in-memory database lives as long as its one connection
+            self._shared = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        with self._connect() as conn:
+            if self._shared is None:
+                conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS crawls (
+                    id TEXT PRIMARY KEY,
+                    seed TEXT NOT NULL,
+                    origin TEXT NOT NULL,
+                    max_depth INTEGER NOT NULL,
+                    max_pages INTEGER NOT NULL,
+                    admitted INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    heartbeat REAL NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    finished_at TEXT
+                )''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS crawl_urls (
+                    crawl_id TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    depth INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    result TEXT,
+                    PRIMARY KEY (crawl_id, url)
+                )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_crawl_urls_state ON crawl_urls (crawl_id, state, depth, position)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_crawl_urls_position ON crawl_urls (crawl_id, position)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS crawl_contents (
+                    crawl_id TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    PRIMARY KEY (crawl_id, content_hash)
+                )''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS crawl_templates (
+                    crawl_id TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    first_url TEXT NOT NULL,
+                    pages INTEGER NOT NULL DEFAULT 1,
+                    issues TEXT NOT NULL,
+                    PRIMARY KEY (crawl_id, id)
+                )''')
+
+    def _connect(self, write: bool = True):
+        if self._shared is not None:
+            return _SharedTransaction(self._shared, self._lock, write)
+        return _Transaction(sqlite3.connect(self.path, timeout=30, isolation_level=None), write)
+
+    def create(self, seed: str, max_depth: int, max_pages: int, sitemap: bool = False) -> str:
+        """Create a queued crawl starting at seed, a page or a sitemap, and return its id."""
+        crawl_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO crawls (id, seed, origin, max_depth, max_pages, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (crawl_id, seed, origin(seed), max_depth, max_pages, 'queued', _now()),
+            )
+            self._admit(conn, crawl_id, [seed], 0, 'sitemap' if sitemap else 'page')
+        return crawl_id
+
+    def _admit(self, conn, crawl_id, urls, depth, kind):
+        crawl_origin, max_pages, admitted = conn.execute(
+            'SELECT origin, max_pages, admitted FROM crawls WHERE id = ?', (crawl_id,)
+        ).fetchone()
+        position = conn.execute('SELECT COUNT(*) FROM crawl_urls WHERE crawl_id = ?', (crawl_id,)).fetchone()[0]
+        added = 0
+        for url in urls:
+            if origin(url) != crawl_origin:
+                continue
+            # Sitemaps only lead to pages, so only pages count against the budget
+            if kind == 'page' and admitted + added >= max_pages:
+                break
+            inserted = conn.execute(
+                'INSERT OR IGNORE INTO crawl_urls (crawl_id, url, position, depth, kind, state) VALUES (?, ?, ?, ?, ?, ?)',
+                (crawl_id, url, position, depth, kind, 'pending'),
+            ).rowcount
+            if inserted:
+                position += 1
+                added += kind == 'page'
+        if added:
+            conn.execute('UPDATE crawls SET admitted = admitted + ? WHERE id = ?', (added, crawl_id))
+        return added
+
+    def admit(self, crawl_id: str, urls: List[str], depth: int, kind: str = 'page') -> int:
+        """Add same-origin URLs not seen before, within the page budget; returns how many pages were added."""
+        with self._connect() as conn:
+            return self._admit(conn, crawl_id, urls, depth, kind)
+
+    def start(self, crawl_id: str) -> bool:
+        """Mark a crawl as running if it is queued, paused, or its runner died; False if it cannot run now.
+
+        A paused crawl whose runner is still finishing the pages in flight
+        cannot be started again until that runner has stopped.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            started = conn.execute(
+                '''UPDATE crawls SET status = 'running', heartbeat = ?
+                   WHERE id = ? AND (status = 'queued' OR (status IN ('running', 'paused') AND heartbeat < ?))''',
+                (now, crawl_id, now - self.lease_seconds),
+            ).rowcount
+            if started:
+                # URLs in flight when the crawl was paused or its runner died are fetched again
+                conn.execute("UPDATE crawl_urls SET state = 'pending' WHERE crawl_id = ? AND state = 'claimed'", (crawl_id,))
+        return bool(started)
+
+    def pause(self, crawl_id: str) -> bool:
+        """Ask a crawl to stop after the pages in flight; False if it is not queued or running."""
+        with self._connect() as conn:
+            return bool(conn.execute(
+                "UPDATE crawls SET status = 'paused' WHERE id = ? AND status IN ('queued', 'running')", (crawl_id,)
+            ).rowcount)
+
+    def heartbeat(self, crawl_id: str) -> Optional[str]:
+        """Renew a running crawl's lease and return its status, which is 'paused' once pause() was called."""
+        with self._connect() as conn:
+            conn.execute("UPDATE crawls SET heartbeat = ? WHERE id = ? AND status = 'running'", (time.time(), crawl_id))
+            row = conn.execute('SELECT status FROM crawls WHERE id = ?', (crawl_id,)).fetchone()
+        return row[0] if row else None
+
+    def settle(self, crawl_id: str) -> Optional[str]:
+        """Release a crawl when its runner stops, marking it finished if nothing is left to fetch; returns its status."""
+        with self._connect() as conn:
+            # A zero heartbeat lets start() run the crawl again right away
+            conn.execute('UPDATE crawls SET heartbeat = 0 WHERE id = ?', (crawl_id,))
+            conn.execute(
+                '''UPDATE crawls SET status = 'finished', finished_at = ?
+                   WHERE id = ? AND status = 'running' AND NOT EXISTS (
+                       SELECT 1 FROM crawl_urls WHERE crawl_id = ? AND state IN ('pending', 'claimed'))''',
+                (_now(), crawl_id, crawl_id),
+            )
+            row = conn.execute('SELECT status FROM crawls WHERE id = ?', (crawl_id,)).fetchone()
+        return row[0] if row else None
+
+    def claim(self, crawl_id: str, limit: int) -> List[CrawlEntry]:
+        """Take up to limit pending URLs, shallowest first, in the order they were found."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                '''SELECT url, depth, kind FROM crawl_urls WHERE crawl_id = ? AND state = 'pending'
+                   ORDER BY depth, position LIMIT ?''',
+                (crawl_id, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE crawl_urls SET state = 'claimed' WHERE crawl_id = ? AND url = ?",
+                [(crawl_id, url) for url, _, _ in rows],
+            )
+        return [CrawlEntry(crawl_id, url, depth, kind) for url, depth, kind in rows]
+
+    def claim_content(self, crawl_id: str, page_hash: str, url: str) -> Optional[str]:
+        """Note that url has this content; returns the URL that had it first, or None if it is new to the crawl or url had it first."""
+        with self._connect() as conn:
+            inserted = conn.execute(
+                'INSERT OR IGNORE INTO crawl_contents (crawl_id, content_hash, url) VALUES (?, ?, ?)',
+                (crawl_id, page_hash, url),
+            ).rowcount
+            if inserted:
+                return None
+            original = conn.execute(
+                'SELECT url FROM crawl_contents WHERE crawl_id = ? AND content_hash = ?', (crawl_id, page_hash)
+            ).fetchone()[0]
+        # url's own claim, made by a visit that was cut short before the page completed
+        return None if original == url else original
+
+    def complete(self, entry: CrawlEntry, state: str, result: dict = None, templates: dict = None) -> None:
+        """Store a URL's final state, one of FINISHED_STATES, and its result.
+
+        templates maps the ids of the page templates on the page to their
+        issues, which are stored once per crawl rather than with each page.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE crawl_urls SET state = ?, result = ? WHERE crawl_id = ? AND url = ?',
+                (state, json.dumps(result) if result is not None else None, entry.crawl_id, entry.url),
+            )
+            for template_id, issues in (templates or {}).items():
+                conn.execute(
+                    '''INSERT INTO crawl_templates (crawl_id, id, first_url, issues) VALUES (?, ?, ?, ?)
+                       ON CONFLICT (crawl_id, id) DO UPDATE SET pages = pages + 1''',
+                    (entry.crawl_id, template_id, entry.url, json.dumps(issues)),
+                )
+        CRAWL_PAGES.inc(state=state)
+
+    def status(self, crawl_id: str) -> Optional[dict]:
+        """Status, budgets and URL counts per state of a crawl, or None if it does not exist."""
+        with self._connect(write=False) as conn:
+            row = conn.execute(
+                'SELECT seed, max_depth, max_pages, admitted, status, created_at, finished_at FROM crawls WHERE id = ?',
+                (crawl_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            counts = dict(conn.execute(
+                "SELECT state, COUNT(*) FROM crawl_urls WHERE crawl_id = ? AND kind = 'page' GROUP BY state",
+                (crawl_id,),
+            ).fetchall())
+        seed, max_depth, max_pages, admitted, status, created_at, finished_at = row
+        return {
+            'id': crawl_id,
+            'seed': seed,
+            'status': status,
+            'max_depth': max_depth,
+            'max_pages': max_pages,
+            'pages': admitted,
+            'pending': counts.get('pending', 0) + counts.get('claimed', 0),
+            **{state: counts.get(state, 0) for state in FINISHED_STATES},
+            'created_at': created_at,
+            'finished_at': finished_at,
+        }
+
+    def pages(self, crawl_id: str, offset: int = 0, limit: int = 50) -> List[dict]:
+        """Finished pages of a crawl in the order they were found, with their results."""
+        with self._connect(write=False) as conn:
+            rows = conn.execute(
+                f'''SELECT url, depth, state, result FROM crawl_urls
+                    WHERE crawl_id = ? AND kind = 'page' AND state IN ({', '.join('?' * len(FINISHED_STATES))})
+                    ORDER BY position LIMIT ? OFFSET ?''',
+                (crawl_id, *FINISHED_STATES, limit, offset),
+            ).fetchall()
+        return [
+            {'url': url, 'depth': depth, 'state': state, 'result': json.loads(result) if result else None}
+            for url, depth, state, result in rows
+        ]
+
+    def templates(self, crawl_id: str) -> List[dict]:
+        """Page templates found by a crawl, most widely shared first, with their issues and page counts."""
+        with self._connect(write=False) as conn:
+            rows = conn.execute(
+                'SELECT id, first_url, pages, issues FROM crawl_templates WHERE crawl_id = ? ORDER BY pages DESC, rowid',
+                (crawl_id,),
+            ).fetchall()
+        return [
+            {'id': template_id, 'first_url': first_url, 'pages': pages, **json.loads(issues)}
+            for template_id, first_url, pages, issues in rows
+        ]
+
+class _SharedTransaction(_Transaction):
+    """A transaction on a connection kept open for the frontier's lifetime, one thread at a time."""
+
+    def __init__(self, conn, lock, write):
+        super().__init__(conn, write)
+        self._lock = lock
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            return super().__enter__()
+        except BaseException:
+            self._lock.release()
+            raise
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self._lock.release()
+
+def create_crawl_frontier(url: str = None) -> CrawlFrontier:
+    """Create the frontier named by url or CRAWL_STORE: 'memory' (default) or 'sqlite:///path/to/crawls.db'."""
+    url = url or os.getenv(CRAWL_STORE_ENV_VAR, 'memory')
+    if url == 'memory':
+        return CrawlFrontier()
+    if url.startswith('sqlite:///'):
+        return CrawlFrontier(url[len('sqlite:///'):])
+    raise ValueError(f'Unsupported crawl store: {url}')
+
+class Crawler:
+    """Runs crawls from a frontier with an AsyncFetcher.
+
+    analyze(url, page) is a coroutine function returning the result dict
+    stored for a new page; page is the FetchResult, or None when the body was
+    too large to hold in memory and has to be analyzed by streaming it (its
+    links are then not followed). Download failures are stored as
+    {'url', 'error', 'success': False} results.
+    """
+
+    def __init__(self, frontier: CrawlFrontier, fetcher, analyze: Callable, config: CrawlConfig = None,
+                 heartbeat_interval: float = 5.0):
+        # config.max_depth and max_pages are the defaults for new crawls; each crawl stores its own
+        self.frontier = frontier
+        self.fetcher = fetcher
+        self.analyze = analyze
+        self.config = config or CrawlConfig()
+        self.heartbeat_interval = heartbeat_interval
+        self.limiter = HostLimiter(self.config.host_concurrency, self.config.host_delay)
+
+    async def run(self, crawl_id: str) -> Optional[str]:
+        """Crawl until the frontier is exhausted or the crawl is paused; returns its final status.
+
+        The crawl must have been marked running with CrawlFrontier.start().
+        Pausing lets the pages in flight finish; nothing is lost either way.
+        """
+        call = asyncio.to_thread
+        max_depth = (await call(self.frontier.status, crawl_id))['max_depth']
+        in_flight = set()
+        status = 'running'
+        try:
+            while True:
+                if status == 'running' and len(in_flight) < self.config.concurrency:
+                    for entry in await call(self.frontier.claim, crawl_id, self.config.concurrency - len(in_flight)):
+                        in_flight.add(asyncio.ensure_future(self._visit(entry, max_depth)))
+                if not in_flight:
+                    break
+                done, in_flight = await asyncio.wait(
+                    in_flight, timeout=self.heartbeat_interval, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    task.result()
+                # Also picks up a pause requested by any process
+                status = await call(self.frontier.heartbeat, crawl_id)
+        finally:
+            for task in in_flight:
+                task.cancel()
+        return await call(self.frontier.settle, crawl_id)
+
+    async def _visit(self, entry: CrawlEntry, max_depth: int):
+        call = asyncio.to_thread
+        try:
+            async with self.limiter.slot(urlsplit(entry.url).netloc):
+                page = await self.fetcher.fetch(entry.url)
+        except PageTooLarge:
+            if entry.kind == 'sitemap':
+                await call(self.frontier.complete, entry, 'failed', _failure(entry.url, 'Sitemap is too large'))
+                return
+            page = None
+        except Exception as e:
+            await call(self.frontier.complete, entry, 'failed', _failure(entry.url, e))
+            return
+
+        if entry.kind == 'sitemap':
+            await self._expand_sitemap(entry, page)
+            return
+
+        if page is not None:
+            if page.headers.get('Content-Type', 'text/html').split(';')[0].strip().lower() not in HTML_TYPES:
+                await call(self.frontier.complete, entry, 'skipped', {'url': entry.url, 'reason': 'not HTML'})
+                return
+            final_url = normalize_url(page.url) or entry.url
+            if origin(final_url) != origin(entry.url):
+                await call(self.frontier.complete, entry, 'skipped', {'url': entry.url, 'reason': f'redirected to {final_url}'})
+                return
+            original = await call(self.frontier.claim_content, entry.crawl_id, content_hash(page.content), entry.url)
+            if original is not None:
+                await call(self.frontier.complete, entry, 'duplicate', {'url': entry.url, 'duplicate_of': original})
+                return
+            if entry.depth < max_depth:
+                links = await call(extract_links, page.content, page.charset, final_url)
+                links = [url for url in links if not urlsplit(url).path.lower().endswith(SKIPPED_EXTENSIONS)]
+                await call(self.frontier.admit, entry.crawl_id, links, entry.depth + 1)
+
+        try:
+            result = await self.analyze(entry.url, page)
+        except Exception as e:
+            await call(self.frontier.complete, entry, 'failed', _failure(entry.url, e))
+            return
+        templates = None
+        if result.get('success', True) and 'accessibility' in result:
+            a11y_issues, color_issues, templates = template_issue_groups(result['accessibility'], result['colors'])
+            if templates:
+                result = dict(result, accessibility=a11y_issues, colors=color_issues, templates=list(templates))
+        await call(self.frontier.complete, entry, 'done' if result.get('success', True) else 'failed', result, templates)
+
+    async def _expand_sitemap(self, entry, page):
+        try:
+            pages, sitemaps = await asyncio.to_thread(parse_sitemap, page.content)
+        except (ValueError, ElementTree.ParseError, zlib.error) as e:
+            await asyncio.to_thread(self.frontier.complete, entry, 'failed', _failure(entry.url, f'Invalid sitemap: {e}'))
+            return
+        normalized = [url for url in (normalize_url(url) for url in pages) if url is not None]
+        nested = [url for url in (normalize_url(url) for url in sitemaps) if url is not None]
+        await asyncio.to_thread(self.frontier.admit, entry.crawl_id, nested, entry.depth, 'sitemap')
+        # Pages listed in a sitemap are as deep as the sitemap's seed
+        await asyncio.to_thread(self.frontier.admit, entry.crawl_id, normalized, entry.depth)
+        await asyncio.to_thread(self.frontier.complete, entry, 'done', {
+            'url': entry.url, 'pages': len(normalized), 'sitemaps': len(nested),
+        })
+
+def _failure(url, error):
+    return {'url': url, 'error': str(error), 'success': False}
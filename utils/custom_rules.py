@@ -1,9 +1,20 @@
-from dataclasses import dataclass
-from typing import Optional, List, Callable
-from bs4 import BeautifulSoup
+import hashlib
+from dataclasses import astuple, dataclass, field
+from functools import cached_property
+from typing import TYPE_CHECKING, Optional, List, Callable, Tuple
+import logging
 import re
+import threading
+import time
+from .snippets import outer_html
+from .tree_walker import TreeWalker
 
-@dataclass
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
 class CustomRule:
     name: str
     description: str
@@ -12,77 +23,265 @@ class CustomRule:
     message: str
     recommendation: str
     severity: str = "warning"  # "error" or "warning"
-    
+
+# Prefix of the per-rule keys added to a walker's timings
+RULE_TIMING_PREFIX = 'custom_rule:'
+
+# 'matches:' conditions search this many bytes of an element's markup, so a
+# rule on a large container does not serialize its whole subtree
+MATCH_MAX_BYTES = 16 * 1024
+
+# Tag name at the start of the rightmost compound selector, e.g. 'a' in 'nav > a.btn'
+_SUBJECT_TAG = re.compile(r'(?:^|[\s>+~])([a-zA-Z][\w-]*)[^\s>+~]*\s*$')
+
+def compile_condition(condition: str) -> Callable:
+    """Turn a condition string into a predicate on an element, parsing it only once."""
+    # Basic conditions
+    if condition == "exists":
+        return lambda element: True
+    elif condition == "not_exists":
+        return lambda element: False
+
+    # Attribute conditions
+    if condition.startswith("has_attr:"):
+        attr = condition.split(":")[1]
+        return lambda element: attr in element.attrs
+
+    # Attribute value conditions
+    if condition.startswith("attr_equals:"):
+        attr, value = condition.split(":")[1].split("=")
+        return lambda element: element.get(attr) == value
+
+    # Content conditions
+    if condition.startswith("contains_text:"):
+        text = condition.split(":")[1].lower()
+        return lambda element: text in element.get_text().lower()
+
+    # Regular expression conditions
+    if condition.startswith("matches:"):
+        pattern = re.compile(condition.split(":")[1])
+        return lambda element: bool(pattern.search(outer_html(element, MATCH_MAX_BYTES, ellipsis='')))
+
+    return lambda element: False
+
+def selector_tags(selector: str) -> Optional[Tuple[str, ...]]:
+    """Tag names a selector can match, or None when it may match any element."""
+    if '(' in selector or '|' in selector or '\\' in selector:
+        return None
+    # Attribute selectors may contain spaces or combinator characters inside quotes
+    selector = re.sub(r'\[[^\]]*\]', '[]', selector)
+    tags = []
+    for part in selector.split(','):
+        match = _SUBJECT_TAG.search(part.strip())
+        if not match:
+            return None
+        tags.append(match.group(1).lower())
+    return tuple(dict.fromkeys(tags))
+
+class CompiledRule:
+    """A custom rule with its selector and condition compiled for repeated evaluation."""
+
+    def __init__(self, rule: CustomRule):
+        # soupsieve imports bs4, so it is loaded with the first rule rather than at startup
+        import soupsieve
+        self.rule = rule
+        try:
+            self.matcher = soupsieve.compile(rule.selector)
+            self.condition = compile_condition(rule.condition)
+        except (soupsieve.SelectorSyntaxError, re.error, ValueError) as e:
+            raise ValueError(f'Invalid custom rule {rule.name}: {e}') from e
+        self.tags = selector_tags(rule.selector)
+
+    def evaluate(self, element) -> bool:
+        return self.matcher.match(element) and self.condition(element)
+
+@dataclass(frozen=True)
+class RuleSet:
+    """Immutable, versioned snapshot of the custom rules."""
+    version: int = 0
+    rules: Tuple[CustomRule, ...] = ()
+    compiled: Tuple[CompiledRule, ...] = field(default=(), compare=False, repr=False)
+
+    def __post_init__(self):
+        if len(self.compiled) != len(self.rules):
+            object.__setattr__(self, 'compiled', tuple(CompiledRule(rule) for rule in self.rules))
+
+        # Group rule indexes by the tag they target so one walk evaluates them all
+        by_tag = {}
+        any_tag = []
+        for index, compiled in enumerate(self.compiled):
+            if compiled.tags is None:
+                any_tag.append(index)
+            else:
+                for tag in compiled.tags:
+                    by_tag.setdefault(tag, []).append(index)
+        object.__setattr__(self, '_by_tag', by_tag)
+        object.__setattr__(self, '_any_tag', any_tag)
+
+    def __reduce__(self):
+        # Compiled conditions are closures; worker processes recompile on unpickling
+        return (RuleSet, (self.version, self.rules))
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """Hash of the rules' content; unlike version, it is stable across restarts."""
+        digest = hashlib.sha256()
+        for rule in self.rules:
+            digest.update(repr(astuple(rule)).encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()[:16]
+
+    def register(self, walker: TreeWalker, issues: List[dict]) -> None:
+        """Evaluate every rule during the walk, appending issues in rule order at the end."""
+        rule_issues = [[] for _ in self.compiled]
+        failed = set()
+        evaluators = [compiled.evaluate for compiled in self.compiled]
+        if walker.timings is not None:
+            # Break the walker's total for this method down per rule
+            evaluators = [_timed_rule(walker.timings, compiled) for compiled in self.compiled]
+
+        def evaluator(indexes):
+            def visit(element):
+                for index in indexes:
+                    if index in failed:
+                        continue
+                    rule = self.compiled[index].rule
+                    try:
+                        if evaluators[index](element):
+                            rule_issues[index].append({
+                                'type': rule.severity,
+                                'category': 'Custom Rule: ' + rule.name,
+                                'message': rule.message,
+                                'recommendation': rule.recommendation
+                            })
+                    except Exception as e:
+                        failed.add(index)
+                        rule_issues[index].append({
+                            'type': 'error',
+                            'category': 'Custom Rule Error',
+                            'message': f'Error evaluating rule {rule.name}: {str(e)}',
+                            'recommendation': 'Review and fix the custom rule configuration'
+                        })
+            return visit
+
+        def finish():
+            for bucket in rule_issues:
+                issues.extend(bucket)
+
+        for tag, indexes in self._by_tag.items():
+            walker.on_enter(tag, evaluator(indexes))
+        if self._any_tag:
+            walker.on_match(lambda tag: True, evaluator(self._any_tag))
+        walker.on_finish(finish)
+
+def _timed_rule(timings, compiled):
+    label = RULE_TIMING_PREFIX + compiled.rule.name
+    timings.setdefault(label, 0.0)
+    evaluate = compiled.evaluate
+    perf_counter = time.perf_counter
+
+    def timed(element):
+        start = perf_counter()
+        try:
+            return evaluate(element)
+        finally:
+            timings[label] += perf_counter() - start
+    return timed
+
 class CustomRuleManager:
-    def __init__(self):
-        self.rules: List[CustomRule] = []
-        
+    """Custom rules keyed by name, published to readers as immutable RuleSet snapshots.
+
+    Rules change one at a time (add_rule, remove_rule) or by applying the changes
+    read from a rule store (apply_changes); either way only the rules that changed
+    are compiled again.
+    """
+
+    def __init__(self, rule_set: Optional[RuleSet] = None):
+        # Readers take the current snapshot without locking; writers swap in a new one
+        self._rule_set = rule_set or RuleSet()
+        # Rule name -> (position, compiled rule), in step with the snapshot
+        self._entries = {
+            compiled.rule.name: (position, compiled) for position, compiled in enumerate(self._rule_set.compiled)
+        }
+        self._write_lock = threading.Lock()
+
+    @property
+    def rules(self) -> Tuple[CustomRule, ...]:
+        return self._rule_set.rules
+
+    @property
+    def version(self) -> int:
+        return self._rule_set.version
+
+    def snapshot(self) -> RuleSet:
+        """Get the current immutable rule set."""
+        return self._rule_set
+
     def add_rule(self, rule: CustomRule) -> None:
-        """Add a new custom accessibility rule."""
-        self.rules.append(rule)
-        
+        """Add a custom accessibility rule, replacing any rule with the same name.
+
+        The rule is compiled here, so an invalid selector, condition or regex raises ValueError.
+        """
+        compiled = CompiledRule(rule)
+        with self._write_lock:
+            entries = dict(self._entries)
+            previous = entries.get(rule.name)
+            position = previous[0] if previous else max((entry[0] for entry in entries.values()), default=-1) + 1
+            entries[rule.name] = (position, compiled)
+            self._publish(self._rule_set.version + 1, entries)
+
     def remove_rule(self, rule_name: str) -> None:
         """Remove a custom rule by name."""
-        self.rules = [rule for rule in self.rules if rule.name != rule_name]
-        
+        with self._write_lock:
+            if rule_name not in self._entries:
+                return
+            entries = dict(self._entries)
+            del entries[rule_name]
+            self._publish(self._rule_set.version + 1, entries)
+
     def get_rule(self, rule_name: str) -> Optional[CustomRule]:
         """Get a custom rule by name."""
-        return next((rule for rule in self.rules if rule.name == rule_name), None)
-        
-    def evaluate_rules(self, soup: BeautifulSoup) -> List[dict]:
+        entry = self._entries.get(rule_name)
+        return entry[1].rule if entry else None
+
+    def apply_changes(self, version: int, changed: List[Tuple[int, CustomRule]], removed: List[str]) -> None:
+        """Bring the rules up to a rule store version.
+
+        changed holds (position, rule) for every rule added or edited since the
+        current version, and removed the names of deleted rules. Unchanged rules
+        keep their compiled form. A stored rule that no longer compiles is left
+        out rather than failing the whole update.
+        """
+        with self._write_lock:
+            if version <= self._rule_set.version:
+                return
+            entries = dict(self._entries)
+            for name in removed:
+                entries.pop(name, None)
+            for position, rule in changed:
+                current = entries.get(rule.name)
+                if current is not None and current[1].rule == rule:
+                    entries[rule.name] = (position, current[1])
+                    continue
+                try:
+                    entries[rule.name] = (position, CompiledRule(rule))
+                except ValueError:
+                    logger.exception('Skipping stored custom rule %s', rule.name)
+                    entries.pop(rule.name, None)
+            self._publish(version, entries)
+
+    def _publish(self, version, entries):
+        ordered = [compiled for _, compiled in sorted(entries.values(), key=lambda entry: entry[0])]
+        self._entries = entries
+        self._rule_set = RuleSet(version, tuple(compiled.rule for compiled in ordered), tuple(ordered))
+
+    def register(self, walker: TreeWalker, issues: List[dict]) -> None:
+        """Evaluate the current rules as part of an existing tree walk."""
+        self.snapshot().register(walker, issues)
+
+    def evaluate_rules(self, soup: 'BeautifulSoup') -> List[dict]:
         """Evaluate all custom rules against the provided HTML content."""
         issues = []
-        
-        for rule in self.rules:
-            try:
-                # Find elements matching the selector
-                elements = soup.select(rule.selector)
-                
-                for element in elements:
-                    # Evaluate the condition
-                    if self._evaluate_condition(element, rule.condition):
-                        issues.append({
-                            'type': rule.severity,
-                            'category': 'Custom Rule: ' + rule.name,
-                            'message': rule.message,
-                            'recommendation': rule.recommendation
-                        })
-            except Exception as e:
-                issues.append({
-                    'type': 'error',
-                    'category': 'Custom Rule Error',
-                    'message': f'Error evaluating rule {rule.name}: {str(e)}',
-                    'recommendation': 'Review and fix the custom rule configuration'
-                })
-                
+        walker = TreeWalker()
+        self.register(walker, issues)
+        walker.walk(soup)
         return issues
-    
-    def _evaluate_condition(self, element: BeautifulSoup, condition: str) -> bool:
-        """Evaluate a condition against an element."""
-        # Basic conditions
-        if condition == "exists":
-            return True
-        elif condition == "not_exists":
-            return False
-            
-        # Attribute conditions
-        if condition.startswith("has_attr:"):
-            attr = condition.split(":")[1]
-            return attr in element.attrs
-            
-        # Attribute value conditions
-        if condition.startswith("attr_equals:"):
-            attr, value = condition.split(":")[1].split("=")
-            return element.get(attr) == value
-            
-        # Content conditions
-        if condition.startswith("contains_text:"):
-            text = condition.split(":")[1]
-            return text.lower() in element.get_text().lower()
-            
-        # Regular expression conditions
-        if condition.startswith("matches:"):
-            pattern = condition.split(":")[1]
-            return bool(re.search(pattern, str(element)))
-            
-        return False
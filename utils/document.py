@@ -0,0 +1,48 @@
+import os
+from bs4 import BeautifulSoup
+
+PARSER_BACKENDS = ('lxml', 'html5lib', 'html.parser')
+PARSER_ENV_VAR = 'A11Y_HTML_PARSER'
+
+def available_parsers():
+    """Return the parser backends that can be used in this environment."""
+    available = []
+    for backend in PARSER_BACKENDS:
+        if backend == 'html.parser':
+            available.append(backend)
+            continue
+        try:
+            __import__(backend)
+        except ImportError:
+            continue
+        available.append(backend)
+    return available
+
+def default_parser() -> str:
+    """Pick the parser backend: A11Y_HTML_PARSER if set, else lxml when installed, else html.parser."""
+    configured = os.environ.get(PARSER_ENV_VAR)
+    if configured:
+        if configured not in PARSER_BACKENDS:
+            raise ValueError(f'Unknown HTML parser backend: {configured}')
+        return configured
+    return 'lxml' if 'lxml' in available_parsers() else 'html.parser'
+
+class ParsedDocument:
+    """A page parsed once and shared by every analyzer that inspects it."""
+
+    def __init__(self, html_content, parser: str = None, encoding: str = None):
+        self.parser = parser or default_parser()
+        self.size = len(html_content)
+        # Template region fingerprints by element id, computed by the first analyzer that needs them
+        self.fingerprints = {}
+        if isinstance(html_content, bytes):
+            # Raw bytes let BeautifulSoup sniff <meta charset> when the server sent no charset
+            self.soup = BeautifulSoup(html_content, self.parser, from_encoding=encoding)
+        else:
+            self.soup = BeautifulSoup(html_content, self.parser)
+
+def parse_document(content, parser: str = None) -> ParsedDocument:
+    """Return content unchanged if it is already parsed, otherwise parse it."""
+    if isinstance(content, ParsedDocument):
+        return content
+    return ParsedDocument(content, parser)
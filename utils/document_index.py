@@ -0,0 +1,67 @@
+from collections import defaultdict
+
+LABELABLE_TAGS = ['input', 'select', 'textarea']
+LANDMARK_TAGS = ['main', 'header', 'nav', 'footer', 'aside', 'section', 'form']
+
+class DocumentIndex:
+    """Lookup tables collected during the tree walk so checks never re-scan the document."""
+
+    def __init__(self):
+        self.ids = {}
+        self.labels_for = defaultdict(list)
+        self.roles = defaultdict(list)
+        self.landmarks = defaultdict(list)
+        self._wrapped_controls = set()
+        self._open_labels = []
+
+    def register(self, walker) -> None:
+        """Hook the index into a TreeWalker; register it before any check that reads it."""
+        walker.on_match(lambda tag: 'id' in tag.attrs, self._visit_id)
+        walker.on_match(lambda tag: 'role' in tag.attrs, self._visit_role)
+        walker.on_enter('label', self._enter_label)
+        walker.on_leave('label', self._leave_label)
+        walker.on_enter(LABELABLE_TAGS, self._visit_control)
+        walker.on_enter(LANDMARK_TAGS, self._visit_landmark)
+
+    def get_by_id(self, element_id):
+        """Return the first element with the given id, or None."""
+        return self.ids.get(element_id)
+
+    def has_label(self, control) -> bool:
+        """Whether a form control has a <label for>, a wrapping <label> or a resolvable aria-labelledby."""
+        control_id = control.get('id')
+        if control_id is not None and control_id in self.labels_for:
+            return True
+        if id(control) in self._wrapped_controls:
+            return True
+        labelledby = control.get('aria-labelledby')
+        if labelledby:
+            return any(ref in self.ids for ref in labelledby.split())
+        return False
+
+    def has_landmark(self, tag: str, role: str) -> bool:
+        """Whether the page has the landmark either as an element or through its role."""
+        return bool(self.landmarks.get(tag) or self.roles.get(role))
+
+    def _visit_id(self, element):
+        self.ids.setdefault(element['id'], element)
+
+    def _visit_role(self, element):
+        self.roles[element['role']].append(element)
+
+    def _visit_landmark(self, element):
+        self.landmarks[element.name].append(element)
+
+    def _enter_label(self, label):
+        target = label.get('for')
+        if target is not None:
+            self.labels_for[target].append(label)
+        self._open_labels.append(label)
+
+    def _leave_label(self, label):
+        self._open_labels.pop()
+
+    def _visit_control(self, control):
+        # A label with a for attribute labels its target, not what it wraps
+        if self._open_labels and self._open_labels[-1].get('for') is None:
+            self._wrapped_controls.add(id(control))
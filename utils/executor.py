@@ -0,0 +1,186 @@
+import concurrent.futures
+import os
+import threading
+import time
+from typing import Optional
+from .accessibility_checker import AccessibilityChecker
+from .color_validator import ColorValidator
+from .custom_rules import RuleSet
+from .document import ParsedDocument, default_parser
+from .profiling import profile_call
+from .stylesheets import STYLESHEET_CACHE, MissingStylesheets
+from .templates import TEMPLATE_CACHE
+
+EXECUTOR_KINDS = ('process', 'thread')
+
+# Bump whenever a change to the parser setup or the checks changes their output,
+# so results stored by an older version are not reused
+ANALYZER_VERSION = 1
+
+# Rule set loaded into a pool worker by its initializer
+_worker_rule_set: Optional[RuleSet] = None
+
+def analyze_page(content, encoding: str = None, rule_set: RuleSet = None, timings: dict = None, checks: dict = None,
+                 stylesheets: dict = None):
+    """Parse a page and run every check on it.
+
+    Returns only the two issue lists, so results stay cheap to send back from a worker process.
+    timings, if given, receives the seconds spent on 'parse', 'accessibility' and 'colors';
+    checks, if given, the seconds spent in each check (see TreeWalker). stylesheets
+    maps the hrefs of the page's linked stylesheets to their (stylesheet_key, text),
+    where the text may be None for a sheet this process has parsed before
+    (see document_stylesheets).
+    """
+    start = time.perf_counter()
+    document = ParsedDocument(content, encoding=encoding)
+    parsed = time.perf_counter()
+    a11y_issues = AccessibilityChecker(document, rule_set).analyze(checks, TEMPLATE_CACHE)
+    checked = time.perf_counter()
+    color_issues = ColorValidator(document, stylesheets).validate(checks, TEMPLATE_CACHE)
+    if timings is not None:
+        timings['parse'] = parsed - start
+        timings['accessibility'] = checked - parsed
+        timings['colors'] = time.perf_counter() - checked
+    return a11y_issues, color_issues
+
+def analyzer_version(parser: str = None) -> str:
+    """The analyzer version and HTML parser backend that analyze_page runs with, such as '1/lxml'."""
+    return f'{ANALYZER_VERSION}/{parser or default_parser()}'
+
+def measured_analysis(content, encoding: str = None, rule_set: RuleSet = None,
+                      check_timings: bool = False, profile: bool = False, stylesheets: dict = None):
+    """analyze_page plus what it cost, as (accessibility issues, color issues, stats).
+
+    stats holds 'timings' (see analyze_page), 'checks' (per-check seconds when
+    check_timings is set, else None) and 'profile' (marshalled cProfile stats when
+    profile is set, else None).
+    """
+    timings = {}
+    checks = {} if check_timings else None
+    args = (content, encoding, rule_set, timings, checks, stylesheets)
+    if profile:
+        (a11y_issues, color_issues), stats = profile_call(analyze_page, *args)
+    else:
+        a11y_issues, color_issues = analyze_page(*args)
+        stats = None
+    return a11y_issues, color_issues, {'timings': timings, 'checks': checks, 'profile': stats}
+
+def _init_worker(rule_set: RuleSet):
+    global _worker_rule_set
+    _worker_rule_set = rule_set
+    # Pay for parser imports and lazy setup before the first real page arrives
+    analyze_page(b'<html lang="en"><body><main></main></body></html>', rule_set=rule_set)
+
+def _analyze_in_worker(content, encoding, check_timings, profile, stylesheets, rule_set=None):
+    # Ask for sheets this worker has not parsed before spending anything on the page
+    missing = [key for key, text in (stylesheets or {}).values() if text is None and STYLESHEET_CACHE.get(key) is None]
+    if missing:
+        raise MissingStylesheets(missing)
+    return measured_analysis(content, encoding, rule_set or _worker_rule_set, check_timings, profile, stylesheets)
+
+class ThreadAnalysisExecutor:
+    """Runs checks on a thread pool; cheap to start but limited to one core by the GIL."""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(self, content, encoding: str = None, rule_set: RuleSet = None,
+               check_timings: bool = False, profile: bool = False, stylesheets: dict = None) -> concurrent.futures.Future:
+        """Schedule measured_analysis for a page and return a future of its result."""
+        return self._pool.submit(measured_analysis, content, encoding, rule_set, check_timings, profile, stylesheets)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+class ProcessAnalysisExecutor:
+    """Runs checks on a pool of warm worker processes so batches use every core.
+
+    Each worker loads the rule set once at startup. Submitting with a newer rule set
+    version replaces the pool, so running tasks finish on the rules they started with.
+    Tasks submitted with an older version, such as those of a long job that took
+    its snapshot earlier, carry their rules along instead of replacing the pool.
+    """
+
+    def __init__(self, max_workers: int, rule_set: RuleSet = None):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._rule_set = rule_set or RuleSet()
+        self._pool = self._start_pool(self._rule_set)
+
+    def submit(self, content, encoding: str = None, rule_set: RuleSet = None,
+               check_timings: bool = False, profile: bool = False, stylesheets: dict = None) -> concurrent.futures.Future:
+        """Schedule measured_analysis for a page and return a future of its result.
+
+        Linked stylesheets are sent by key only. A worker that has not parsed
+        one of them yet fails with MissingStylesheets, and the page is sent
+        again with their texts, so a site's stylesheet crosses to each worker
+        about once rather than with every page.
+        """
+        if not stylesheets:
+            return self._submit(content, encoding, rule_set, check_timings, profile, stylesheets)
+        keys_only = {href: (key, None) for href, (key, _) in stylesheets.items()}
+        result = concurrent.futures.Future()
+
+        def finished(future):
+            if isinstance(future.exception(), MissingStylesheets):
+                # Any worker may take the retry, so it carries every text
+                try:
+                    future = self._submit(content, encoding, rule_set, check_timings, profile, stylesheets)
+                except RuntimeError as e:
+                    _set_outcome(result, exception=e)
+                    return
+                future.add_done_callback(lambda retry: _copy_outcome(retry, result))
+                return
+            _copy_outcome(future, result)
+
+        self._submit(content, encoding, rule_set, check_timings, profile, keys_only).add_done_callback(finished)
+        return result
+
+    def _submit(self, content, encoding, rule_set, check_timings, profile, stylesheets):
+        with self._lock:
+            if rule_set is not None and rule_set.version > self._rule_set.version:
+                self._pool.shutdown(wait=False)
+                self._rule_set = rule_set
+                self._pool = self._start_pool(rule_set)
+            own_rules = None if rule_set is None or rule_set.version == self._rule_set.version else rule_set
+            return self._pool.submit(_analyze_in_worker, content, encoding, check_timings, profile, stylesheets, own_rules)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            self._pool.shutdown(wait=wait)
+
+    def _start_pool(self, rule_set):
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_worker,
+            initargs=(rule_set,),
+        )
+
+def _set_outcome(future, result=None, exception=None):
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except concurrent.futures.InvalidStateError:
+        # Cancelled by the caller in the meantime
+        pass
+
+def _copy_outcome(source, target):
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        _set_outcome(target, exception=source.exception())
+    else:
+        _set_outcome(target, source.result())
+
+def create_executor(kind: str = None, max_workers: int = None, rule_set: RuleSet = None):
+    """Build the executor named by kind, or by ANALYSIS_EXECUTOR ('process' by default)."""
+    kind = kind or os.getenv('ANALYSIS_EXECUTOR', 'process')
+    max_workers = max_workers or int(os.getenv('ANALYSIS_WORKERS', os.cpu_count() or 1))
+    if kind == 'process':
+        return ProcessAnalysisExecutor(max_workers, rule_set)
+    if kind == 'thread':
+        return ThreadAnalysisExecutor(max_workers)
+    raise ValueError(f'Unknown analysis executor: {kind}')
@@ -0,0 +1,200 @@
+import asyncio
+import contextlib
+import os
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+import aiohttp
+from .metrics import FETCH_SECONDS, FETCHES
+
+@dataclass(frozen=True)
+class FetchConfig:
+    """Connection pool, timeout and size settings for AsyncFetcher."""
+    connect_timeout: float = 10.0
+    read_timeout: float = 30.0
+    max_connections: int = 100
+    max_connections_per_host: int = 4
+    max_bytes: int = 20 * 1024 * 1024
+    max_stream_bytes: Optional[int] = None
+    chunk_size: int = 64 * 1024
+    user_agent: str = 'ai-accessibility-advisor/0.1'
+
+    @classmethod
+    def from_env(cls) -> 'FetchConfig':
+        """Build a config from FETCH_* environment variables, keeping defaults for unset ones."""
+        defaults = cls()
+        return cls(
+            connect_timeout=float(os.getenv('FETCH_CONNECT_TIMEOUT', defaults.connect_timeout)),
+            read_timeout=float(os.getenv('FETCH_READ_TIMEOUT', defaults.read_timeout)),
+            max_connections=int(os.getenv('FETCH_MAX_CONNECTIONS', defaults.max_connections)),
+            max_connections_per_host=int(os.getenv('FETCH_MAX_CONNECTIONS_PER_HOST', defaults.max_connections_per_host)),
+            max_bytes=int(os.getenv('FETCH_MAX_BYTES', defaults.max_bytes)),
+            max_stream_bytes=int(os.getenv('FETCH_MAX_STREAM_BYTES', 0)) or None,
+        )
+
+class FetchError(Exception):
+    """Raised when a page cannot be downloaded."""
+
+class PageTooLarge(FetchError):
+    """Raised when a page body exceeds the size cap; it can still be analyzed by streaming."""
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int
+    content: bytes
+    charset: Optional[str] = None
+    headers: dict = field(default_factory=dict)
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def not_modified(self) -> bool:
+        """True when a conditional request was answered with 304 and there is no body."""
+        return self.status == 304
+
+    def text(self) -> str:
+        return self.content.decode(self.charset or 'utf-8', errors='replace')
+
+@dataclass
+class StreamedPage:
+    url: str
+    status: int
+    chunks: AsyncIterator[bytes]
+    charset: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+class AsyncFetcher:
+    """Downloads pages over one shared, per-host limited connection pool.
+
+    Use as an async context manager so the pool is opened and closed once per batch:
+
+        async with AsyncFetcher() as fetcher:
+            result = await fetcher.fetch(url)
+    """
+
+    def __init__(self, config: FetchConfig = None):
+        self.config = config or FetchConfig()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.config.max_connections,
+            limit_per_host=self.config.max_connections_per_host,
+        )
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=self.config.connect_timeout,
+            sock_read=self.config.read_timeout,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={'User-Agent': self.config.user_agent},
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+        self._session = None
+
+    async def fetch(self, url: str, etag: str = None, last_modified: str = None, max_bytes: int = None) -> FetchResult:
+        """Download a page, streaming the body and enforcing the size cap.
+
+        Passing the etag or last_modified of an earlier fetch makes the request
+        conditional; an unchanged page then comes back as a 304 with no content.
+        max_bytes, if given, replaces the configured size cap.
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        with FETCH_SECONDS.time(client='aiohttp'):
+            try:
+                chunks = []
+                async with self._open(url, headers) as response:
+                    async for chunk in self._iter_body(url, response, max_bytes or self.config.max_bytes):
+                        chunks.append(chunk)
+                    result = FetchResult(
+                        url=str(response.url),
+                        status=response.status,
+                        content=b''.join(chunks),
+                        charset=response.charset,
+                        headers=dict(response.headers),
+                        etag=response.headers.get('ETag'),
+                        last_modified=response.headers.get('Last-Modified'),
+                    )
+            except PageTooLarge:
+                FETCHES.inc(client='aiohttp', outcome='too_large')
+                raise
+            except Exception:
+                FETCHES.inc(client='aiohttp', outcome='error')
+                raise
+        FETCHES.inc(client='aiohttp', outcome='not_modified' if result.not_modified else 'ok')
+        return result
+
+    @contextlib.asynccontextmanager
+    async def stream(self, url: str):
+        """Open a page whose body is consumed chunk by chunk as it arrives.
+
+            async with fetcher.stream(url) as page:
+                async for chunk in page.chunks:
+                    ...
+
+        The body is never held in memory as a whole, so only max_stream_bytes applies.
+        """
+        async with self._open(url) as response:
+            yield StreamedPage(
+                url=str(response.url),
+                status=response.status,
+                chunks=self._iter_body(url, response, self.config.max_stream_bytes),
+                charset=response.charset,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+            )
+
+    def _open(self, url, headers=None):
+        if self._session is None:
+            raise RuntimeError('AsyncFetcher must be used as an async context manager')
+        return _Request(self._session, url, headers)
+
+    async def _iter_body(self, url, response, max_bytes):
+        if max_bytes is not None and response.content_length is not None and response.content_length > max_bytes:
+            raise PageTooLarge(f'Failed to fetch URL content: {url} is larger than {max_bytes} bytes')
+
+        received = 0
+        async for chunk in response.content.iter_chunked(self.config.chunk_size):
+            received += len(chunk)
+            if max_bytes is not None and received > max_bytes:
+                raise PageTooLarge(f'Failed to fetch URL content: {url} is larger than {max_bytes} bytes')
+            yield chunk
+
+class _Request:
+    """Async context manager that opens a GET request and maps client errors to FetchError."""
+
+    def __init__(self, session, url, headers=None):
+        self._session = session
+        self._url = url
+        self._headers = headers
+        self._response = None
+
+    async def __aenter__(self):
+        try:
+            self._response = await self._session.get(self._url, headers=self._headers)
+            self._response.raise_for_status()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if self._response is not None:
+                self._response.release()
+            raise FetchError(f'Failed to fetch URL content: {_describe(e)}') from e
+        return self._response
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._response.release()
+        if isinstance(exc, (aiohttp.ClientError, asyncio.TimeoutError)):
+            raise FetchError(f'Failed to fetch URL content: {_describe(exc)}') from exc
+
+def _describe(error) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return 'request timed out'
+    return str(error) or error.__class__.__name__
@@ -0,0 +1,69 @@
+class Issue(dict):
+    """An issue whose message embeds an element or a measured value, in the same dict shape as every other issue.
+
+    The message is built from template by replacing '{value}' with value, such
+    as a contrast ratio or a color, and '{element}' with snippet, the element's
+    markup. Keeping the template, value, snippet and the element's CSS selector
+    path apart lets history storage keep each template and snippet once and store
+    only their keys, and the value, per issue.
+    """
+    __slots__ = ('template', 'snippet', 'selector', 'value')
+
+    def __init__(self, type, category, template, recommendation, snippet=None, selector=None, value=None):
+        message = template
+        if value is not None:
+            message = message.replace('{value}', value)
+        if snippet is not None:
+            message = message.replace('{element}', snippet)
+        super().__init__(
+            type=type,
+            category=category,
+            message=message,
+            recommendation=recommendation,
+        )
+        self.template = template
+        self.snippet = snippet
+        self.selector = selector
+        self.value = value
+
+class SelectorPaths:
+    """Builds CSS selector paths for elements of one document.
+
+    Sibling positions are counted once per parent, so paths stay cheap for
+    elements in long lists.
+    """
+
+    def __init__(self):
+        self._positions = {}
+
+    def path(self, element) -> str:
+        """Selector such as 'html > body > ul:nth-of-type(2) > li:nth-of-type(3)', anchored at the nearest id."""
+        # Imported here so models can use Issue without loading bs4, which soupsieve imports
+        import soupsieve
+        parts = []
+        while element is not None and element.parent is not None:
+            element_id = element.get('id')
+            if isinstance(element_id, str) and element_id:
+                parts.append('#' + soupsieve.escape(element_id))
+                break
+            parts.append(self._step(element))
+            element = element.parent
+        return ' > '.join(reversed(parts))
+
+    def _step(self, element):
+        parent = element.parent
+        steps = self._positions.get(id(parent))
+        if steps is None:
+            positions = []
+            counts = {}
+            for child in parent.children:
+                if child.name is not None:
+                    counts[child.name] = counts.get(child.name, 0) + 1
+                    positions.append((child, counts[child.name]))
+            # nth-of-type is only needed when siblings share the tag name
+            steps = {
+                id(child): child.name if counts[child.name] == 1 else f'{child.name}:nth-of-type({position})'
+                for child, position in positions
+            }
+            self._positions[id(parent)] = steps
+        return steps[id(element)]
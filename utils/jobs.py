@@ -0,0 +1,353 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_ENV_VAR = 'JOB_QUEUE'
+
+@dataclass
+class Task:
+    """One URL of a job, handed to a worker until it completes or is retried."""
+    job_id: str
+    position: int
+    url: str
+    attempts: int = 0
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+def _job_status(job_id, total, completed, failed, started, created_at, finished_at):
+    if completed >= total:
+        status = 'finished'
+    elif started:
+        status = 'running'
+    else:
+        status = 'queued'
+    return {
+        'id': job_id,
+        'status': status,
+        'total': total,
+        'completed': completed,
+        'failed': failed,
+        'progress': completed / total if total else 1.0,
+        'created_at': created_at,
+        'finished_at': finished_at,
+    }
+
+class MemoryJobQueue:
+    """Job queue held in process memory; jobs are lost on restart.
+
+    Suitable for local runs with a single web process. Use SQLiteJobQueue when
+    several processes serve the app or jobs must survive a restart.
+    """
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._jobs = {}
+        # Heap of (due time, sequence, task); the sequence keeps FIFO order among due tasks
+        self._pending = []
+        self._sequence = itertools.count()
+
+    def enqueue(self, urls: List[str]) -> str:
+        """Create a job for the URLs and return its id."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                'total': len(urls),
+                'results': [],
+                'failed': 0,
+                'started': False,
+                'created_at': _now(),
+                'finished_at': None if urls else _now(),
+            }
+            for position, url in enumerate(urls):
+                heapq.heappush(self._pending, (0.0, next(self._sequence), Task(job_id, position, url)))
+            self._lock.notify_all()
+        return job_id
+
+    def claim(self, limit: int, wait: float = 0) -> List[Task]:
+        """Take up to limit tasks that are due, waiting up to wait seconds for one to arrive."""
+        deadline = time.monotonic() + wait
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                if (self._pending and self._pending[0][0] <= now) or now >= deadline:
+                    break
+                next_due = self._pending[0][0] if self._pending else deadline
+                self._lock.wait(min(deadline, next_due) - now)
+
+            tasks = []
+            while self._pending and self._pending[0][0] <= now and len(tasks) < limit:
+                task = heapq.heappop(self._pending)[2]
+                task.attempts += 1
+                self._jobs[task.job_id]['started'] = True
+                tasks.append(task)
+            return tasks
+
+    def retry(self, task: Task, delay: float) -> None:
+        """Put a task back on the queue once delay seconds have passed."""
+        with self._lock:
+            heapq.heappush(self._pending, (time.monotonic() + delay, next(self._sequence), task))
+            self._lock.notify_all()
+
+    def complete(self, task: Task, result: dict) -> None:
+        """Store the final result of a task."""
+        with self._lock:
+            job = self._jobs[task.job_id]
+            job['results'].append(result)
+            if not result.get('success', True):
+                job['failed'] += 1
+            if len(job['results']) >= job['total']:
+                job['finished_at'] = _now()
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """Status and progress of a job, or None if it does not exist."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return _job_status(job_id, job['total'], len(job['results']), job['failed'],
+                               job['started'], job['created_at'], job['finished_at'])
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 50) -> List[dict]:
+        """Results of a job in completion order."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return []
+            return job['results'][offset:offset + limit]
+
+class SQLiteJobQueue:
+    """Job queue stored in a SQLite file, shared by every process that opens it.
+
+    Claimed tasks are leased for lease_seconds; a task whose worker died before
+    completing it becomes due again once the lease runs out.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._wakeup = threading.Event()
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            # WAL lets status and result reads proceed while a worker writes
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    total INTEGER NOT NULL,
+                    completed INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    started INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    finished_at TEXT
+                );
+                CREATE TABLE IF NOT EXISTS job_tasks (
+                    job_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    url TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    due_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, position)
+                );
+                CREATE INDEX IF NOT EXISTS ix_job_tasks_due_at ON job_tasks (due_at);
+                CREATE TABLE IF NOT EXISTS job_results (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    result TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_job_results_job_id ON job_results (job_id, id);
+            ''')
+        finally:
+            conn.close()
+
+    def _connect(self, write: bool = True):
+        return _Transaction(sqlite3.connect(self.path, timeout=30, isolation_level=None), write)
+
+    def enqueue(self, urls: List[str]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, total, created_at, finished_at) VALUES (?, ?, ?, ?)',
+                (job_id, len(urls), _now(), None if urls else _now()),
+            )
+            conn.executemany(
+                'INSERT INTO job_tasks (job_id, position, url, due_at) VALUES (?, ?, ?, 0)',
+                [(job_id, position, url) for position, url in enumerate(urls)],
+            )
+        self._wakeup.set()
+        return job_id
+
+    def claim(self, limit: int, wait: float = 0) -> List[Task]:
+        deadline = time.monotonic() + wait
+        while True:
+            tasks = self._claim_due(limit)
+            remaining = deadline - time.monotonic()
+            if tasks or remaining <= 0:
+                return tasks
+            # Other processes enqueue without signalling us, so poll at least once a second
+            self._wakeup.wait(min(remaining, 1.0))
+            self._wakeup.clear()
+
+    def _claim_due(self, limit):
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT job_id, position, url, attempts FROM job_tasks WHERE due_at <= ? ORDER BY due_at LIMIT ?',
+                (now, limit),
+            ).fetchall()
+            if not rows:
+                return []
+            conn.executemany(
+                'UPDATE job_tasks SET attempts = attempts + 1, due_at = ? WHERE job_id = ? AND position = ?',
+                [(now + self.lease_seconds, job_id, position) for job_id, position, _, _ in rows],
+            )
+            conn.executemany(
+                'UPDATE jobs SET started = 1 WHERE id = ?',
+                [(job_id,) for job_id in {row[0] for row in rows}],
+            )
+        return [Task(job_id, position, url, attempts + 1) for job_id, position, url, attempts in rows]
+
+    def retry(self, task: Task, delay: float) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE job_tasks SET due_at = ? WHERE job_id = ? AND position = ?',
+                (time.time() + delay, task.job_id, task.position),
+            )
+
+    def complete(self, task: Task, result: dict) -> None:
+        with self._connect() as conn:
+            deleted = conn.execute(
+                'DELETE FROM job_tasks WHERE job_id = ? AND position = ?',
+                (task.job_id, task.position),
+            ).rowcount
+            if not deleted:
+                # Another worker picked the task up after our lease ran out and already finished it
+                return
+            conn.execute(
+                'INSERT INTO job_results (job_id, position, result) VALUES (?, ?, ?)',
+                (task.job_id, task.position, json.dumps(result)),
+            )
+            conn.execute(
+                '''UPDATE jobs SET completed = completed + 1, failed = failed + ?,
+                       finished_at = CASE WHEN completed + 1 >= total THEN ? ELSE finished_at END
+                   WHERE id = ?''',
+                (0 if result.get('success', True) else 1, _now(), task.job_id),
+            )
+
+    def status(self, job_id: str) -> Optional[dict]:
+        with self._connect(write=False) as conn:
+            row = conn.execute(
+                'SELECT total, completed, failed, started, created_at, finished_at FROM jobs WHERE id = ?',
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        total, completed, failed, started, created_at, finished_at = row
+        return _job_status(job_id, total, completed, failed, bool(started), created_at, finished_at)
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 50) -> List[dict]:
+        with self._connect(write=False) as conn:
+            rows = conn.execute(
+                'SELECT result FROM job_results WHERE job_id = ? ORDER BY id LIMIT ? OFFSET ?',
+                (job_id, limit, offset),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+class _Transaction:
+    """Runs a block of statements in one immediate transaction and closes the connection."""
+
+    def __init__(self, conn, write):
+        self._conn = conn
+        self._write = write
+
+    def __enter__(self):
+        # IMMEDIATE takes the write lock up front, so two workers never claim the same task
+        self._conn.execute('BEGIN IMMEDIATE' if self._write else 'BEGIN')
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self._conn.close()
+
+def create_job_queue(url: str = None):
+    """Create the queue named by url or JOB_QUEUE: 'memory' (default) or 'sqlite:///path/to/jobs.db'."""
+    url = url or os.getenv(JOB_QUEUE_ENV_VAR, 'memory')
+    if url == 'memory':
+        return MemoryJobQueue()
+    if url.startswith('sqlite:///'):
+        return SQLiteJobQueue(url[len('sqlite:///'):])
+    raise ValueError(f'Unsupported job queue: {url}')
+
+class JobWorker:
+    """Background thread that pulls tasks from a job queue and analyzes them in batches.
+
+    analyze(urls) is a coroutine function returning, in input order, each page's
+    issues or the exception raised for it. Failures for which retryable(error)
+    is true are retried with exponential backoff up to max_attempts; every final
+    outcome is passed to record(url, outcome), whose result dict is stored on the job.
+    """
+
+    def __init__(self, queue, analyze: Callable, record: Callable,
+                 batch_size: int = 20, max_attempts: int = 3, backoff: float = 2.0,
+                 retryable: Callable = lambda error: True, poll_interval: float = 5.0):
+        self.queue = queue
+        self.analyze = analyze
+        self.record = record
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.retryable = retryable
+        self.poll_interval = poll_interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='job-worker', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Stop after the current batch; unfinished tasks stay queued."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            tasks = self.queue.claim(self.batch_size, wait=self.poll_interval)
+            if tasks:
+                self.process(tasks)
+
+    def process(self, tasks: List[Task]) -> None:
+        """Analyze one batch of claimed tasks and store or reschedule each of them."""
+        try:
+            outcomes = asyncio.run(self.analyze([task.url for task in tasks]))
+        except Exception as e:
+            logger.exception('Job batch failed')
+            outcomes = [e] * len(tasks)
+
+        for task, outcome in zip(tasks, outcomes):
+            if isinstance(outcome, Exception) and task.attempts < self.max_attempts and self.retryable(outcome):
+                self.queue.retry(task, self.backoff * 2 ** (task.attempts - 1))
+                continue
+            try:
+                result = self.record(task.url, outcome)
+            except Exception as e:
+                logger.exception('Recording result for %s failed', task.url)
+                result = {'url': task.url, 'error': str(e), 'success': False}
+            self.queue.complete(task, result)
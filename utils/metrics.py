@@ -0,0 +1,156 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+from .custom_rules import RULE_TIMING_PREFIX
+
+# Upper bounds, in seconds, of the duration histogram buckets
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic count per label combination."""
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name + _format_labels(self.labels, key), value
+
+class Histogram:
+    """Distribution of observed values per label combination, in cumulative buckets."""
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label combination: [per-bucket counts (last one is +Inf), sum, count]
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, '') for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds spent in the with block, even when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, key, [('le', _format_number(bound))])
+                yield f'{self.name}_bucket{labels}', cumulative
+            yield f'{self.name}_sum{_format_labels(self.labels, key)}', total
+            yield f'{self.name}_count{_format_labels(self.labels, key)}', count
+
+class MetricsRegistry:
+    """The process's metrics, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DURATION_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} is already registered')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {_escape(metric.help)}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for sample, value in metric.samples():
+                lines.append(f'{sample} {_format_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+FETCH_SECONDS = REGISTRY.histogram(
+    'a11y_fetch_seconds', 'Time spent downloading pages.', ('client',))
+FETCHES = REGISTRY.counter(
+    'a11y_fetches_total', 'Page downloads by outcome.', ('client', 'outcome'))
+PARSE_SECONDS = REGISTRY.histogram(
+    'a11y_parse_seconds', 'Time spent parsing pages into a document tree.')
+ANALYZER_SECONDS = REGISTRY.histogram(
+    'a11y_analyzer_seconds', 'Time spent in each analyzer, including its checks.', ('analyzer',))
+CHECK_SECONDS = REGISTRY.histogram(
+    'a11y_check_seconds', 'Time spent in each built-in check, when per-check timing is on.', ('check',))
+CUSTOM_RULE_SECONDS = REGISTRY.histogram(
+    'a11y_custom_rule_seconds', 'Time spent evaluating each custom rule, when per-check timing is on.', ('rule',))
+ANALYSES = REGISTRY.counter(
+    'a11y_analyses_total', 'Pages analyzed, by where the result came from.', ('source',))
+HISTORY_WRITE_SECONDS = REGISTRY.histogram(
+    'a11y_history_write_seconds', 'Time spent writing a batch of history rows.')
+HISTORY_ROWS = REGISTRY.counter(
+    'a11y_history_rows_total', 'History rows handed to the database, by outcome.', ('outcome',))
+CRAWL_PAGES = REGISTRY.counter(
+    'a11y_crawl_urls_total', 'URLs visited by crawls, by final state.', ('state',))
+
+def record_analysis_timings(timings: Dict[str, float], checks: Dict[str, float] = None) -> None:
+    """Add the timings of one analysis, as filled in by analyze_page, to the metrics."""
+    if 'parse' in timings:
+        PARSE_SECONDS.observe(timings['parse'])
+    for analyzer in ('accessibility', 'colors'):
+        if analyzer in timings:
+            ANALYZER_SECONDS.observe(timings[analyzer], analyzer=analyzer)
+    for label, seconds in (checks or {}).items():
+        if label.startswith(RULE_TIMING_PREFIX):
+            CUSTOM_RULE_SECONDS.observe(seconds, rule=label[len(RULE_TIMING_PREFIX):])
+        else:
+            CHECK_SECONDS.observe(seconds, check=label)
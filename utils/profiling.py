@@ -0,0 +1,92 @@
+import cProfile
+import hashlib
+import marshal
+import os
+import random
+import re
+import threading
+from typing import Optional
+
+_PROFILE_NAME = re.compile(r'^(\d+)ms-[0-9a-f]{12}\.prof$')
+
+def profile_call(func, *args):
+    """Run func(*args) under cProfile and return (its result, marshalled stats).
+
+    The stats are in the format pstats.Stats() loads from a file, so they can be
+    sent back from a worker process and written out as they are. They are None
+    when another profiler is already running, which from Python 3.12 includes
+    one in another thread of the same process.
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return func(*args), None
+    try:
+        result = func(*args)
+    finally:
+        profiler.disable()
+    profiler.create_stats()
+    return result, marshal.dumps(profiler.stats)
+
+class SlowestProfiles:
+    """Keeps cProfile dumps of the slowest analyses in a directory.
+
+    Only a sample_rate fraction of analyses is profiled, since profiling slows
+    an analysis down. Of those, the keep slowest are written to directory as
+    '<milliseconds>ms-<url hash>.prof'; faster ones are discarded, and files
+    beyond keep are removed, including ones left by earlier runs. Load a dump
+    with pstats.Stats(path).
+    """
+
+    def __init__(self, directory: str, keep: int = 10, sample_rate: float = 0.1):
+        self.directory = directory
+        self.keep = keep
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._profiles = []
+        for name in os.listdir(directory):
+            match = _PROFILE_NAME.match(name)
+            if match:
+                self._profiles.append((int(match.group(1)), name))
+        self._profiles.sort()
+        self._trim()
+
+    @classmethod
+    def from_env(cls) -> Optional['SlowestProfiles']:
+        """Profiler configured by A11Y_PROFILE_DIR, or None when profiling is off."""
+        directory = os.getenv('A11Y_PROFILE_DIR')
+        if not directory:
+            return None
+        return cls(
+            directory,
+            keep=int(os.getenv('A11Y_PROFILE_SLOWEST', 10)),
+            sample_rate=float(os.getenv('A11Y_PROFILE_SAMPLE_RATE', 0.1)),
+        )
+
+    def should_profile(self) -> bool:
+        return random.random() < self.sample_rate
+
+    def offer(self, seconds: float, url: str, stats: bytes) -> bool:
+        """Keep the stats of an analysis if it is among the slowest; returns whether it was kept."""
+        milliseconds = int(seconds * 1000)
+        with self._lock:
+            if len(self._profiles) >= self.keep and milliseconds <= self._profiles[0][0]:
+                return False
+            name = f'{milliseconds}ms-{hashlib.sha256(url.encode("utf-8")).hexdigest()[:12]}.prof'
+            with open(os.path.join(self.directory, name), 'wb') as f:
+                f.write(stats)
+            self._profiles = [entry for entry in self._profiles if entry[1] != name]
+            self._profiles.append((milliseconds, name))
+            self._profiles.sort()
+            self._trim()
+        return True
+
+    def _trim(self):
+        while len(self._profiles) > self.keep:
+            _, name = self._profiles.pop(0)
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+@dataclass(frozen=True)
+class Validators:
+    """HTTP cache validators from the last successful fetch of a URL."""
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: str
+    # Whether the page was checked in streaming mode, whose result is kept apart
+    streamed: bool = False
+    # (href, absolute URL) of the linked stylesheets, whose hashes are part of the result key
+    stylesheet_links: tuple = ()
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+def result_key(page_hash: str, stylesheets: dict = None) -> str:
+    """Key of a page's result: its content hash, combined with the stylesheet_key of each linked sheet.
+
+    stylesheets maps hrefs to (stylesheet_key, text), as downloaded for the page.
+    """
+    if not stylesheets:
+        return page_hash
+    digest = hashlib.sha256(page_hash.encode())
+    for href, (key, _) in sorted(stylesheets.items()):
+        digest.update(f'\n{href}\n{key}'.encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+def _estimate_size(result) -> int:
+    size = 0
+    for issues in result:
+        for issue in issues:
+            size += 64 + sum(len(value) for value in issue.values() if isinstance(value, str))
+    return size
+
+class ResultCache:
+    """LRU cache of issue lists keyed by result_key and rule set version.
+
+    Results of streaming mode skip some checks, so they are kept under their
+    own keys and never returned for a full analysis of the same content.
+
+    Eviction keeps both the number of entries and their estimated size in bytes
+    under the configured limits. The cache also remembers ETag/Last-Modified per
+    URL so an unchanged page can be revalidated with a conditional request.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._results = OrderedDict()
+        self._validators = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'ResultCache':
+        return cls(
+            max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 1000)),
+            max_bytes=int(os.getenv('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+        )
+
+    def get(self, page_hash: str, rule_version: int, streamed: bool = False) -> Optional[Tuple[list, list]]:
+        """Return the cached (accessibility, colors) issues for a page, or None."""
+        key = (page_hash, rule_version, streamed)
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                return None
+            self._results.move_to_end(key)
+            return entry[0]
+
+    def put(self, page_hash: str, rule_version: int, result: Tuple[list, list], streamed: bool = False) -> None:
+        """Store the issues for a page, evicting least recently used entries as needed."""
+        key = (page_hash, rule_version, streamed)
+        size = _estimate_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._results.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._results[key] = (result, size)
+            self._size += size
+            while len(self._results) > self.max_entries or self._size > self.max_bytes:
+                _, (_, evicted_size) = self._results.popitem(last=False)
+                self._size -= evicted_size
+
+    def validators(self, url: str) -> Optional[Validators]:
+        """Return the validators remembered for a URL, or None."""
+        with self._lock:
+            validators = self._validators.get(url)
+            if validators is not None:
+                self._validators.move_to_end(url)
+            return validators
+
+    def remember_validators(self, url: str, validators: Validators) -> None:
+        with self._lock:
+            self._validators[url] = validators
+            self._validators.move_to_end(url)
+            while len(self._validators) > self.max_entries:
+                self._validators.popitem(last=False)
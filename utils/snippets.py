@@ -0,0 +1,110 @@
+import os
+from typing import Tuple
+
+# Default byte budgets for the element markup embedded in issue messages
+SNIPPET_MAX_BYTES = 300
+REPORT_SNIPPET_MAX_BYTES = 64 * 1024
+ELLIPSIS = '…'
+
+def opening_tag(element, formatter=None) -> str:
+    """The element's start tag, rendered the way str(element) renders it."""
+    formatter = formatter or element.formatter_for_name('minimal')
+    parts = ['<', element.prefix + ':' if element.prefix else '', element.name]
+    for key, value in formatter.attributes(element):
+        if value is None:
+            parts.append(' ' + key)
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ' '.join(value)
+        elif hasattr(value, 'substitute_encoding'):
+            # <meta charset>, which str(element) renders for UTF-8
+            value = value.substitute_encoding('utf-8')
+        parts.append(f' {key}={formatter.quoted_attribute_value(formatter.attribute_value(str(value)))}')
+    if element.is_empty_element:
+        parts.append(formatter.void_element_close_prefix or '')
+    parts.append('>')
+    return ''.join(parts)
+
+def _closing_tag(element) -> str:
+    return f'</{element.prefix + ":" if element.prefix else ""}{element.name}>'
+
+def _markup_pieces(element, formatter):
+    """Pieces of the element's markup in document order, produced as they are needed."""
+    yield opening_tag(element, formatter)
+    if element.is_empty_element:
+        return
+    open_tags = [element]
+    for node in element.descendants:
+        # Identity, not ==, which compares whole subtrees
+        while node.parent is not open_tags[-1]:
+            yield _closing_tag(open_tags.pop())
+        if node.name is None:
+            yield node.output_ready(formatter)
+        else:
+            yield opening_tag(node, formatter)
+            if not node.is_empty_element:
+                open_tags.append(node)
+    while open_tags:
+        yield _closing_tag(open_tags.pop())
+
+def _clip(pieces, limit) -> Tuple[str, int, bool]:
+    """Join pieces up to limit UTF-8 bytes; returns (text, bytes used, whether it was cut)."""
+    kept = []
+    remaining = limit
+    for piece in pieces:
+        # A piece cut to remaining + 1 characters is at least remaining + 1 bytes,
+        # so a huge text node is never encoded in full
+        encoded = piece[:remaining + 1].encode('utf-8')
+        if len(encoded) <= remaining:
+            kept.append(piece)
+            remaining -= len(encoded)
+            continue
+        kept.append(encoded[:remaining].decode('utf-8', 'ignore'))
+        return ''.join(kept), limit, True
+    return ''.join(kept), limit - remaining, False
+
+def outer_html(element, limit: int, ellipsis: str = ELLIPSIS) -> str:
+    """The element's markup as str(element) renders it, cut after limit UTF-8 bytes.
+
+    The subtree is serialized lazily and serialization stops at the limit, so
+    the cost depends on limit rather than on the size of the subtree.
+    """
+    text, _, truncated = _clip(_markup_pieces(element, element.formatter_for_name('minimal')), limit)
+    return text + ellipsis if truncated else text
+
+class SnippetBudget:
+    """Renders the element markup embedded in the issues of one report.
+
+    Each snippet is the element's outer HTML, starting with its opening tag, cut
+    after max_issue_bytes with an ellipsis. All snippets of the report share
+    max_report_bytes; once that is spent, snippets shrink to the bare tag name
+    such as '<input…>', and the issue's selector path still locates the element.
+    """
+
+    def __init__(self, max_issue_bytes: int = SNIPPET_MAX_BYTES, max_report_bytes: int = REPORT_SNIPPET_MAX_BYTES):
+        self.max_issue_bytes = max_issue_bytes
+        self.remaining = max_report_bytes
+
+    @classmethod
+    def from_env(cls) -> 'SnippetBudget':
+        """Budget configured by SNIPPET_MAX_BYTES and REPORT_SNIPPET_MAX_BYTES."""
+        return cls(
+            max_issue_bytes=int(os.getenv('SNIPPET_MAX_BYTES', SNIPPET_MAX_BYTES)),
+            max_report_bytes=int(os.getenv('REPORT_SNIPPET_MAX_BYTES', REPORT_SNIPPET_MAX_BYTES)),
+        )
+
+    def render(self, element) -> str:
+        """Snippet of a parsed element."""
+        return self._take(element.name, lambda: _markup_pieces(element, element.formatter_for_name('minimal')))
+
+    def clip(self, markup: str, name: str) -> str:
+        """Snippet of markup that is already a string, such as a start tag from the streaming parser."""
+        return self._take(name, lambda: (markup,))
+
+    def _take(self, name, pieces) -> str:
+        limit = min(self.max_issue_bytes, self.remaining)
+        if limit <= 0:
+            return f'<{name}{ELLIPSIS}>'
+        text, used, truncated = _clip(pieces(), limit)
+        self.remaining -= used
+        return text + ELLIPSIS if truncated else text
@@ -0,0 +1,332 @@
+import codecs
+import re
+from html.parser import HTMLParser as _EventParser
+from .color_validator import FDS_COLORS, contrast_ratio, style_color, is_large_text_style
+from .issues import Issue
+from .snippets import SnippetBudget
+
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'param', 'source', 'track', 'wbr',
+}
+INTERACTIVE_TAGS = {'button', 'a', 'input', 'select', 'textarea'}
+TEXT_TAGS = {'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'span', 'a'}
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+LANDMARKS = {
+    'header': 'banner',
+    'nav': 'navigation',
+    'footer': 'contentinfo'
+}
+
+class StreamingAnalyzer(_EventParser):
+    """Analyzes HTML from start/end tag events as chunks arrive, without building a tree.
+
+    Only a stack of open elements (capped at max_depth) and a few document-level
+    facts such as the last heading level and the landmarks seen are kept, so memory
+    does not grow with the size of the page. Form labels are resolved against a
+    capped set of label targets; once it is full, inputs that rely on a later
+    <label for> are not reported.
+
+    Covers images, forms, ARIA, keyboard, focus, skip links, language, headings,
+    landmarks and the color checks. Tables, lists, multimedia and custom rules
+    need the full tree and are only run by AccessibilityChecker.
+    """
+
+    def __init__(self, max_depth: int = 512, max_tracked_labels: int = 10000):
+        super().__init__(convert_charrefs=True)
+        self.max_depth = max_depth
+        self.max_tracked_labels = max_tracked_labels
+        self._stack = []
+        self._overflow = 0
+        self._decoder = None
+        self._snippets = SnippetBudget.from_env()
+
+        # Per-check issue lists, concatenated in the same order as the tree-based analyzers
+        self._images = []
+        self._headings = []
+        self._forms = []
+        self._aria = []
+        self._tabindex = []
+        self._handlers = []
+        self._focus = []
+        self._inline_styles = []
+        self._buttons = []
+        self._contrast = []
+
+        self._prev_heading = 0
+        self._html_seen = False
+        self._has_lang = False
+        self._has_skip_link = False
+        self._landmark_tags = set()
+        self._landmark_roles = set()
+        self._has_neutral_background = False
+        self._label_targets = set()
+        self._pending_inputs = {}
+        self._pending_count = 0
+        self._links = []
+
+    def feed_bytes(self, chunk: bytes, encoding: str = None) -> None:
+        """Feed raw response bytes, decoding incrementally so multi-byte characters may span chunks."""
+        if self._decoder is None:
+            self._decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+        self.feed(self._decoder.decode(chunk))
+
+    def results(self):
+        """Finish parsing and return (accessibility issues, color issues)."""
+        if self._decoder is not None:
+            self.feed(self._decoder.decode(b'', final=True))
+        self.close()
+
+        # Inputs still waiting for a <label for> never got one
+        forms = [
+            issue if isinstance(issue, dict) else self._missing_label(issue[1])
+            for issue in self._forms if issue is not None
+        ]
+
+        a11y_issues = (self._images + self._headings + forms + self._aria
+                       + self._tabindex + self._handlers + self._focus)
+        if not self._has_skip_link:
+            a11y_issues.append({
+                'type': 'warning',
+                'category': 'Navigation',
+                'message': 'No skip links found at the beginning of the page',
+                'recommendation': 'Add skip links to bypass repetitive navigation'
+            })
+        if not self._has_lang:
+            a11y_issues.append({
+                'type': 'error',
+                'category': 'Language',
+                'message': 'HTML lang attribute missing',
+                'recommendation': 'Add a valid lang attribute to the HTML element'
+            })
+        if 'main' not in self._landmark_tags and 'main' not in self._landmark_roles:
+            a11y_issues.append({
+                'type': 'error',
+                'category': 'Document Structure',
+                'message': 'No main landmark found',
+                'recommendation': 'Add a <main> element or role="main" to identify the main content'
+            })
+        for tag, role in LANDMARKS.items():
+            if tag not in self._landmark_tags and role not in self._landmark_roles:
+                a11y_issues.append({
+                    'type': 'warning',
+                    'category': 'Document Structure',
+                    'message': f'No {tag} landmark found',
+                    'recommendation': f'Add a <{tag}> element or role="{role}" for better document structure'
+                })
+
+        color_issues = list(self._inline_styles)
+        if not self._has_neutral_background:
+            color_issues.append({
+                'type': 'warning',
+                'category': 'Background',
+                'message': 'Page might not meet 50% neutral background requirement',
+                'recommendation': 'Ensure sufficient use of neutral background'
+            })
+        color_issues += self._buttons + self._contrast
+        return a11y_issues, color_issues
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: value if value is not None else '' for name, value in attrs}
+        tag_text = self.get_starttag_text()
+        parent = self._stack[-1] if self._stack else None
+        background = style_color(attrs.get('style', ''), 'background-color') or (parent['background'] if parent else None)
+
+        self._check_element(tag, attrs, tag_text, parent)
+        self._check_colors(tag, attrs, background)
+
+        if tag in VOID_TAGS:
+            return
+        if len(self._stack) >= self.max_depth:
+            self._overflow += 1
+            return
+        self._stack.append({
+            'tag': tag,
+            'background': background,
+            'label_for': attrs.get('for') if tag == 'label' else None,
+            'in_label': tag == 'label' or (parent['in_label'] if parent else False),
+        })
+        if tag == 'a':
+            self._links.append([0, False])
+
+    def handle_endtag(self, tag):
+        if self._overflow:
+            self._overflow -= 1
+            return
+        # Close implicitly ended elements, but ignore stray end tags
+        for depth in range(len(self._stack) - 1, -1, -1):
+            if self._stack[depth]['tag'] == tag:
+                for entry in self._stack[depth:]:
+                    self._close(entry)
+                del self._stack[depth:]
+                return
+
+    def handle_data(self, data):
+        # Only whether the innermost open link mentions "skip" is needed, not its text
+        if self._links:
+            link = self._links[-1]
+            if not link[1] and link[0] < 1024:
+                link[0] += len(data)
+                link[1] = 'skip' in data.lower()
+
+    def _close(self, entry):
+        if entry['tag'] == 'a' and self._links:
+            if self._links.pop()[1]:
+                self._has_skip_link = True
+
+    def _check_element(self, tag, attrs, tag_text, parent):
+        if tag == 'html' and not self._html_seen:
+            self._html_seen = True
+            self._has_lang = bool(attrs.get('lang'))
+
+        if tag == 'img' and not attrs.get('alt'):
+            self._images.append(Issue(
+                'error',
+                'Images',
+                'Image missing alt text: {element}',
+                'Add descriptive alt text to the image',
+                self._snippets.clip(tag_text, tag)
+            ))
+
+        if tag in HEADING_TAGS:
+            level = int(tag[1])
+            if level - self._prev_heading > 1:
+                self._headings.append({
+                    'type': 'warning',
+                    'category': 'Headings',
+                    'message': f'Heading level skipped from h{self._prev_heading} to h{level}',
+                    'recommendation': 'Maintain proper heading hierarchy'
+                })
+            self._prev_heading = level
+
+        if tag == 'label' and attrs.get('for') is not None:
+            if len(self._label_targets) < self.max_tracked_labels:
+                self._label_targets.add(attrs['for'])
+            # Resolve inputs that were waiting for this label
+            for position in self._pending_inputs.pop(attrs['for'], ()):
+                self._forms[position] = None
+                self._pending_count -= 1
+
+        if tag == 'input' and attrs.get('type') not in ['submit', 'button', 'hidden']:
+            self._check_input(attrs, tag_text, parent)
+
+        if any(name.startswith('aria-') for name in attrs) and 'role' not in attrs:
+            self._aria.append(Issue(
+                'warning',
+                'ARIA',
+                'Element with ARIA attributes missing role: {element}',
+                'Add appropriate role attribute',
+                self._snippets.clip(tag_text, tag)
+            ))
+
+        if 'tabindex' in attrs:
+            try:
+                if int(attrs['tabindex']) > 0:
+                    self._tabindex.append(Issue(
+                        'warning',
+                        'Keyboard Navigation',
+                        'Positive tabindex value found: {element}',
+                        'Avoid using positive tabindex values as they disrupt natural tab order',
+                        self._snippets.clip(tag_text, tag)
+                    ))
+            except ValueError:
+                pass
+
+        if tag in INTERACTIVE_TAGS:
+            if attrs.get('onclick') and not attrs.get('onkeypress'):
+                self._handlers.append(Issue(
+                    'error',
+                    'Keyboard Navigation',
+                    'Element with onclick but no keyboard event handler: {element}',
+                    'Ensure all interactive elements are keyboard accessible',
+                    self._snippets.clip(tag_text, tag)
+                ))
+            style = attrs.get('style')
+            if style and ('outline: none' in style or 'outline:none' in style):
+                self._focus.append({
+                    'type': 'error',
+                    'category': 'Focus Management',
+                    'message': 'Focus outline removed from interactive element',
+                    'recommendation': 'Maintain visible focus indicators for keyboard navigation'
+                })
+
+        if tag == 'a' and attrs.get('href') == '#main-content':
+            self._has_skip_link = True
+
+        if tag == 'main' or tag in LANDMARKS:
+            self._landmark_tags.add(tag)
+        if 'role' in attrs:
+            self._landmark_roles.add(attrs['role'])
+
+    def _check_input(self, attrs, tag_text, parent):
+        # A wrapping label or an aria-labelledby reference is enough without a lookup
+        if parent and parent['in_label'] and self._innermost_label_for() is None:
+            return
+        if attrs.get('aria-labelledby'):
+            return
+        input_id = attrs.get('id')
+        if input_id is None:
+            self._forms.append(self._missing_label(tag_text))
+            return
+        if input_id in self._label_targets:
+            return
+        if len(self._label_targets) >= self.max_tracked_labels or self._pending_count >= self.max_tracked_labels:
+            # Too much to track; the label may be elsewhere on the page
+            return
+        # The <label for> may still follow; keep the slot so issue order is preserved
+        self._pending_inputs.setdefault(input_id, []).append(len(self._forms))
+        self._forms.append((input_id, tag_text))
+        self._pending_count += 1
+
+    def _missing_label(self, tag_text):
+        return Issue(
+            'error',
+            'Forms',
+            'Input missing label: {element}',
+            'Add proper label for the input field',
+            self._snippets.clip(tag_text, 'input')
+        )
+
+    def _innermost_label_for(self):
+        for entry in reversed(self._stack):
+            if entry['tag'] == 'label':
+                return entry['label_for']
+        return None
+
+    def _check_colors(self, tag, attrs, background):
+        style = attrs.get('style', '')
+        if style and ('color' in style or 'background' in style):
+            for color in re.findall(r'#[0-9a-fA-F]{6}', style):
+                if color not in FDS_COLORS['green'] and color != FDS_COLORS['neutral']:
+                    self._inline_styles.append(Issue(
+                        'error', 'Colors', 'Non-compliant color used: {value}', 'Use FDS approved colors',
+                        value=color,
+                    ))
+
+        classes = attrs.get('class', '').split()
+        if any('bg-neutral' in cls for cls in classes):
+            self._has_neutral_background = True
+        if tag in ('button', 'a') and 'class' in attrs and not any('btn-' in cls for cls in classes):
+            self._buttons.append({
+                'type': 'warning',
+                'category': 'Buttons',
+                'message': 'Button missing FDS styling',
+                'recommendation': 'Apply FDS button classes'
+            })
+
+        if tag in TEXT_TAGS:
+            text_color = style_color(style, 'color') or '#000000'
+            ratio = contrast_ratio(text_color, background or '#FFFFFF')
+            is_large_text = is_large_text_style(style)
+            required_ratio = 3.0 if is_large_text else 4.5
+            if ratio < required_ratio:
+                self._contrast.append(Issue(
+                    'error', 'Color Contrast', 'Insufficient contrast ratio ({value}:1) for text element',
+                    f'Increase contrast ratio to at least {required_ratio}:1 for {is_large_text and "large" or "normal"} text',
+                    value=f'{ratio:.2f}',
+                ))
@@ -0,0 +1,1128 @@
+"""Author stylesheets and the computed styles that the color checks read.
+
+Stylesheets (<style> blocks and linked sheets) are parsed once per distinct
+content: a StylesheetCache keeps the parsed form by content hash, so a site's
+shared stylesheet is parsed on the first page a process sees and reused on
+the rest. Parsing keeps only the rules that set color, background-color,
+font-size or font-weight (or the background and font shorthands, or custom
+properties), and files each selector under the most specific key of its
+rightmost compound: its id, else one of its classes, else its tag name. An
+element is then tested only against the selectors that can match it.
+
+ComputedStyles resolves each element's cascade and inherits from its
+parent's computed style during the TreeWalker pass, so a page is resolved
+top down in one pass at a cost close to linear in its size.
+
+Media queries are evaluated for a desktop screen of VIEWPORT size. Rules for
+dynamic states such as :hover, and for pseudo-elements such as ::before, are
+left out: they do not style the element's own text at rest. @import is not
+followed.
+"""
+import asyncio
+import colorsys
+import hashlib
+import html
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+# Width and height media features are evaluated against this viewport, in CSS pixels
+VIEWPORT = (1280, 800)
+DEFAULT_FONT_SIZE = 16.0
+# Default limits for downloading linked stylesheets
+STYLESHEET_MAX_BYTES = 1024 * 1024
+STYLESHEET_MAX_LINKS = 20
+
+# Declarations a computed style is built from; the rest are dropped when a sheet is parsed
+LONGHANDS = frozenset({'color', 'background-color', 'font-size', 'font-weight'})
+SHORTHANDS = {'background': ('background-color',), 'font': ('font-size', 'font-weight')}
+CSS_WIDE_KEYWORDS = frozenset({'inherit', 'initial', 'unset', 'revert', 'revert-layer'})
+
+# Pseudo-classes for states other than at rest, and legacy single-colon pseudo-elements;
+# selectors using them are left out
+DYNAMIC_PSEUDO_CLASSES = frozenset({
+    'hover', 'active', 'focus', 'focus-visible', 'focus-within', 'visited', 'target', 'target-within',
+    'current', 'past', 'future', 'playing', 'paused', 'user-invalid', 'user-valid', 'autofill',
+    'open', 'popover-open', 'modal', 'fullscreen', 'picture-in-picture', 'placeholder-shown',
+})
+LEGACY_PSEUDO_ELEMENTS = frozenset({'before', 'after', 'first-line', 'first-letter'})
+# Pseudo-classes matched here; any other sends the selector to soupsieve
+SIMPLE_PSEUDO_CLASSES = frozenset({'root', 'link', 'any-link'})
+
+# The parts of the browser's default stylesheet that change text color, background or size
+USER_AGENT_CSS = '''
+h1 { font-size: 2em; font-weight: bold }
+h2 { font-size: 1.5em; font-weight: bold }
+h3 { font-size: 1.17em; font-weight: bold }
+h4 { font-weight: bold }
+h5 { font-size: 0.83em; font-weight: bold }
+h6 { font-size: 0.67em; font-weight: bold }
+b, strong, th { font-weight: bold }
+small, sub, sup { font-size: smaller }
+big { font-size: larger }
+a:link { color: #0000ee }
+mark { background-color: yellow; color: black }
+'''
+
+NAMED_COLORS = dict(entry.split(':') for entry in '''
+aliceblue:f0f8ff antiquewhite:faebd7 aqua:00ffff aquamarine:7fffd4 azure:f0ffff beige:f5f5dc bisque:ffe4c4
+black:000000 blanchedalmond:ffebcd blue:0000ff blueviolet:8a2be2 brown:a52a2a burlywood:deb887
+cadetblue:5f9ea0 chartreuse:7fff00 chocolate:d2691e coral:ff7f50 cornflowerblue:6495ed cornsilk:fff8dc
+crimson:dc143c cyan:00ffff darkblue:00008b darkcyan:008b8b darkgoldenrod:b8860b darkgray:a9a9a9
+darkgreen:006400 darkgrey:a9a9a9 darkkhaki:bdb76b darkmagenta:8b008b darkolivegreen:556b2f
+darkorange:ff8c00 darkorchid:9932cc darkred:8b0000 darksalmon:e9967a darkseagreen:8fbc8f
+darkslateblue:483d8b darkslategray:2f4f4f darkslategrey:2f4f4f darkturquoise:00ced1 darkviolet:9400d3
+deeppink:ff1493 deepskyblue:00bfff dimgray:696969 dimgrey:696969 dodgerblue:1e90ff firebrick:b22222
+floralwhite:fffaf0 forestgreen:228b22 fuchsia:ff00ff gainsboro:dcdcdc ghostwhite:f8f8ff gold:ffd700
+goldenrod:daa520 gray:808080 green:008000 greenyellow:adff2f grey:808080 honeydew:f0fff0 hotpink:ff69b4
+indianred:cd5c5c indigo:4b0082 ivory:fffff0 khaki:f0e68c lavender:e6e6fa lavenderblush:fff0f5
+lawngreen:7cfc00 lemonchiffon:fffacd lightblue:add8e6 lightcoral:f08080 lightcyan:e0ffff
+lightgoldenrodyellow:fafad2 lightgray:d3d3d3 lightgreen:90ee90 lightgrey:d3d3d3 lightpink:ffb6c1
+lightsalmon:ffa07a lightseagreen:20b2aa lightskyblue:87cefa lightslategray:778899 lightslategrey:778899
+lightsteelblue:b0c4de lightyellow:ffffe0 lime:00ff00 limegreen:32cd32 linen:faf0e6 magenta:ff00ff
+maroon:800000 mediumaquamarine:66cdaa mediumblue:0000cd mediumorchid:ba55d3 mediumpurple:9370db
+mediumseagreen:3cb371 mediumslateblue:7b68ee mediumspringgreen:00fa9a mediumturquoise:48d1cc
+mediumvioletred:c71585 midnightblue:191970 mintcream:f5fffa mistyrose:ffe4e1 moccasin:ffe4b5
+navajowhite:ffdead navy:000080 oldlace:fdf5e6 olive:808000 olivedrab:6b8e23 orange:ffa500
+orangered:ff4500 orchid:da70d6 palegoldenrod:eee8aa palegreen:98fb98 paleturquoise:afeeee
+palevioletred:db7093 papayawhip:ffefd5 peachpuff:ffdab9 peru:cd853f pink:ffc0cb plum:dda0dd
+powderblue:b0e0e6 purple:800080 rebeccapurple:663399 red:ff0000 rosybrown:bc8f8f royalblue:4169e1
+saddlebrown:8b4513 salmon:fa8072 sandybrown:f4a460 seagreen:2e8b57 seashell:fff5ee sienna:a0522d
+silver:c0c0c0 skyblue:87ceeb slateblue:6a5acd slategray:708090 slategrey:708090 snow:fffafa
+springgreen:00ff7f steelblue:4682b4 tan:d2b48c teal:008080 thistle:d8bfd8 tomato:ff6347
+turquoise:40e0d0 violet:ee82ee wheat:f5deb3 white:ffffff whitesmoke:f5f5f5 yellow:ffff00
+yellowgreen:9acd32
+'''.split())
+
+FONT_SIZE_KEYWORDS = {
+    'xx-small': 9.0, 'x-small': 10.0, 'small': 13.0, 'medium': 16.0, 'large': 18.0,
+    'x-large': 24.0, 'xx-large': 32.0, 'xxx-large': 48.0, 'initial': DEFAULT_FONT_SIZE,
+}
+# CSS pixels per unit
+ABSOLUTE_UNITS = {'px': 1.0, 'pt': 4 / 3, 'pc': 16.0, 'in': 96.0, 'cm': 96 / 2.54, 'mm': 96 / 25.4, 'q': 96 / 101.6}
+SYSTEM_FONTS = frozenset({'caption', 'icon', 'menu', 'message-box', 'small-caption', 'status-bar'})
+
+_COMMENT = re.compile(r'/\*.*?(?:\*/|$)', re.S)
+_BLOCK_SPECIAL = re.compile(r'["\';{}]')
+_AT_RULE = re.compile(r'@([\w-]+)\s*(.*)', re.S)
+_IMPORTANT = re.compile(r'!\s*important\s*$')
+_TOKENS = re.compile(r'(?:[^\s(]|\([^()]*(?:\([^()]*\)[^()]*)*\))+')
+_VAR = re.compile(r'var\(\s*(--[\w-]+)\s*(?:,([^()]*(?:\([^()]*\)[^()]*)*))?\)')
+_LENGTH = re.compile(r'([+-]?(?:\d+\.?\d*|\.\d+))([a-z%]*)$')
+_HEX_COLOR = re.compile(r'#([0-9a-f]+)$')
+_COLOR_FUNCTION = re.compile(r'(rgba?|hsla?)\((.*)\)$', re.S)
+_MEDIA_FEATURE = re.compile(r'\(([^()]*)\)')
+_MEDIA_RANGE = re.compile(r'([\w-]+)\s*([<>]=?|=)\s*(.+)')
+_IDENT = r'(?:[\w-]|\\[0-9a-fA-F]{1,6}\s?|\\[^\n0-9a-fA-F])+'
+_SELECTOR_TOKEN = re.compile(rf'''
+    \s*(?P<combinator>[>+~])\s*
+  | (?P<descendant>\s+)
+  | (?P<type>\*|[a-zA-Z][\w-]*)
+  | \#(?P<id>{_IDENT})
+  | \.(?P<cls>{_IDENT})
+  | \[\s*(?P<attr>[\w:-]+)\s*(?:(?P<op>[~|^$*]?=)\s*(?P<value>"[^"]*"|'[^']*'|[^\s\]]+)\s*(?P<flag>[is])?\s*)?\]
+  | (?P<pseudo>::?[\w-]+)(?P<args>\()?
+''', re.X)
+_ESCAPE = re.compile(r'\\([0-9a-fA-F]{1,6})\s?|\\(.)')
+_LINK_TAG = re.compile(rb'<(?:link|base)\b[^>]*>', re.I)
+_TAG_ATTRIBUTE = re.compile(r'''([^\s"'<>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?''')
+
+# Parsing
+
+def _split(text: str, separator: str) -> List[str]:
+    """Split text at separator where it is not inside parentheses, brackets or quotes."""
+    if '(' not in text and '[' not in text and '"' not in text and "'" not in text:
+        return text.split(separator)
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, char in enumerate(text):
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '([':
+            depth += 1
+        elif char in ')]':
+            depth = max(depth - 1, 0)
+        elif char == separator and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+def _blocks(text: str):
+    """(prelude, body) of every top-level rule; body is None for statements such as @import."""
+    position = start = 0
+    while True:
+        match = _BLOCK_SPECIAL.search(text, position)
+        if match is None:
+            return
+        char = match.group()
+        position = match.end()
+        if char in '"\'':
+            end = text.find(char, position)
+            position = len(text) if end < 0 else end + 1
+        elif char == ';':
+            yield text[start:match.start()].strip(), None
+            start = position
+        elif char == '}':
+            start = position
+        else:
+            end = _block_end(text, position)
+            yield text[start:match.start()].strip(), text[position:end]
+            position = start = end + 1
+
+def _block_end(text: str, position: int) -> int:
+    """Index of the brace closing the block whose body starts at position."""
+    depth = 1
+    while True:
+        match = _BLOCK_SPECIAL.search(text, position)
+        if match is None:
+            return len(text)
+        char = match.group()
+        position = match.end()
+        if char in '"\'':
+            end = text.find(char, position)
+            position = len(text) if end < 0 else end + 1
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return match.start()
+
+def _style_rules(text: str):
+    """(selector list, declaration block) of every style rule that applies, in source order."""
+    for prelude, body in _blocks(text):
+        if body is None or not prelude:
+            continue
+        if prelude.startswith('@'):
+            match = _AT_RULE.match(prelude)
+            name, condition = match.group(1).lower(), match.group(2)
+            if name == 'media' and not media_applies(condition):
+                continue
+            # Layers are treated as unlayered; other at-rules (@font-face, @keyframes, ...) hold no style rules
+            if name in ('media', 'supports', 'layer'):
+                yield from _style_rules(body)
+            continue
+        yield prelude, body
+
+def parse_declarations(block: str) -> tuple:
+    """(property, value, important, shorthand) of the declarations in block that styles are computed from.
+
+    Values are lowercased. A shorthand is kept whole under each longhand it
+    sets, with its name as shorthand, and split when the style is computed,
+    after any var() in it is substituted.
+    """
+    declarations = []
+    for part in _split(block, ';'):
+        name, colon, value = part.partition(':')
+        if not colon:
+            continue
+        name = name.strip().lower()
+        if name not in LONGHANDS and name not in SHORTHANDS and not name.startswith('--'):
+            continue
+        value = value.strip().lower()
+        important = _IMPORTANT.search(value)
+        if important:
+            value = value[:important.start()].rstrip()
+        for longhand in SHORTHANDS.get(name, (name,)):
+            declarations.append((longhand, value, bool(important), name if name in SHORTHANDS else None))
+    return tuple(declarations)
+
+@lru_cache(maxsize=4096)
+def inline_declarations(style: str) -> tuple:
+    """parse_declarations of a style attribute, once per distinct attribute value."""
+    return parse_declarations(style)
+
+# Media queries
+
+def media_applies(query: str) -> bool:
+    """Whether a media query list (an empty one included) matches a desktop screen of VIEWPORT size."""
+    query = query.strip().lower()
+    return not query or any(_media_query_applies(part.strip()) for part in _split(query, ','))
+
+def _media_query_applies(query: str) -> bool:
+    negated = query.startswith('not ')
+    query = query.removeprefix('not ').removeprefix('only ').strip()
+    applies = True
+    if not query.startswith('('):
+        media_type, _, query = query.partition(' ')
+        applies = media_type in ('all', 'screen')
+    applies = applies and all(_media_feature_applies(feature.strip()) for feature in _MEDIA_FEATURE.findall(query))
+    return applies != negated
+
+def _media_feature_applies(feature: str) -> bool:
+    name, colon, value = feature.removeprefix('-webkit-').partition(':')
+    if colon:
+        name, value = name.strip(), value.strip()
+        operator = '='
+        if name.startswith(('min-', 'max-')):
+            operator = '>=' if name.startswith('min-') else '<='
+            name = name[4:]
+    else:
+        match = _MEDIA_RANGE.match(feature)
+        if match is None:
+            return _media_value(feature) not in (None, 'none', 'no-preference', 0)
+        name, operator, value = match.groups()
+        if _media_value(name) is None and _media_value(value.strip()) is not None:
+            # (600px <= width)
+            name, value = value.strip(), name
+            operator = operator.replace('<', '>') if '<' in operator else operator.replace('>', '<')
+    actual = _media_value(name.removeprefix('-webkit-'))
+    if isinstance(actual, str):
+        return operator == '=' and value == actual
+    if actual is None:
+        return False
+    expected = _media_length(value.strip())
+    if expected is None:
+        return False
+    return {'=': actual == expected, '<': actual < expected, '<=': actual <= expected,
+            '>': actual > expected, '>=': actual >= expected}[operator]
+
+def _media_value(name: str):
+    width, height = VIEWPORT
+    return {
+        'width': width, 'device-width': width, 'height': height, 'device-height': height,
+        'resolution': 1.0, 'device-pixel-ratio': 1.0, 'color': 8,
+        'orientation': 'landscape' if width >= height else 'portrait',
+        'prefers-color-scheme': 'light', 'prefers-reduced-motion': 'no-preference',
+        'prefers-contrast': 'no-preference', 'forced-colors': 'none', 'inverted-colors': 'none',
+        'hover': 'hover', 'any-hover': 'hover', 'pointer': 'fine', 'any-pointer': 'fine',
+        'scripting': 'enabled', 'display-mode': 'browser',
+    }.get(name)
+
+def _media_length(value: str) -> Optional[float]:
+    match = _LENGTH.match(value)
+    if match is None:
+        return None
+    number, unit = float(match.group(1)), match.group(2)
+    if unit in ('em', 'rem'):
+        return number * DEFAULT_FONT_SIZE
+    if unit in ('dppx', 'x', ''):
+        return number
+    if unit == 'dpi':
+        return number / 96
+    return number * ABSOLUTE_UNITS[unit] if unit in ABSOLUTE_UNITS else None
+
+# Selectors
+
+class _Compound:
+    """One compound selector, such as 'a.nav-link[href]:first-child'."""
+    __slots__ = ('tag', 'ids', 'classes', 'attributes', 'pseudo_classes')
+
+    def __init__(self):
+        self.tag = None
+        self.ids = []
+        self.classes = []
+        self.attributes = []
+        self.pseudo_classes = []
+
+class Selector:
+    """A complex selector, matched right to left; ones with other pseudo-classes than SIMPLE_PSEUDO_CLASSES go to soupsieve."""
+    __slots__ = ('text', 'specificity', 'key', 'parts', 'exact', 'ancestors', 'at_rest', '_pattern')
+
+    def __init__(self, text: str, specificity: tuple, key: tuple, parts: list, exact: bool, at_rest: bool):
+        self.text = text
+        self.specificity = specificity
+        # Where the selector is indexed: ('id', id), ('class', name), ('tag', name) or ('any', None)
+        self.key = key
+        # (compound, combinator to its left) from the rightmost compound on
+        self.parts = parts
+        # False when parts leave out pseudo-classes, so a match of parts is confirmed by soupsieve
+        self.exact = exact
+        # Keys that some ancestor of a matching element has, as ancestor_keys() names them
+        self.ancestors = _ancestor_keys(parts)
+        # False when the selector only matches in a dynamic state or selects a pseudo-element
+        self.at_rest = at_rest
+        self._pattern = None
+
+    def matches(self, element) -> bool:
+        if not _matches(element, self.parts, 0):
+            return False
+        if self.exact:
+            return True
+        if self._pattern is None:
+            import soupsieve
+            try:
+                self._pattern = soupsieve.compile(self.text)
+            except Exception:
+                # Selectors soupsieve does not support never match
+                self._pattern = False
+        return bool(self._pattern) and self._pattern.match(element)
+
+def _unescape(identifier: str) -> str:
+    return _ESCAPE.sub(lambda m: chr(int(m.group(1), 16)) if m.group(1) else m.group(2), identifier)
+
+def _functional_args_end(text: str, position: int) -> int:
+    depth = 1
+    for i in range(position, len(text)):
+        if text[i] == '(':
+            depth += 1
+        elif text[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+def ancestor_keys(element) -> list:
+    """The keys an element adds to the ancestors of its descendants: '#id', '.class' and its tag name."""
+    attrs = element.attrs
+    keys = [element.name]
+    if attrs:
+        element_id = attrs.get('id')
+        if element_id:
+            keys.append('#' + element_id)
+        classes = attrs.get('class')
+        if classes:
+            keys.extend('.' + name for name in classes)
+    return keys
+
+def _ancestor_keys(parts) -> tuple:
+    keys = []
+    tags = []
+    # Compounds left of a descendant or child combinator match ancestors of the subject
+    ancestor = False
+    for compound, combinator in parts:
+        if ancestor:
+            keys.extend('#' + element_id for element_id in compound.ids)
+            keys.extend('.' + name for name in compound.classes)
+            if compound.tag is not None:
+                tags.append(compound.tag)
+        if combinator in ('>', ' '):
+            ancestor = True
+    # Ids and classes first: they are the rarest, so the first key alone rejects most elements
+    return tuple(dict.fromkeys(keys + tags))
+
+def _index_key(compound: _Compound) -> tuple:
+    if compound.ids:
+        return 'id', compound.ids[0]
+    if compound.classes:
+        return 'class', compound.classes[0]
+    if compound.tag is not None:
+        return 'tag', compound.tag
+    if 'root' in compound.pseudo_classes:
+        return 'tag', 'html'
+    return 'any', None
+
+def _parse_selector(text: str) -> Optional[Selector]:
+    """Parse one complex selector; None when it is not valid CSS this parser understands."""
+    compounds = []
+    combinators = []
+    current = None
+    ids = classes = types = 0
+    simple = True
+    at_rest = True
+    position = 0
+    while position < len(text):
+        match = _SELECTOR_TOKEN.match(text, position)
+        if match is None:
+            return None
+        position = match.end()
+        if match.group('combinator') or match.group('descendant'):
+            if current is None:
+                return None
+            combinators.append(match.group('combinator') or ' ')
+            current = None
+            continue
+        if current is None:
+            current = _Compound()
+            compounds.append(current)
+        if match.group('type'):
+            if match.group('type') != '*':
+                current.tag = match.group('type').lower()
+                types += 1
+        elif match.group('id'):
+            current.ids.append(_unescape(match.group('id')))
+            ids += 1
+        elif match.group('cls'):
+            current.classes.append(_unescape(match.group('cls')))
+            classes += 1
+        elif match.group('attr'):
+            value = match.group('value')
+            if value is not None and value[:1] in '"\'':
+                value = value[1:-1]
+            current.attributes.append((match.group('attr').lower(), match.group('op'), value, match.group('flag') == 'i'))
+            classes += 1
+        else:
+            pseudo = match.group('pseudo').lower()
+            arguments = None
+            if match.group('args'):
+                end = _functional_args_end(text, position)
+                if end < 0:
+                    return None
+                arguments, position = text[position:end], end + 1
+            name = pseudo.lstrip(':')
+            if pseudo.startswith('::') or name in LEGACY_PSEUDO_ELEMENTS:
+                types += 1
+                at_rest = False
+            elif name in DYNAMIC_PSEUDO_CLASSES or name.startswith('-'):
+                classes += 1
+                at_rest = False
+            elif name in SIMPLE_PSEUDO_CLASSES and arguments is None:
+                current.pseudo_classes.append(name)
+                classes += 1
+            else:
+                simple = False
+                if name in ('is', 'not', 'has', 'matches') and arguments is not None:
+                    # These count as their most specific argument; :where() counts nothing
+                    nested = [_parse_selector(argument.strip()) for argument in _split(arguments, ',')]
+                    a, b, c = max((selector.specificity for selector in nested if selector), default=(0, 0, 0))
+                    ids, classes, types = ids + a, classes + b, types + c
+                elif name != 'where':
+                    classes += 1
+    if current is None:
+        return None
+    # Without the pseudo-classes left out, parts still only match a superset
+    parts = list(zip(reversed(compounds), [*reversed(combinators), None]))
+    return Selector(text, (ids, classes, types), _index_key(current), parts, simple, at_rest)
+
+def _attribute_matches(element, name, operator, expected, ignore_case) -> bool:
+    value = element.attrs.get(name)
+    if value is None:
+        return False
+    if operator is None:
+        return True
+    if isinstance(value, list):
+        value = ' '.join(value)
+    if ignore_case:
+        value, expected = value.lower(), expected.lower()
+    if operator == '=':
+        return value == expected
+    if operator == '~=':
+        return expected in value.split()
+    if operator == '|=':
+        return value == expected or value.startswith(expected + '-')
+    if not expected:
+        return False
+    if operator == '^=':
+        return value.startswith(expected)
+    if operator == '$=':
+        return value.endswith(expected)
+    return expected in value
+
+def _compound_matches(element, compound) -> bool:
+    if compound.tag is not None and element.name != compound.tag:
+        return False
+    attrs = element.attrs
+    for element_id in compound.ids:
+        if attrs.get('id') != element_id:
+            return False
+    if compound.classes:
+        own = attrs.get('class')
+        if not own or any(name not in own for name in compound.classes):
+            return False
+    for attribute in compound.attributes:
+        if not _attribute_matches(element, *attribute):
+            return False
+    for name in compound.pseudo_classes:
+        if name == 'root':
+            if element.parent is None or element.parent.parent is not None:
+                return False
+        elif element.name not in ('a', 'area') or attrs.get('href') is None:
+            # :link and :any-link; no link has been visited
+            return False
+    return True
+
+def _previous_element(element):
+    node = element.previous_sibling
+    while node is not None and node.name is None:
+        node = node.previous_sibling
+    return node
+
+def _matches(element, parts, index) -> bool:
+    compound, combinator = parts[index]
+    if not _compound_matches(element, compound):
+        return False
+    if combinator is None:
+        return True
+    if combinator in ('>', ' '):
+        node = element.parent
+        # The BeautifulSoup object above <html> is not an element
+        while node is not None and node.parent is not None:
+            if _matches(node, parts, index + 1):
+                return True
+            if combinator == '>':
+                return False
+            node = node.parent
+        return False
+    node = _previous_element(element)
+    while node is not None:
+        if _matches(node, parts, index + 1):
+            return True
+        if combinator == '+':
+            return False
+        node = _previous_element(node)
+    return False
+
+# Stylesheets
+
+class Stylesheet:
+    """The rules of one stylesheet that affect computed styles, indexed by the rightmost key of their selectors."""
+
+    def __init__(self, text: str):
+        self.by_id: Dict[str, list] = {}
+        self.by_class: Dict[str, list] = {}
+        self.by_tag: Dict[str, list] = {}
+        self.universal: list = []
+        self.size = 0
+        self.has_ancestors = False
+        indexes = {'id': self.by_id, 'class': self.by_class, 'tag': self.by_tag}
+        for order, (prelude, block) in enumerate(_style_rules(_COMMENT.sub('', text))):
+            declarations = parse_declarations(block)
+            if not declarations:
+                continue
+            for selector_text in _split(prelude, ','):
+                selector = _parse_selector(selector_text.strip())
+                if selector is None or not selector.at_rest:
+                    continue
+                entry = (selector, order, declarations)
+                kind, key = selector.key
+                if kind == 'any':
+                    self.universal.append(entry)
+                else:
+                    indexes[kind].setdefault(key, []).append(entry)
+                self.size += 1
+                self.has_ancestors = self.has_ancestors or bool(selector.ancestors)
+
+USER_AGENT_SHEET = Stylesheet(USER_AGENT_CSS)
+
+class StyleIndex:
+    """The rules of the stylesheets that apply to one page, in one index.
+
+    Entries are (selector, precedence, declarations); precedence orders
+    declarations of equal importance across sheets: the browser's defaults
+    first, then author sheets by specificity and position in the page.
+    has_ancestors tells whether any selector names ancestors to filter on.
+    """
+
+    def __init__(self, sheets: List[Stylesheet]):
+        self.by_id: Dict[str, list] = {}
+        self.by_class: Dict[str, list] = {}
+        self.by_tag: Dict[str, list] = {}
+        self.universal: list = []
+        self.has_ancestors = any(sheet.has_ancestors for sheet in sheets)
+        for index, sheet in enumerate((USER_AGENT_SHEET, *sheets)):
+            origin = 1 if index else 0
+            for merged, own in ((self.by_id, sheet.by_id), (self.by_class, sheet.by_class), (self.by_tag, sheet.by_tag)):
+                for key, entries in own.items():
+                    merged.setdefault(key, []).extend(
+                        (selector, (origin, selector.specificity, index, order), declarations)
+                        for selector, order, declarations in entries
+                    )
+            self.universal.extend(
+                (selector, (origin, selector.specificity, index, order), declarations)
+                for selector, order, declarations in sheet.universal
+            )
+
+USER_AGENT_INDEX = StyleIndex([])
+
+def stylesheet_key(text: str) -> str:
+    """Hash of a stylesheet's text, which identifies it in the caches."""
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+class MissingStylesheets(Exception):
+    """Raised for linked stylesheets given only by key that this process has not parsed; keys lists them."""
+
+    def __init__(self, keys: List[str]):
+        super().__init__(keys)
+        self.keys = keys
+
+class StylesheetCache:
+    """Parsed stylesheets keyed by content hash, least recently used first out.
+
+    Shared by every page a process checks, so a site's stylesheet is parsed once per worker.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Stylesheet]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'StylesheetCache':
+        return cls(int(os.getenv('STYLESHEET_CACHE_MAX_ENTRIES', 256)))
+
+    def get(self, key: str) -> Optional[Stylesheet]:
+        """The stylesheet parsed from the text with this stylesheet_key, or None if it is not cached."""
+        with self._lock:
+            sheet = self._entries.get(key)
+            if sheet is not None:
+                self._entries.move_to_end(key)
+            return sheet
+
+    def parse(self, text: str, key: str = None) -> Stylesheet:
+        """The parsed stylesheet, from the cache when the same text was parsed before; key saves hashing the text."""
+        key = key or stylesheet_key(text)
+        with self._lock:
+            sheet = self._entries.get(key)
+            if sheet is not None:
+                self._entries.move_to_end(key)
+                return sheet
+        sheet = Stylesheet(text)
+        with self._lock:
+            self._entries[key] = sheet
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return sheet
+
+    def __len__(self):
+        return len(self._entries)
+
+# The cache of this process; ColorValidator uses it for every page
+STYLESHEET_CACHE = StylesheetCache.from_env()
+
+def _is_stylesheet_link(rel) -> bool:
+    tokens = rel if isinstance(rel, list) else (rel or '').lower().split()
+    tokens = [token.lower() for token in tokens]
+    return 'stylesheet' in tokens and 'alternate' not in tokens
+
+def document_stylesheets(soup, linked: Dict[str, tuple] = None, cache: StylesheetCache = STYLESHEET_CACHE) -> List[Stylesheet]:
+    """The author stylesheets of a parsed page in cascade order.
+
+    These are its <style> blocks, and its <link rel="stylesheet"> elements
+    whose href is a key of linked, which maps it to the downloaded sheet's
+    (stylesheet_key, text). The text may be None when the sheet is expected
+    in cache; MissingStylesheets is raised for those that are not.
+    """
+    sheets = []
+    missing = []
+    # A plain scan of the tree costs far less than find_all's filters
+    for element in soup.descendants:
+        if element.name != 'style' and element.name != 'link':
+            continue
+        if not media_applies(element.get('media') or ''):
+            continue
+        if element.name == 'style':
+            if element.get('type', 'text/css').lower() not in ('text/css', ''):
+                continue
+            text = element.get_text()
+            if text.strip():
+                sheets.append(cache.parse(text))
+            continue
+        download = linked.get((element.get('href') or '').strip()) if linked else None
+        if download is None or not _is_stylesheet_link(element.get('rel')):
+            continue
+        key, text = download
+        sheet = cache.get(key) if text is None else cache.parse(text, key)
+        if sheet is None:
+            missing.append(key)
+        else:
+            sheets.append(sheet)
+    if missing:
+        raise MissingStylesheets(missing)
+    return sheets
+
+# Computed styles
+
+@lru_cache(maxsize=4096)
+def parse_color(value: str) -> Optional[Tuple[float, float, float, float]]:
+    """(red, green, blue, alpha) of a CSS color, channels 0-255 and alpha 0-1, or None."""
+    value = value.strip().lower()
+    if value == 'transparent':
+        return (0.0, 0.0, 0.0, 0.0)
+    if value in NAMED_COLORS:
+        value = '#' + NAMED_COLORS[value]
+    match = _HEX_COLOR.match(value)
+    if match:
+        digits = match.group(1)
+        if len(digits) in (3, 4):
+            digits = ''.join(digit * 2 for digit in digits)
+        if len(digits) not in (6, 8):
+            return None
+        alpha = int(digits[6:8], 16) / 255 if len(digits) == 8 else 1.0
+        return (*(float(int(digits[i:i + 2], 16)) for i in (0, 2, 4)), alpha)
+    match = _COLOR_FUNCTION.match(value)
+    if match is None:
+        return None
+    arguments = [argument for argument in re.split(r'[\s,/]+', match.group(2).strip()) if argument]
+    if len(arguments) not in (3, 4):
+        return None
+    try:
+        if match.group(1).startswith('rgb'):
+            channels = [float(x[:-1]) * 2.55 if x.endswith('%') else float(x) for x in arguments[:3]]
+        else:
+            hue = float(arguments[0].removesuffix('deg')) / 360 % 1
+            saturation, lightness = (min(max(float(x.rstrip('%')) / 100, 0.0), 1.0) for x in arguments[1:3])
+            channels = [channel * 255 for channel in colorsys.hls_to_rgb(hue, lightness, saturation)]
+        alpha = 1.0
+        if len(arguments) == 4:
+            alpha = float(arguments[3][:-1]) / 100 if arguments[3].endswith('%') else float(arguments[3])
+    except ValueError:
+        return None
+    return (*(min(max(channel, 0.0), 255.0) for channel in channels), min(max(alpha, 0.0), 1.0))
+
+def _blend(color, backdrop) -> Tuple[float, float, float]:
+    """An (r, g, b, a) color painted over an opaque (r, g, b) backdrop."""
+    alpha = color[3]
+    if alpha >= 1:
+        return color[:3]
+    return tuple(top * alpha + bottom * (1 - alpha) for top, bottom in zip(color[:3], backdrop))
+
+@lru_cache(maxsize=4096)
+def _hex(rgb) -> str:
+    return '#%02X%02X%02X' % tuple(round(channel) for channel in rgb)
+
+@lru_cache(maxsize=4096)
+def font_size(value: str, parent_size: float, root_size: float = DEFAULT_FONT_SIZE) -> Optional[float]:
+    """A font-size value in pixels, or None if it cannot be resolved (calc(), for instance)."""
+    if value in FONT_SIZE_KEYWORDS:
+        return FONT_SIZE_KEYWORDS[value]
+    if value == 'smaller':
+        return parent_size / 1.2
+    if value == 'larger':
+        return parent_size * 1.2
+    match = _LENGTH.match(value)
+    if match is None:
+        return None
+    number, unit = float(match.group(1)), match.group(2)
+    if number < 0:
+        return None
+    if unit in ABSOLUTE_UNITS:
+        return number * ABSOLUTE_UNITS[unit]
+    if unit == 'em':
+        return number * parent_size
+    if unit == '%':
+        return number * parent_size / 100
+    if unit == 'rem':
+        return number * root_size
+    if unit in ('ex', 'ch'):
+        return number * parent_size / 2
+    if unit in ('vw', 'vh', 'vmin', 'vmax'):
+        width, height = VIEWPORT
+        side = {'vw': width, 'vh': height, 'vmin': min(width, height), 'vmax': max(width, height)}[unit]
+        return number * side / 100
+    return 0.0 if number == 0 and not unit else None
+
+@lru_cache(maxsize=1024)
+def font_weight(value: str, parent_weight: int) -> Optional[int]:
+    """A font-weight value as a number, or None if it is not one."""
+    if value in ('normal', 'initial'):
+        return 400
+    if value == 'bold':
+        return 700
+    if value == 'bolder':
+        return 400 if parent_weight < 350 else 700 if parent_weight < 550 else 900
+    if value == 'lighter':
+        return 100 if parent_weight < 550 else 400 if parent_weight < 750 else 700
+    try:
+        weight = float(value)
+    except ValueError:
+        return None
+    return int(weight) if 1 <= weight <= 1000 else None
+
+@lru_cache(maxsize=4096)
+def _longhand(shorthand: str, name: str, value: str) -> Optional[str]:
+    """The value a background or font shorthand gives the longhand name."""
+    if value in CSS_WIDE_KEYWORDS:
+        return value
+    tokens = _TOKENS.findall(value)
+    if shorthand == 'background':
+        # Only the final layer has a color; without one the shorthand resets it
+        for token in _TOKENS.findall(_split(value, ',')[-1]):
+            if parse_color(token) is not None or token == 'currentcolor':
+                return token
+        return 'transparent'
+    if not tokens or tokens[0] in SYSTEM_FONTS:
+        return None
+    weight = 'normal'
+    for token in tokens:
+        size = token.split('/')[0]
+        if font_size(size, DEFAULT_FONT_SIZE) is not None and not size.isdigit():
+            return size if name == 'font-size' else weight
+        if font_weight(token, 400) is not None:
+            weight = token
+    return None
+
+def _substitute(value: str, variables: Dict[str, str]) -> Optional[str]:
+    """value with var() references replaced, or None if one is undefined and has no fallback."""
+    missing = False
+
+    def replace(match):
+        nonlocal missing
+        found = variables.get(match.group(1))
+        if found is None:
+            found = match.group(2)
+        if found is None:
+            missing = True
+            return ''
+        return found.strip()
+
+    for _ in range(8):
+        if 'var(' not in value:
+            return value
+        value = _VAR.sub(replace, value)
+        if missing:
+            return None
+    return None
+
+class ComputedStyle:
+    """Computed values of one element that contrast depends on.
+
+    color is the text color as (r, g, b, a); backdrop is the opaque color
+    behind the element, its own background painted over its parent's
+    backdrop; font_size is in pixels.
+    """
+    __slots__ = ('color', 'backdrop', 'font_size', 'font_weight', 'variables')
+
+    def __init__(self, color, backdrop, font_size, font_weight, variables):
+        self.color = color
+        self.backdrop = backdrop
+        self.font_size = font_size
+        self.font_weight = font_weight
+        self.variables = variables
+
+    @property
+    def text_color(self) -> str:
+        """The text color as it shows over the backdrop, as '#RRGGBB'."""
+        return _hex(_blend(self.color, self.backdrop))
+
+    @property
+    def background_color(self) -> str:
+        return _hex(self.backdrop)
+
+INITIAL_STYLE = ComputedStyle((0.0, 0.0, 0.0, 1.0), (255.0, 255.0, 255.0), DEFAULT_FONT_SIZE, 400, {})
+
+def _declare(winners: dict, declarations, precedence) -> None:
+    for name, value, important, shorthand in declarations:
+        key = (important, precedence)
+        current = winners.get(name)
+        # On a tie the later declaration wins
+        if current is None or current[0] <= key:
+            winners[name] = (key, value, shorthand)
+
+class ComputedStyles:
+    """Resolves the computed style of every element during one TreeWalker pass.
+
+    Register it on the walker before the checks that read it; while an
+    element is visited, current is its ComputedStyle. An element's style
+    comes from the rules matching it, its style attribute, and its parent's
+    style, which was resolved just before it.
+    """
+
+    def __init__(self, sheets: List[Stylesheet] = ()):
+        self.index = StyleIndex(sheets) if sheets else USER_AGENT_INDEX
+        self._stack = [INITIAL_STYLE]
+        self._root_font_size = DEFAULT_FONT_SIZE
+        # How many open ancestors have each key, so most selectors are rejected without walking up the tree
+        self._ancestors: Optional[Dict[str, int]] = {} if self.index.has_ancestors else None
+        self._ancestor_keys = []
+
+    @property
+    def current(self) -> ComputedStyle:
+        return self._stack[-1]
+
+    def register(self, walker) -> None:
+        from .tree_walker import ANY_TAG
+        walker.on_enter(ANY_TAG, self._enter)
+        walker.on_leave(ANY_TAG, self._leave)
+
+    def _enter(self, element):
+        style = self._compute(element, self._stack[-1])
+        if len(self._stack) == 1:
+            # rem units are relative to the root element
+            self._root_font_size = style.font_size
+        self._stack.append(style)
+        if self._ancestors is not None:
+            keys = ancestor_keys(element)
+            for key in keys:
+                self._ancestors[key] = self._ancestors.get(key, 0) + 1
+            self._ancestor_keys.append(keys)
+
+    def _leave(self, element):
+        self._stack.pop()
+        if self._ancestors is not None:
+            for key in self._ancestor_keys.pop():
+                self._ancestors[key] -= 1
+
+    def _compute(self, element, parent: ComputedStyle) -> ComputedStyle:
+        index = self.index
+        attrs = element.attrs
+        if not attrs and not index.universal and element.name not in index.by_tag:
+            return parent
+        # Only the rules filed under the element's id, classes and tag name can match it
+        candidates = []
+        element_id = attrs.get('id')
+        if element_id and element_id in index.by_id:
+            candidates.append(index.by_id[element_id])
+        classes = attrs.get('class')
+        if classes:
+            candidates.extend(index.by_class[name] for name in classes if name in index.by_class)
+        if element.name in index.by_tag:
+            candidates.append(index.by_tag[element.name])
+        if index.universal:
+            candidates.append(index.universal)
+
+        winners = {}
+        ancestors = self._ancestors
+        for entries in candidates:
+            for selector, precedence, declarations in entries:
+                required = selector.ancestors
+                if required and ancestors is not None and (
+                        not ancestors.get(required[0]) or not all(ancestors.get(key) for key in required[1:])):
+                    continue
+                if selector.matches(element):
+                    _declare(winners, declarations, precedence)
+        if 'bgcolor' in attrs or element.name == 'font':
+            # Below every author rule, above the browser's defaults
+            _declare(winners, _presentational_hints(element), (1, (0, 0, 0), 0, -1))
+        style = attrs.get('style')
+        if style:
+            _declare(winners, inline_declarations(style), (2,))
+        if not winners:
+            return parent
+        return self._resolve(winners, parent)
+
+    def _resolve(self, winners: dict, parent: ComputedStyle) -> ComputedStyle:
+        variables = parent.variables
+        custom = [(name, winner[1]) for name, winner in winners.items() if name.startswith('--')]
+        if custom:
+            variables = dict(variables)
+            for name, value in custom:
+                resolved = _substitute(value, variables)
+                if resolved is None:
+                    variables.pop(name, None)
+                else:
+                    variables[name] = resolved
+
+        def declared(name):
+            winner = winners.get(name)
+            if winner is None:
+                return None
+            _, value, shorthand = winner
+            if 'var(' in value:
+                value = _substitute(value, variables)
+                if value is None:
+                    return None
+            return _longhand(shorthand, name, value) if shorthand else value
+
+        color = parent.color
+        value = declared('color')
+        if value == 'initial':
+            color = INITIAL_STYLE.color
+        elif value is not None and value not in CSS_WIDE_KEYWORDS and value != 'currentcolor':
+            color = parse_color(value) or parent.color
+
+        backdrop = parent.backdrop
+        value = declared('background-color')
+        if value is not None:
+            own = color if value == 'currentcolor' else parse_color(value)
+            if own is not None and own[3] > 0:
+                backdrop = _blend(own, parent.backdrop)
+
+        size = parent.font_size
+        value = declared('font-size')
+        if value is not None and value not in ('inherit', 'unset'):
+            size = font_size(value, parent.font_size, self._root_font_size) or size
+
+        weight = parent.font_weight
+        value = declared('font-weight')
+        if value is not None and value not in ('inherit', 'unset'):
+            weight = font_weight(value, parent.font_weight) or weight
+
+        return ComputedStyle(color, backdrop, size, weight, variables)
+
+def _presentational_hints(element) -> tuple:
+    """Declarations for legacy attributes such as bgcolor and <font color>."""
+    hints = ()
+    background = element.attrs.get('bgcolor')
+    if background:
+        hints += (('background-color', background.strip().lower(), False, None),)
+    if element.name == 'font' and element.attrs.get('color'):
+        hints += (('color', element['color'].strip().lower(), False, None),)
+    return hints
+
+# Linked stylesheets
+
+def linked_stylesheet_hrefs(content: bytes) -> Tuple[Optional[str], List[str]]:
+    """(the page's <base href>, the hrefs of its stylesheet links, as written), from a scan of the raw markup."""
+    base = None
+    hrefs = []
+    for tag in _LINK_TAG.findall(content):
+        text = tag.decode('utf-8', 'replace')
+        attributes = {}
+        # Both tag names are four letters long
+        for name, double, single, bare in _TAG_ATTRIBUTE.findall(text, 5):
+            attributes.setdefault(name.lower(), html.unescape(double or single or bare))
+        href = attributes.get('href', '').strip()
+        if not href:
+            continue
+        if text[1:5].lower() == 'base':
+            base = base or href
+        elif _is_stylesheet_link(attributes.get('rel')) and media_applies(attributes.get('media', '')):
+            hrefs.append(href)
+    return base, list(dict.fromkeys(hrefs))
+
+class StylesheetDownloads:
+    """Linked stylesheets downloaded by this process, reused for max_age seconds so a site's pages share them."""
+
+    def __init__(self, max_entries: int = 256, max_age: float = 300.0,
+                 max_bytes: int = STYLESHEET_MAX_BYTES, max_links: int = STYLESHEET_MAX_LINKS):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.max_links = max_links
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'StylesheetDownloads':
+        """Downloads configured by STYLESHEET_MAX_AGE, STYLESHEET_MAX_BYTES and STYLESHEET_MAX_LINKS (0 downloads none)."""
+        return cls(
+            max_entries=int(os.getenv('STYLESHEET_CACHE_MAX_ENTRIES', 256)),
+            max_age=float(os.getenv('STYLESHEET_MAX_AGE', 300.0)),
+            max_bytes=int(os.getenv('STYLESHEET_MAX_BYTES', STYLESHEET_MAX_BYTES)),
+            max_links=int(os.getenv('STYLESHEET_MAX_LINKS', STYLESHEET_MAX_LINKS)),
+        )
+
+    def links(self, page_url: str, content: bytes) -> Tuple[Tuple[str, str], ...]:
+        """(href as written, absolute URL) of each stylesheet a page links to, up to max_links."""
+        if self.max_links <= 0:
+            return ()
+        base, hrefs = linked_stylesheet_hrefs(content)
+        base_url = urljoin(page_url, base) if base else page_url
+        return tuple((href, urljoin(base_url, href)) for href in hrefs[:self.max_links])
+
+    async def download(self, fetcher, links) -> Dict[str, tuple]:
+        """(stylesheet_key, text) of each linked stylesheet keyed by href; sheets that fail to download are left out."""
+        downloads = await asyncio.gather(*(self.fetch(fetcher, url) for _, url in links))
+        return {href: download for (href, _), download in zip(links, downloads) if download is not None}
+
+    async def fetch(self, fetcher, url: str) -> Optional[tuple]:
+        """A stylesheet's (stylesheet_key, text), or None if it could not be downloaded; both are remembered for max_age."""
+        from .fetcher import FetchError
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None and now - entry[0] < self.max_age:
+                self._entries.move_to_end(url)
+                return entry[1]
+        download = text = None
+        try:
+            result = await fetcher.fetch(url, max_bytes=self.max_bytes)
+            content_type = result.headers.get('Content-Type', 'text/css')
+            if 'css' in content_type or 'text/plain' in content_type:
+                try:
+                    text = result.text()
+                except LookupError:
+                    # A charset Python does not know, such as 'bogus-enc'
+                    text = result.content.decode('utf-8', errors='replace')
+        except (FetchError, ValueError):
+            pass
+        if text is not None:
+            # Hashed once here; workers find the parsed sheet by this key
+            download = (stylesheet_key(text), text)
+        with self._lock:
+            self._entries[url] = (now, download)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return download
@@ -0,0 +1,239 @@
+"""Page templates: chrome such as headers, navs and footers that repeats across a site's pages.
+
+An outermost <header>, <nav>, <footer> or <aside> (or an element with the
+matching landmark role) outside <main> and <article> is a template region,
+identified by a fingerprint of its markup. The first time a region is seen,
+the issues its element-local checks find are recorded in a TemplateCache;
+on every later page with the same region, those checks skip it and the
+recorded issues are replayed instead. Issues from template regions carry the
+region's id under 'page_template', so reports can list them once per site
+rather than once per page.
+
+Only checks whose result for an element depends on nothing but the element
+itself take part. Checks that need the rest of the document (labels, heading
+order, landmarks, lists, contrast against inherited backgrounds, custom rule
+selectors) still visit template regions on every page.
+"""
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from .issues import Issue
+
+TEMPLATE_TAGS = frozenset({'header', 'nav', 'footer', 'aside'})
+TEMPLATE_ROLES = frozenset({'banner', 'navigation', 'contentinfo', 'complementary'})
+# Chrome-like elements inside page content belong to that page, e.g. an article's header
+CONTENT_TAGS = frozenset({'main', 'article'})
+CONTENT_ROLES = frozenset({'main', 'article'})
+
+def _is_template_candidate(element) -> bool:
+    return element.name in TEMPLATE_TAGS or element.get('role') in TEMPLATE_ROLES
+
+def _is_content(element) -> bool:
+    return element.name in CONTENT_TAGS or element.get('role') in CONTENT_ROLES
+
+class TemplateCache:
+    """Recorded issues of template regions, keyed by (analyzer, fingerprint), least recently used first out.
+
+    Shared by every analysis in a process, so a batch or crawl recognizes a
+    site's chrome after its first page on each worker.
+    """
+
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[tuple, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional['TemplateCache']:
+        """Cache sized by TEMPLATE_CACHE_MAX_ENTRIES, or None when that is 0 and templates are not tracked."""
+        max_entries = int(os.getenv('TEMPLATE_CACHE_MAX_ENTRIES', 2000))
+        return cls(max_entries) if max_entries > 0 else None
+
+    def get(self, key) -> Optional[tuple]:
+        with self._lock:
+            entries = self._entries.get(key)
+            if entries is not None:
+                self._entries.move_to_end(key)
+            return entries
+
+    def put(self, key, entries: tuple) -> None:
+        with self._lock:
+            self._entries[key] = entries
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+# The cache of this process; analyze_page uses it for every page
+TEMPLATE_CACHE = TemplateCache.from_env()
+
+class TemplateRegions:
+    """Recognizes template regions during one walk, and records or replays their local checks.
+
+    Register it on the walker before any check, then wrap every element-local
+    visitor with local(visitor, issues) and its on_match predicate, if any,
+    with predicate(). With no cache, nothing is registered and the wrappers
+    return their argument unchanged.
+
+    namespace keeps the recordings of different analyzers apart. fingerprints
+    is shared between the analyzers of one document so each region's markup
+    is hashed once. selectors and snippets rebuild element issues for the
+    current page: their selector path under the region's path here, and
+    their snippet charged to this report's budget.
+    """
+
+    def __init__(self, cache: Optional[TemplateCache], namespace: str, fingerprints: Dict[int, str] = None,
+                 selectors=None, snippets=None):
+        self.cache = cache
+        self.namespace = namespace
+        self.fingerprints = {} if fingerprints is None else fingerprints
+        self.selectors = selectors
+        self.snippets = snippets
+        self._slots: List[list] = []
+        self._content_depth = 0
+        self._region = None
+        self._region_id = None
+        self._region_path = None
+        self._recording: Optional[list] = None
+        self._replaying = False
+
+    def register(self, walker) -> None:
+        if self.cache is None:
+            return
+        from .tree_walker import ANY_TAG
+        walker.on_enter(ANY_TAG, self._enter)
+        walker.on_leave(ANY_TAG, self._leave)
+
+    def local(self, handler: Callable, issues: list) -> Callable:
+        """Wrap a visitor whose issues for an element depend only on that element; it appends to issues."""
+        if self.cache is None:
+            return handler
+        slot = len(self._slots)
+        self._slots.append(issues)
+
+        # wraps keeps the qualified name, which labels the check's timings
+        @functools.wraps(handler)
+        def visit(element):
+            if self._replaying:
+                return
+            if self._recording is None:
+                return handler(element)
+            start = len(issues)
+            handler(element)
+            for issue in issues[start:]:
+                issue['page_template'] = self._region_id
+                self._recording.append(self._record(slot, issue, element.name))
+
+        return visit
+
+    def predicate(self, predicate: Callable) -> Callable:
+        """Wrap the on_match predicate of a local visitor, so it is not evaluated in replayed regions."""
+        if self.cache is None:
+            return predicate
+
+        @functools.wraps(predicate)
+        def matches(element):
+            return not self._replaying and predicate(element)
+
+        return matches
+
+    def _enter(self, element):
+        if self._region is not None:
+            return
+        if _is_content(element):
+            self._content_depth += 1
+            return
+        if self._content_depth or not _is_template_candidate(element):
+            return
+        fingerprint = self.fingerprints.get(id(element))
+        if fingerprint is None:
+            fingerprint = hashlib.sha256(str(element).encode('utf-8')).hexdigest()[:16]
+            self.fingerprints[id(element)] = fingerprint
+        self._region = element
+        self._region_id = fingerprint
+        self._region_path = self.selectors.path(element) if self.selectors is not None else None
+        recorded = self.cache.get((self.namespace, fingerprint))
+        if recorded is None:
+            self._recording = []
+            return
+        self._replaying = True
+        for entry in recorded:
+            self._slots[entry[0]].append(self._replay(entry))
+
+    def _leave(self, element):
+        if element is not self._region:
+            if self._region is None and _is_content(element):
+                self._content_depth -= 1
+            return
+        # A snippet cut short by an exhausted report budget would be replayed cut short too
+        if self._recording is not None and (self.snippets is None or self.snippets.remaining >= self.snippets.max_issue_bytes):
+            self.cache.put((self.namespace, self._region_id), tuple(self._recording))
+        self._region = self._region_id = self._region_path = self._recording = None
+        self._replaying = False
+
+    def _record(self, slot, issue, name) -> tuple:
+        if not isinstance(issue, Issue):
+            return (slot, 'dict', {key: value for key, value in issue.items() if key != 'page_template'})
+        fields = (issue['type'], issue['category'], issue.template, issue['recommendation'])
+        selector = issue.selector
+        path = self._region_path
+        if selector is not None and path is not None and (selector == path or selector.startswith(path + ' > ')):
+            # Relative to the region, which may sit elsewhere on other pages
+            return (slot, 'relative', fields, issue.snippet, name, selector[len(path):], issue.value)
+        return (slot, 'absolute', fields, issue.snippet, name, selector, issue.value)
+
+    def _replay(self, entry):
+        kind = entry[1]
+        if kind == 'dict':
+            return dict(entry[2], page_template=self._region_id)
+        _, _, (type, category, template, recommendation), snippet, name, selector, value = entry
+        if kind == 'relative':
+            selector = self._region_path + selector
+        if self.snippets is not None and snippet is not None:
+            snippet = self.snippets.clip(snippet, name)
+        issue = Issue(type, category, template, recommendation, snippet, selector, value)
+        issue['page_template'] = self._region_id
+        return issue
+
+def template_issue_groups(a11y_issues, color_issues) -> Tuple[list, list, Dict[str, dict]]:
+    """(page-specific accessibility issues, page-specific color issues, issues of each page template by id)."""
+    groups: Dict[str, dict] = {}
+    own = ([], [])
+    for key, issues, rest in (('accessibility', a11y_issues, own[0]), ('colors', color_issues, own[1])):
+        for issue in issues:
+            template_id = issue.get('page_template')
+            if template_id is None:
+                rest.append(issue)
+            else:
+                groups.setdefault(template_id, {'accessibility': [], 'colors': []})[key].append(issue)
+    return own[0], own[1], groups
+
+class TemplateReport:
+    """Lists each page template's issues once per batch: with the first page that has the template.
+
+    attribute(result) moves template issues out of a page result's
+    'accessibility' and 'colors' lists and names the page's templates under
+    'templates'; templates not seen before in the batch are added with their
+    issues under 'template_issues'.
+    """
+
+    def __init__(self):
+        self._reported = set()
+
+    def attribute(self, result: dict) -> dict:
+        if not result.get('success'):
+            return result
+        a11y_issues, color_issues, groups = template_issue_groups(result['accessibility'], result['colors'])
+        if not groups:
+            return result
+        result = dict(result, accessibility=a11y_issues, colors=color_issues, templates=list(groups))
+        new = [template_id for template_id in groups if template_id not in self._reported]
+        if new:
+            self._reported.update(new)
+            result['template_issues'] = [dict(groups[template_id], id=template_id) for template_id in new]
+        return result
@@ -0,0 +1,108 @@
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+# Tag name that registers a handler for every element
+ANY_TAG = '*'
+
+class TreeWalker:
+    """Single-pass DOM traversal that dispatches elements to registered checks.
+
+    Handlers registered for ANY_TAG run before the tag-specific ones when an
+    element is entered, and after them when it is left.
+
+    When a timings dict is given, every handler and predicate is timed and its
+    seconds are added to timings under the check that registered it, e.g.
+    'AccessibilityChecker._check_images'. Custom rules add their own entries
+    within RuleSet.register's total. Timing costs a little per call, so it is
+    off by default.
+    """
+
+    def __init__(self, timings: Optional[Dict[str, float]] = None):
+        self.timings = timings
+        self._enter_handlers = defaultdict(list)
+        self._leave_handlers = defaultdict(list)
+        self._match_handlers: List[tuple] = []
+        self._finish_handlers: List[Callable] = []
+
+    def on_enter(self, tags, handler: Callable) -> None:
+        """Call handler(element) for every element whose name is in tags."""
+        handler = self._timed(handler)
+        for tag in _as_list(tags):
+            self._enter_handlers[tag].append(handler)
+
+    def on_leave(self, tags, handler: Callable) -> None:
+        """Call handler(element) once the subtree of a matching element is done."""
+        handler = self._timed(handler)
+        for tag in _as_list(tags):
+            self._leave_handlers[tag].append(handler)
+
+    def on_match(self, predicate: Callable, handler: Callable) -> None:
+        """Call handler(element) for every element for which predicate(element) is true."""
+        self._match_handlers.append((self._timed(predicate), self._timed(handler)))
+
+    def on_finish(self, handler: Callable) -> None:
+        """Call handler() after the whole document has been visited."""
+        self._finish_handlers.append(self._timed(handler))
+
+    def _timed(self, handler: Callable) -> Callable:
+        timings = self.timings
+        if timings is None:
+            return handler
+        label = check_label(handler)
+        timings.setdefault(label, 0.0)
+        perf_counter = time.perf_counter
+
+        def timed(*args):
+            start = perf_counter()
+            try:
+                return handler(*args)
+            finally:
+                timings[label] += perf_counter() - start
+        return timed
+
+    def walk(self, root) -> None:
+        """Visit every element below root in document order, then run finishers."""
+        from bs4 import Tag
+        enter_handlers = self._enter_handlers
+        leave_handlers = self._leave_handlers
+        match_handlers = self._match_handlers
+        any_enter = enter_handlers.get(ANY_TAG, ())
+        any_leave = leave_handlers.get(ANY_TAG, ())
+
+        # Explicit stack instead of recursion so deeply nested pages are safe
+        stack = [(root, iter(root.contents))]
+        while stack:
+            parent, children = stack[-1]
+            for child in children:
+                if not isinstance(child, Tag):
+                    continue
+                for handler in any_enter:
+                    handler(child)
+                for handler in enter_handlers.get(child.name, ()):
+                    handler(child)
+                for predicate, handler in match_handlers:
+                    if predicate(child):
+                        handler(child)
+                stack.append((child, iter(child.contents)))
+                break
+            else:
+                stack.pop()
+                if parent is not root:
+                    for handler in leave_handlers.get(parent.name, ()):
+                        handler(parent)
+                    for handler in any_leave:
+                        handler(parent)
+
+        for handler in self._finish_handlers:
+            handler()
+
+def check_label(handler: Callable) -> str:
+    """Name of the function that defined handler, e.g. 'ColorValidator._check_buttons'."""
+    qualname = getattr(handler, '__qualname__', None) or type(handler).__qualname__
+    return qualname.split('.<locals>', 1)[0]
+
+def _as_list(tags):
+    if isinstance(tags, str):
+        return [tags]
+    return list(tags)
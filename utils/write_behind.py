@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindBuffer:
+    """Buffers rows and hands them to flush(rows) in bulk from a background thread.
+
+    A flush happens once max_rows rows are waiting or the oldest waiting row is
+    max_delay seconds old, whichever comes first. If flush raises, the rows are
+    kept and tried again with the next flush; beyond max_pending rows the oldest
+    are dropped so a database outage cannot exhaust memory. Call close() at
+    shutdown to write whatever is left.
+    """
+
+    def __init__(self, flush: Callable[[List[dict]], None], max_rows: int = 500,
+                 max_delay: float = 2.0, max_pending: int = 50000):
+        self._flush = flush
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._rows = []
+        self._oldest = None
+        # After a failed flush, wait max_delay before trying again
+        self._retry_at = 0.0
+        self._condition = threading.Condition()
+        # Serializes flushes so rows are written in the order they were added
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def add(self, row: dict) -> None:
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('WriteBehindBuffer is closed')
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append(row)
+            if len(self._rows) >= self.max_rows:
+                self._condition.notify()
+
+    def flush(self) -> None:
+        """Write all buffered rows now, in the calling thread."""
+        with self._flush_lock:
+            with self._condition:
+                rows, self._rows, self._oldest = self._rows, [], None
+            if not rows:
+                return
+            try:
+                self._flush(rows)
+            except Exception:
+                logger.exception('Writing %d buffered rows failed; retrying with the next flush', len(rows))
+                self._requeue(rows)
+            else:
+                self._retry_at = 0.0
+
+    def close(self) -> None:
+        """Stop the background thread and write the remaining rows."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+    def _requeue(self, rows):
+        with self._condition:
+            self._rows = rows + self._rows
+            dropped = len(self._rows) - self.max_pending
+            if dropped > 0:
+                logger.error('Dropping %d buffered rows that could not be written', dropped)
+                del self._rows[:dropped]
+            self._oldest = time.monotonic()
+            self._retry_at = self._oldest + self.max_delay
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    delay = self._next_flush_in()
+                    if delay is not None and delay <= 0:
+                        break
+                    self._condition.wait(delay)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _next_flush_in(self):
+        """Seconds until the next flush is due, or None while nothing is buffered."""
+        if not self._rows:
+            return None
+        if len(self._rows) >= self.max_rows:
+            due = self._retry_at
+        else:
+            due = max(self._oldest + self.max_delay, self._retry_at)
+        return due - time.monotonic()